@@ -27,6 +27,20 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Create deadline notifications in a background worker instead of during the request
+app.config["NOTIFICATIONS_IN_BACKGROUND"] = os.environ.get("NOTIFICATIONS_IN_BACKGROUND", "0") == "1"
+
+# Report exports run in a pool of background workers and are kept for a day
+app.config["EXPORT_WORKERS"] = int(os.environ.get("EXPORT_WORKERS", "2"))
+app.config["EXPORT_FOLDER"] = os.environ.get("EXPORT_FOLDER", os.path.join(app.instance_path, "exports"))
+app.config["EXPORT_RETENTION_HOURS"] = int(os.environ.get("EXPORT_RETENTION_HOURS", "24"))
+
+# Year-end closing packs render their reports in parallel processes
+app.config["CLOSING_PACK_WORKERS"] = int(os.environ.get("CLOSING_PACK_WORKERS", os.cpu_count() or 1))
+
+# Journal imports read and insert their files a chunk of rows at a time
+app.config["JOURNAL_IMPORT_CHUNK_SIZE"] = int(os.environ.get("JOURNAL_IMPORT_CHUNK_SIZE", "50000"))
+
 # initialize the app with the extension
 db.init_app(app)
 
@@ -56,6 +70,17 @@ with app.app_context():
     # Create all tables
     db.create_all()
 
+    # Let report exports read while other requests write
+    from utils.schema import apply_migrations, create_missing_indexes, enable_sqlite_wal
+    enable_sqlite_wal()
+
+    # Convert existing data to the current column formats
+    apply_migrations()
+
+    # Create indexes added to the models after their tables were created
+    # (after the migrations that add their columns)
+    create_missing_indexes()
+
     # Import and register blueprints
     from routes.auth import auth_bp, init_roles
     from routes.accounting import accounting_bp
@@ -69,6 +94,18 @@ with app.app_context():
     app.register_blueprint(reports_bp)
     app.register_blueprint(deadlines_bp)
 
+    # Header notifications are shown on every page, including error pages
+    from utils.notifications import inject_notifications
+    app.context_processor(inject_notifications)
+
+    # Register command line tools
+    from utils.closing_pack import closing_pack_command
+    app.cli.add_command(closing_pack_command)
+    from utils.journal_import import import_journal_command
+    app.cli.add_command(import_journal_command)
+    from utils.payroll_import import import_payroll_command
+    app.cli.add_command(import_payroll_command)
+
     # Initialize login manager
     from models import User
     
@@ -78,3 +115,11 @@ with app.app_context():
         
     # Initialize roles
     init_roles()
+    
+    # Initialize ledger version and daily account balances
+    from utils.ledger import init_ledger
+    init_ledger()
+    
+    # Initialize the account hierarchy index
+    from utils.chart_of_accounts import init_account_tree
+    init_account_tree()
@@ -0,0 +1,105 @@
+"""
+Shared setup of the benchmark scripts.
+
+The scripts write seed data, so they only run against the database given
+explicitly in BENCHMARK_DATABASE_URL (e.g. sqlite:////tmp/benchmark.db),
+never against the application's own database. Run them from the
+application folder, e.g. python -m benchmarks.trial_balance
+"""
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+if not os.environ.get('BENCHMARK_DATABASE_URL'):
+    sys.exit("Set BENCHMARK_DATABASE_URL to a scratch database, e.g. sqlite:////tmp/benchmark.db")
+
+# The application reads its database URL on import
+os.environ['DATABASE_URL'] = os.environ['BENCHMARK_DATABASE_URL']
+
+import logging
+from app import app, db
+from models import Account, JournalEntry, JournalEntryLine, User
+from sqlalchemy import event
+from utils.ledger import rebuild_daily_balances
+
+logging.getLogger().setLevel(logging.WARNING)
+
+# The scripts import the application from here, once its database URL is set
+__all__ = ['app', 'db', 'best_time', 'count_queries', 'get_admin', 'seed_accounts', 'seed_journal']
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed in the block, in counter['queries']"""
+    counter = {'queries': 0}
+    
+    def count(*args, **kwargs):
+        counter['queries'] += 1
+    
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+def best_time(function, repeat=3):
+    """Return the shortest duration of several calls of a function, in seconds"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    
+    return min(durations)
+
+def seed_accounts():
+    """Load the PCM into an empty chart of accounts"""
+    from plan_comptable.pcm import initialize_pcm
+    
+    if Account.query.first() is None:
+        initialize_pcm()
+        db.session.commit()
+
+def get_admin():
+    """Return the administrator created by the application on first start"""
+    return User.query.filter_by(email='admin@example.com').first()
+
+def seed_journal(entry_count, year, seed=1):
+    """
+    Add balanced two-line journal entries spread over a year, with bulk
+    inserts, then rebuild the daily balances.
+    
+    Args:
+        entry_count (int): Number of entries to add
+        year (int): Year of the entry dates
+        seed (int): Seed of the random accounts, dates and amounts
+    """
+    seed_accounts()
+    rnd = random.Random(seed)
+    account_ids = [account_id for (account_id,) in db.session.query(Account.id)]
+    user_id = get_admin().id
+    
+    dates = [date(year, 1, 1) + timedelta(days=rnd.randint(0, 364)) for _ in range(entry_count)]
+    entry_table = JournalEntry.__table__
+    entry_ids = db.session.scalars(
+        entry_table.insert().returning(entry_table.c.id, sort_by_parameter_order=True),
+        [
+            {'date': entry_date, 'reference': f'BENCH{number}', 'description': 'Benchmark', 'created_by_id': user_id}
+            for number, entry_date in enumerate(dates)
+        ]
+    ).all()
+    
+    lines = []
+    for entry_id, entry_date in zip(entry_ids, dates):
+        debit_account, credit_account = rnd.sample(account_ids, 2)
+        amount = round(rnd.uniform(1, 10000), 2)
+        lines.append({'journal_entry_id': entry_id, 'account_id': debit_account, 'date': entry_date,
+                      'debit': amount, 'credit': 0})
+        lines.append({'journal_entry_id': entry_id, 'account_id': credit_account, 'date': entry_date,
+                      'debit': 0, 'credit': amount})
+    db.session.execute(JournalEntryLine.__table__.insert(), lines)
+    
+    rebuild_daily_balances()
+    db.session.commit()
@@ -0,0 +1,72 @@
+"""
+Time of the IR calculation from payroll lines, compared with a loop over
+the ORM lines using the scalar bracket chain calculate_ir used to apply.
+
+Usage: BENCHMARK_DATABASE_URL=sqlite:////tmp/benchmark.db python -m benchmarks.income_tax [EMPLOYEES]
+"""
+import random
+import sys
+import time
+from benchmarks.common import app, best_time, db
+from models import Employee, PayrollLine
+from utils.tax_calculator import calculate_ir
+
+YEAR = 2025
+
+def seed_payroll(employee_count):
+    """Add employees with twelve monthly payroll lines each"""
+    if Employee.query.count() >= employee_count:
+        return
+    
+    rnd = random.Random(5)
+    employee_table = Employee.__table__
+    employee_ids = db.session.scalars(
+        employee_table.insert().returning(employee_table.c.id, sort_by_parameter_order=True),
+        [{'name': f'Employé {number:05d}'} for number in range(employee_count)]
+    ).all()
+    
+    lines = []
+    for employee_id in employee_ids:
+        gross_salary = round(rnd.uniform(3000, 60000), 2)
+        for month in range(1, 13):
+            lines.append({
+                'employee_id': employee_id, 'year': YEAR, 'month': month, 'gross_salary': gross_salary,
+                'cnss': round(min(gross_salary, 6000) * 0.0448, 2), 'cimr': round(gross_salary * 0.03, 2)
+            })
+    db.session.execute(PayrollLine.__table__.insert(), lines)
+    db.session.commit()
+
+def scalar_ir(annual_income):
+    """IR of an annual net taxable income, one bracket at a time"""
+    if annual_income <= 30000:
+        return 0
+    if annual_income <= 50000:
+        return (annual_income - 30000) * 0.10
+    if annual_income <= 60000:
+        return 2000 + (annual_income - 50000) * 0.20
+    if annual_income <= 80000:
+        return 4000 + (annual_income - 60000) * 0.30
+    if annual_income <= 180000:
+        return 10000 + (annual_income - 80000) * 0.34
+    return 44000 + (annual_income - 180000) * 0.38
+
+def main():
+    employee_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    
+    with app.app_context():
+        seed_payroll(employee_count)
+        
+        for args in ((YEAR, 6), (YEAR,)):
+            calculate_ir(*args)
+            print(f"calculate_ir{args} : {best_time(lambda: calculate_ir(*args)):.3f} s, "
+                  f"IR total {calculate_ir(*args)['total_ir']:,.2f}")
+        
+        started = time.perf_counter()
+        total_ir = sum(
+            round(scalar_ir(float(line.gross_salary - line.cnss - line.cimr) * 12) / 12, 2)
+            for line in PayrollLine.query.filter_by(year=YEAR).all()
+        )
+        print(f"Boucle ORM et barème scalaire : {time.perf_counter() - started:.3f} s, IR total {total_ir:,.2f}")
+
+if __name__ == '__main__':
+    main()
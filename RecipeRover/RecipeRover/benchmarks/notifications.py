@@ -0,0 +1,59 @@
+"""
+Time of notifying every user of a deadline: one ORM object per user, the
+INSERT ... SELECT fan-out, and the fan-out handed to the background worker.
+
+Usage: BENCHMARK_DATABASE_URL=sqlite:////tmp/benchmark.db python -m benchmarks.notifications [USERS]
+"""
+import sys
+import time
+from datetime import date
+from benchmarks.common import app, db
+from models import Deadline, Notification, Role, User
+from utils.notifications import notification_executor, notify_all_users
+
+def add_users(count):
+    """Add users until there are at least count of them"""
+    missing = count - User.query.count()
+    if missing <= 0:
+        return
+    
+    role_id = Role.query.filter_by(name='Utilisateur').first().id
+    start = User.query.count()
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'bench{number}', 'email': f'bench{number}@example.com', 'password_hash': 'x', 'role_id': role_id}
+        for number in range(start, start + missing)
+    ])
+    db.session.commit()
+
+def main():
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    
+    with app.app_context():
+        add_users(user_count)
+        deadline = Deadline(title='Benchmark', due_date=date.today(), deadline_type='Tax')
+        db.session.add(deadline)
+        db.session.commit()
+        
+        started = time.perf_counter()
+        for user in User.query.all():
+            db.session.add(Notification(user_id=user.id, title='Boucle ORM', message='Benchmark', deadline_id=deadline.id))
+        db.session.commit()
+        print(f"Boucle ORM ({user_count} utilisateurs) : {time.perf_counter() - started:.2f} s")
+        
+        app.config['NOTIFICATIONS_IN_BACKGROUND'] = False
+        started = time.perf_counter()
+        notify_all_users('INSERT ... SELECT', 'Benchmark', deadline.id)
+        print(f"INSERT ... SELECT : {time.perf_counter() - started:.2f} s")
+        
+        app.config['NOTIFICATIONS_IN_BACKGROUND'] = True
+        started = time.perf_counter()
+        notify_all_users('Arrière-plan', 'Benchmark', deadline.id)
+        print(f"Arrière-plan, retour de l'appel : {(time.perf_counter() - started) * 1000:.1f} ms")
+        
+        # Wait for the worker before counting its notifications
+        notification_executor.submit(lambda: None).result()
+        print(f"Notifications écrites en arrière-plan : "
+              f"{Notification.query.filter_by(title='Arrière-plan').count()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Time of PDF exports, one after the other and from several threads sharing
+the process-wide styles.
+
+Usage: BENCHMARK_DATABASE_URL=sqlite:////tmp/benchmark.db python -m benchmarks.pdf_export
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from benchmarks.common import app, seed_journal
+from models import JournalEntry
+from utils.export import export_pdf
+from utils.report_generator import generate_balance_sheet
+
+START_DATE = date(2025, 1, 1)
+END_DATE = date(2025, 12, 31)
+
+# Number of exports timed in a row for each report. The journal export takes
+# about 2 s on the seeded 1,200 entries and its time per export is already
+# steady at x10, so x100 (over 3 minutes) is left out
+EXPORT_COUNTS = {'balance_sheet': (1, 10, 100), 'journal': (1, 10)}
+
+def main():
+    with app.app_context():
+        if JournalEntry.query.first() is None:
+            seed_journal(1200, 2025)
+        
+        reports = {
+            'balance_sheet': generate_balance_sheet(END_DATE),
+            'journal': {'start_date': START_DATE, 'end_date': END_DATE}
+        }
+        
+        for report_type, report_data in reports.items():
+            for count in EXPORT_COUNTS[report_type]:
+                started = time.perf_counter()
+                for _ in range(count):
+                    export_pdf(report_type, report_data, report_type, START_DATE, END_DATE)
+                duration = time.perf_counter() - started
+                print(f"{report_type:14s} x{count:<4d} {duration:7.3f} s  {duration / count * 1000:6.1f} ms/export")
+    
+    def export_balance_sheet(_):
+        with app.app_context():
+            export_pdf('balance_sheet', reports['balance_sheet'], 'balance_sheet', START_DATE, END_DATE)
+    
+    with ThreadPoolExecutor(8) as pool:
+        started = time.perf_counter()
+        list(pool.map(export_balance_sheet, range(100)))
+        print(f"balance_sheet x100 sur 8 threads {time.perf_counter() - started:.3f} s")
+
+if __name__ == '__main__':
+    main()
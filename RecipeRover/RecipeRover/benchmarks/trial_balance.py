@@ -0,0 +1,47 @@
+"""
+Queries and time of the trial balance as the chart of accounts grows.
+
+Usage: BENCHMARK_DATABASE_URL=sqlite:////tmp/benchmark.db python -m benchmarks.trial_balance
+"""
+from datetime import date
+from benchmarks.common import app, best_time, count_queries, db, seed_journal
+from models import Account
+from utils.ledger import CHART_VERSION_ID, bump_ledger_version
+from utils.report_generator import generate_trial_balance, report_cache
+
+def add_accounts(count):
+    """Add expense accounts to the chart, after the existing ones"""
+    if not count:
+        return
+    
+    start = Account.query.filter(Account.code.like('69%')).count()
+    db.session.execute(Account.__table__.insert(), [
+        {'code': f'69{start + number:06d}', 'name': f'Compte de test {start + number}',
+         'account_class': 6, 'account_type': 'Expense'}
+        for number in range(count)
+    ])
+    bump_ledger_version()
+    bump_ledger_version(version_id=CHART_VERSION_ID)
+    db.session.commit()
+
+def main():
+    with app.app_context():
+        if Account.query.first() is None:
+            seed_journal(2000, 2025)
+        
+        for added in (0, 500, 1500):
+            add_accounts(added)
+            
+            report_cache.clear()
+            with count_queries() as counter:
+                generate_trial_balance(date(2025, 12, 31))
+            
+            def uncached():
+                report_cache.clear()
+                generate_trial_balance(date(2025, 12, 31))
+            
+            print(f"{Account.query.count():6d} comptes : {counter['queries']} requêtes, "
+                  f"{best_time(uncached) * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
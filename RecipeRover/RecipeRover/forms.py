@@ -81,10 +81,14 @@ class JournalEntryForm(FlaskForm):
     description = TextAreaField('Description', validators=[Optional(), Length(max=255)])
     submit = SubmitField('Enregistrer')
 
+class PeriodClosingForm(FlaskForm):
+    end_date = DateField('Date de clôture', validators=[DataRequired()])
+    submit = SubmitField('Clôturer la période')
+
 class JournalEntryLineForm(FlaskForm):
     account_id = SelectField('Compte', validators=[DataRequired()], coerce=int)
-    debit = FloatField('Débit', validators=[Optional(), NumberRange(min=0)])
-    credit = FloatField('Crédit', validators=[Optional(), NumberRange(min=0)])
+    debit = DecimalField('Débit', places=2, validators=[Optional(), NumberRange(min=0)])
+    credit = DecimalField('Crédit', places=2, validators=[Optional(), NumberRange(min=0)])
     description = StringField('Description', validators=[Optional(), Length(max=255)])
 
 class InvoiceForm(FlaskForm):
@@ -99,7 +103,7 @@ class InvoiceForm(FlaskForm):
 class InvoiceLineForm(FlaskForm):
     description = StringField('Description', validators=[DataRequired(), Length(max=255)])
     quantity = FloatField('Quantité', validators=[DataRequired(), NumberRange(min=0.01)])
-    unit_price = FloatField('Prix unitaire', validators=[DataRequired(), NumberRange(min=0)])
+    unit_price = DecimalField('Prix unitaire', places=2, validators=[DataRequired(), NumberRange(min=0)])
     tva_rate = SelectField('Taux TVA', choices=[(20, '20%'), (14, '14%'), (10, '10%'), (7, '7%'), (0, '0%')], validators=[DataRequired()], coerce=float)
     
 class TaxDeclarationForm(FlaskForm):
@@ -136,6 +140,7 @@ class ExportForm(FlaskForm):
         ('ledger', 'Grand Livre'),
         ('balance_sheet', 'Bilan'),
         ('income_statement', 'CPC'),
+        ('trial_balance', 'Balance'),
         ('vat', 'TVA')
     ], validators=[DataRequired()])
     format_type = SelectField('Format', choices=[
@@ -145,3 +150,7 @@ class ExportForm(FlaskForm):
     start_date = DateField('Date de début', validators=[DataRequired()])
     end_date = DateField('Date de fin', validators=[DataRequired()])
     submit = SubmitField('Exporter')
+
+class ClosingPackForm(FlaskForm):
+    year = IntegerField('Exercice', validators=[DataRequired(), NumberRange(min=2000, max=2100)])
+    submit = SubmitField('Générer le dossier de clôture')
@@ -1,8 +1,45 @@
+import operator
 from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
 from app import db
 from flask_login import UserMixin
+from sqlalchemy.types import BigInteger, Numeric, TypeDecorator
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# Money Type (amounts stored as integer centimes, handled as Decimal in Python)
+class Money(TypeDecorator):
+    """
+    Exact money amount in MAD.
+    
+    Amounts are stored as an integer number of centimes, so the database sums
+    and compares integers, and are read back as Decimal values with two
+    decimal places. Adding or subtracting amounts in SQL keeps the Money type;
+    multiplying or dividing by a plain number does not turn it into centimes.
+    """
+    impl = BigInteger
+    cache_ok = True
+    
+    class Comparator(TypeDecorator.Comparator):
+        def _adapt_expression(self, op, other_comparator):
+            return op, self.type
+    
+    comparator_factory = Comparator
+    
+    def coerce_compared_value(self, op, value):
+        if op in (operator.mul, operator.truediv):
+            return Numeric()
+        return self
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return int((Decimal(str(value)) * 100).to_integral_value(ROUND_HALF_UP))
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return Decimal(round(value)).scaleb(-2)
+
 # User Roles
 class Role(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -77,6 +114,15 @@ class Account(db.Model):
     def __repr__(self):
         return f"<Account {self.code} - {self.name}>"
 
+# Account Tree Model (hierarchy closure table: one row per account and each of its ancestors, itself included)
+class AccountTree(db.Model):
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True, index=True)
+    depth = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f"<AccountTree {self.ancestor_id} - {self.descendant_id}>"
+
 # Journal Entry Model
 class JournalEntry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -87,6 +133,9 @@ class JournalEntry(db.Model):
     created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_by = db.relationship('User', backref='journal_entries')
     lines = db.relationship('JournalEntryLine', backref='journal_entry', lazy=True, cascade="all, delete-orphan")
+    __table_args__ = (
+        db.Index('ix_journal_entry_date_id', 'date', 'id'),
+    )
     
     def __repr__(self):
         return f"<JournalEntry {self.id} - {self.date}>"
@@ -94,34 +143,85 @@ class JournalEntry(db.Model):
 # Journal Entry Line Model
 class JournalEntryLine(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    journal_entry_id = db.Column(db.Integer, db.ForeignKey('journal_entry.id'), nullable=False)
+    journal_entry_id = db.Column(db.Integer, db.ForeignKey('journal_entry.id'), nullable=False, index=True)
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     account = db.relationship('Account')
-    debit = db.Column(db.Float, default=0.0)
-    credit = db.Column(db.Float, default=0.0)
+    debit = db.Column(Money, default=0)
+    credit = db.Column(Money, default=0)
     description = db.Column(db.String(255), nullable=True)
+    date = db.Column(db.Date, nullable=True)  # Date of the journal entry, kept in sync on flush
+    __table_args__ = (
+        db.Index('ix_journal_entry_line_account_entry', 'account_id', 'journal_entry_id'),
+        db.Index('ix_journal_entry_line_account_date', 'account_id', 'date', 'id'),
+    )
     
     def __repr__(self):
         return f"<JournalEntryLine {self.id} - {self.account.code}>"
 
+# Account Daily Balance Model (debit/credit sums per account and day, maintained from journal lines)
+class AccountDailyBalance(db.Model):
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    debit = db.Column(Money, nullable=False, default=0)
+    credit = db.Column(Money, nullable=False, default=0)
+    __table_args__ = (
+        db.Index('ix_account_daily_balance_date', 'date'),
+    )
+    
+    def __repr__(self):
+        return f"<AccountDailyBalance {self.account_id} - {self.date}>"
+
+# Ledger Version Model (one row per version, incremented on every journal or account write to invalidate caches)
+class LedgerVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<LedgerVersion {self.version}>"
+
+# Period Closing Model (journal entries up to end_date are locked)
+class PeriodClosing(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    end_date = db.Column(db.Date, nullable=False, unique=True, index=True)
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    closed_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    closed_by = db.relationship('User')
+    balances = db.relationship('AccountClosingBalance', backref='closing', lazy=True, cascade="all, delete-orphan")
+    
+    def __repr__(self):
+        return f"<PeriodClosing {self.end_date}>"
+
+# Account Closing Balance Model (debit/credit sums per account from the first entry up to a closed period end)
+class AccountClosingBalance(db.Model):
+    closing_id = db.Column(db.Integer, db.ForeignKey('period_closing.id'), primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True)
+    debit = db.Column(Money, nullable=False, default=0)
+    credit = db.Column(Money, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<AccountClosingBalance {self.closing_id} - {self.account_id}>"
+
 # Invoice Model
 class Invoice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.today)
-    due_date = db.Column(db.Date, nullable=True)
+    due_date = db.Column(db.Date, nullable=True, index=True)
     client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=True)
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'), nullable=True)
     invoice_type = db.Column(db.String(20), nullable=False)  # 'client' or 'supplier'
-    total_ht = db.Column(db.Float, default=0.0)  # Total without tax
-    total_tva = db.Column(db.Float, default=0.0)  # VAT total
-    total_ttc = db.Column(db.Float, default=0.0)  # Total with tax
-    paid = db.Column(db.Boolean, default=False)
+    total_ht = db.Column(Money, default=0)  # Total without tax
+    total_tva = db.Column(Money, default=0)  # VAT total
+    total_ttc = db.Column(Money, default=0)  # Total with tax
+    paid = db.Column(db.Boolean, default=False, index=True)
     payment_date = db.Column(db.Date, nullable=True)
     journal_entry_id = db.Column(db.Integer, db.ForeignKey('journal_entry.id'), nullable=True)
     journal_entry = db.relationship('JournalEntry')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     lines = db.relationship('InvoiceLine', backref='invoice', lazy=True, cascade="all, delete-orphan")
+    __table_args__ = (
+        db.Index('ix_invoice_type_date', 'invoice_type', 'date'),
+    )
     
     def __repr__(self):
         return f"<Invoice {self.invoice_number}>"
@@ -129,18 +229,51 @@ class Invoice(db.Model):
 # Invoice Line Model
 class InvoiceLine(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False, index=True)
     description = db.Column(db.String(255), nullable=False)
     quantity = db.Column(db.Float, nullable=False, default=1)
-    unit_price = db.Column(db.Float, nullable=False)
+    unit_price = db.Column(Money, nullable=False)
     tva_rate = db.Column(db.Float, nullable=False, default=20.0)  # 20%, 14%, 10%, 7% in Morocco
-    total_ht = db.Column(db.Float, nullable=False)
-    total_tva = db.Column(db.Float, nullable=False)
-    total_ttc = db.Column(db.Float, nullable=False)
+    total_ht = db.Column(Money, nullable=False)
+    total_tva = db.Column(Money, nullable=False)
+    total_ttc = db.Column(Money, nullable=False)
     
     def __repr__(self):
         return f"<InvoiceLine {self.id} - {self.description}>"
 
+# Employee Model
+class Employee(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    cin = db.Column(db.String(20), unique=True, nullable=True)  # CIN = Carte d'Identité Nationale
+    cnss_number = db.Column(db.String(20), nullable=True)
+    position = db.Column(db.String(100), nullable=True)
+    hire_date = db.Column(db.Date, nullable=True)
+    active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    payroll_lines = db.relationship('PayrollLine', backref='employee', lazy=True, cascade="all, delete-orphan")
+    
+    def __repr__(self):
+        return f"<Employee {self.name}>"
+
+# Payroll Line Model (monthly salary of an employee)
+class PayrollLine(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    gross_salary = db.Column(Money, nullable=False)  # Taxable gross salary
+    cnss = db.Column(Money, nullable=False, default=0)  # Employee CNSS contribution
+    cimr = db.Column(Money, nullable=False, default=0)  # Employee CIMR contribution
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint('employee_id', 'year', 'month'),
+        db.Index('ix_payroll_line_period', 'year', 'month')
+    )
+    
+    def __repr__(self):
+        return f"<PayrollLine {self.employee_id} - {self.month}/{self.year}>"
+
 # Tax Declaration Model
 class TaxDeclaration(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -151,7 +284,7 @@ class TaxDeclaration(db.Model):
     submission_deadline = db.Column(db.Date, nullable=False)
     submitted = db.Column(db.Boolean, default=False)
     submission_date = db.Column(db.Date, nullable=True)
-    total_amount = db.Column(db.Float, default=0.0)
+    total_amount = db.Column(Money, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
@@ -162,7 +295,7 @@ class Deadline(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(255), nullable=True)
-    due_date = db.Column(db.Date, nullable=False)
+    due_date = db.Column(db.Date, nullable=False, index=True)
     deadline_type = db.Column(db.String(50), nullable=False)  # 'Tax', 'Invoice', 'CNSS', etc.
     completed = db.Column(db.Boolean, default=False)
     completed_date = db.Column(db.Date, nullable=True)
@@ -182,6 +315,36 @@ class Notification(db.Model):
     deadline = db.relationship('Deadline')
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_notification_user_read', 'user_id', 'is_read'),
+    )
     
     def __repr__(self):
         return f"<Notification {self.title} for {self.user.username}>"
+
+# Export Job Model (report exports generated by a background worker)
+class ExportJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    user = db.relationship('User')
+    report_type = db.Column(db.String(20), nullable=False)  # 'journal', 'ledger', 'balance_sheet', etc.
+    format_type = db.Column(db.String(10), nullable=False)  # 'pdf' or 'excel'
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'done', 'failed'
+    progress = db.Column(db.Integer, nullable=False, default=0)  # Percentage
+    file_name = db.Column(db.String(255), nullable=True)  # Generated file, in the export folder
+    error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<ExportJob {self.id} {self.report_type} {self.status}>"
+
+# Schema Migration Model (data migrations already applied to the database)
+class SchemaMigration(db.Model):
+    name = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<SchemaMigration {self.name}>"
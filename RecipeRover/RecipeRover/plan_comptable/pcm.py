@@ -5,1255 +5,243 @@ This module provides the structure and data for the Moroccan Chart of Accounts.
 
 from app import db
 from models import Account
+from utils.chart_of_accounts import rebuild_account_tree
+from utils.ledger import CHART_VERSION_ID, bump_ledger_version
+from sqlalchemy import insert, update
 
-def initialize_pcm():
-    """
-    Initialize the Moroccan Chart of Accounts in the database.
-    Creates all standard accounts defined in the PCM if they don't already exist.
-    """
-    # Only initialize if there are no accounts in the database
-    if Account.query.count() == 0:
-        # Create accounts by class
-        create_class_1_accounts()
-        create_class_2_accounts()
-        create_class_3_accounts()
-        create_class_4_accounts()
-        create_class_5_accounts()
-        create_class_6_accounts()
-        create_class_7_accounts()
-        
-        # Commit all changes
-        db.session.commit()
-        
-        return True
-    
-    return False
-
-def create_class_1_accounts():
-    """Create Class 1 accounts: Financing Accounts"""
-    # Main parent accounts
-    class_1 = Account(
-        code="1", 
-        name="Comptes de financement permanent",
-        account_class=1,
-        account_type="Equity"
-    )
-    db.session.add(class_1)
-    db.session.flush()
-    
-    # Subgroup accounts
-    accounts = [
-        Account(
-            code="11", 
-            name="Capitaux propres",
-            account_class=1,
-            account_type="Equity",
-            parent_id=class_1.id
-        ),
-        Account(
-            code="13", 
-            name="Capitaux propres assimilés",
-            account_class=1,
-            account_type="Equity",
-            parent_id=class_1.id
-        ),
-        Account(
-            code="14", 
-            name="Dettes de financement",
-            account_class=1,
-            account_type="Liability",
-            parent_id=class_1.id
-        ),
-        Account(
-            code="15", 
-            name="Provisions durables pour risques et charges",
-            account_class=1,
-            account_type="Liability",
-            parent_id=class_1.id
-        ),
-        Account(
-            code="16", 
-            name="Comptes de liaison des établissements et succursales",
-            account_class=1,
-            account_type="Equity",
-            parent_id=class_1.id
-        ),
-        Account(
-            code="17", 
-            name="Écarts de conversion - Passif",
-            account_class=1,
-            account_type="Equity",
-            parent_id=class_1.id
-        ),
-        Account(
-            code="18", 
-            name="Comptes de liaison des sociétés en participation",
-            account_class=1,
-            account_type="Equity",
-            parent_id=class_1.id
-        ),
-    ]
-    
-    for account in accounts:
-        db.session.add(account)
-    
-    db.session.flush()
-    
-    # Detailed accounts for each subgroup
-    # Capital and reserves (11)
-    capital_account = next(a for a in accounts if a.code == "11")
-    capital_accounts = [
-        Account(
-            code="111", 
-            name="Capital social ou personnel",
-            account_class=1,
-            account_type="Equity",
-            parent_id=capital_account.id
-        ),
-        Account(
-            code="112", 
-            name="Primes d'émission, de fusion et d'apport",
-            account_class=1,
-            account_type="Equity",
-            parent_id=capital_account.id
-        ),
-        Account(
-            code="113", 
-            name="Écarts de réévaluation",
-            account_class=1,
-            account_type="Equity",
-            parent_id=capital_account.id
-        ),
-        Account(
-            code="114", 
-            name="Réserve légale",
-            account_class=1,
-            account_type="Equity",
-            parent_id=capital_account.id
-        ),
-        Account(
-            code="115", 
-            name="Autres réserves",
-            account_class=1,
-            account_type="Equity",
-            parent_id=capital_account.id
-        ),
-        Account(
-            code="116", 
-            name="Report à nouveau",
-            account_class=1,
-            account_type="Equity",
-            parent_id=capital_account.id
-        ),
-        Account(
-            code="118", 
-            name="Résultats nets en instance d'affectation",
-            account_class=1,
-            account_type="Equity",
-            parent_id=capital_account.id
-        ),
-        Account(
-            code="119", 
-            name="Résultat net de l'exercice",
-            account_class=1,
-            account_type="Equity",
-            parent_id=capital_account.id
-        ),
-    ]
-    
-    for account in capital_accounts:
-        db.session.add(account)
-    
-    # Similar structure for other subgroups...
-    # Long-term financing (14)
-    financing_account = next(a for a in accounts if a.code == "14")
-    financing_accounts = [
-        Account(
-            code="141", 
-            name="Emprunts obligataires",
-            account_class=1,
-            account_type="Liability",
-            parent_id=financing_account.id
-        ),
-        Account(
-            code="148", 
-            name="Autres dettes de financement",
-            account_class=1,
-            account_type="Liability",
-            parent_id=financing_account.id
-        ),
-    ]
-    
-    for account in financing_accounts:
-        db.session.add(account)
-
-def create_class_2_accounts():
-    """Create Class 2 accounts: Fixed Assets"""
-    # Main parent account
-    class_2 = Account(
-        code="2", 
-        name="Comptes d'actif immobilisé",
-        account_class=2,
-        account_type="Asset"
-    )
-    db.session.add(class_2)
-    db.session.flush()
-    
-    # Subgroup accounts
-    accounts = [
-        Account(
-            code="21", 
-            name="Immobilisations en non-valeurs",
-            account_class=2,
-            account_type="Asset",
-            parent_id=class_2.id
-        ),
-        Account(
-            code="22", 
-            name="Immobilisations incorporelles",
-            account_class=2,
-            account_type="Asset",
-            parent_id=class_2.id
-        ),
-        Account(
-            code="23", 
-            name="Immobilisations corporelles",
-            account_class=2,
-            account_type="Asset",
-            parent_id=class_2.id
-        ),
-        Account(
-            code="24", 
-            name="Immobilisations financières",
-            account_class=2,
-            account_type="Asset",
-            parent_id=class_2.id
-        ),
-        Account(
-            code="25", 
-            name="Immobilisations en cours",
-            account_class=2,
-            account_type="Asset",
-            parent_id=class_2.id
-        ),
-        Account(
-            code="27", 
-            name="Écarts de conversion - Actif",
-            account_class=2,
-            account_type="Asset",
-            parent_id=class_2.id
-        ),
-        Account(
-            code="28", 
-            name="Amortissements des immobilisations",
-            account_class=2,
-            account_type="Asset",
-            parent_id=class_2.id
-        ),
-        Account(
-            code="29", 
-            name="Provisions pour dépréciation des immobilisations",
-            account_class=2,
-            account_type="Asset",
-            parent_id=class_2.id
-        ),
-    ]
-    
-    for account in accounts:
-        db.session.add(account)
-    
-    db.session.flush()
-    
-    # Detailed accounts for some subgroups
-    # Intangible assets (22)
-    intangible_account = next(a for a in accounts if a.code == "22")
-    intangible_accounts = [
-        Account(
-            code="221", 
-            name="Immobilisations en recherche et développement",
-            account_class=2,
-            account_type="Asset",
-            parent_id=intangible_account.id
-        ),
-        Account(
-            code="222", 
-            name="Brevets, marques, droits et valeurs similaires",
-            account_class=2,
-            account_type="Asset",
-            parent_id=intangible_account.id
-        ),
-        Account(
-            code="223", 
-            name="Fonds commercial",
-            account_class=2,
-            account_type="Asset",
-            parent_id=intangible_account.id
-        ),
-    ]
-    
-    for account in intangible_accounts:
-        db.session.add(account)
-    
-    # Tangible assets (23)
-    tangible_account = next(a for a in accounts if a.code == "23")
-    tangible_accounts = [
-        Account(
-            code="231", 
-            name="Terrains",
-            account_class=2,
-            account_type="Asset",
-            parent_id=tangible_account.id
-        ),
-        Account(
-            code="232", 
-            name="Constructions",
-            account_class=2,
-            account_type="Asset",
-            parent_id=tangible_account.id
-        ),
-        Account(
-            code="233", 
-            name="Installations techniques, matériel et outillage",
-            account_class=2,
-            account_type="Asset",
-            parent_id=tangible_account.id
-        ),
-        Account(
-            code="234", 
-            name="Matériel de transport",
-            account_class=2,
-            account_type="Asset",
-            parent_id=tangible_account.id
-        ),
-        Account(
-            code="235", 
-            name="Mobilier, matériel de bureau et aménagements divers",
-            account_class=2,
-            account_type="Asset",
-            parent_id=tangible_account.id
-        ),
-    ]
-    
-    for account in tangible_accounts:
-        db.session.add(account)
-
-def create_class_3_accounts():
-    """Create Class 3 accounts: Current Assets"""
-    # Main parent account
-    class_3 = Account(
-        code="3", 
-        name="Comptes d'actif circulant (hors trésorerie)",
-        account_class=3,
-        account_type="Asset"
-    )
-    db.session.add(class_3)
-    db.session.flush()
-    
-    # Subgroup accounts
-    accounts = [
-        Account(
-            code="31", 
-            name="Stocks",
-            account_class=3,
-            account_type="Asset",
-            parent_id=class_3.id
-        ),
-        Account(
-            code="34", 
-            name="Créances de l'actif circulant",
-            account_class=3,
-            account_type="Asset",
-            parent_id=class_3.id
-        ),
-        Account(
-            code="35", 
-            name="Titres et valeurs de placement",
-            account_class=3,
-            account_type="Asset",
-            parent_id=class_3.id
-        ),
-        Account(
-            code="37", 
-            name="Écarts de conversion - Actif (Éléments circulants)",
-            account_class=3,
-            account_type="Asset",
-            parent_id=class_3.id
-        ),
-        Account(
-            code="39", 
-            name="Provisions pour dépréciation des comptes de l'actif circulant",
-            account_class=3,
-            account_type="Asset",
-            parent_id=class_3.id
-        ),
-    ]
-    
-    for account in accounts:
-        db.session.add(account)
-    
-    db.session.flush()
-    
-    # Detailed accounts for some subgroups
-    # Stocks (31)
-    stocks_account = next(a for a in accounts if a.code == "31")
-    stocks_accounts = [
-        Account(
-            code="311", 
-            name="Marchandises",
-            account_class=3,
-            account_type="Asset",
-            parent_id=stocks_account.id
-        ),
-        Account(
-            code="312", 
-            name="Matières et fournitures consommables",
-            account_class=3,
-            account_type="Asset",
-            parent_id=stocks_account.id
-        ),
-        Account(
-            code="313", 
-            name="Produits en cours",
-            account_class=3,
-            account_type="Asset",
-            parent_id=stocks_account.id
-        ),
-        Account(
-            code="314", 
-            name="Produits intermédiaires et produits résiduels",
-            account_class=3,
-            account_type="Asset",
-            parent_id=stocks_account.id
-        ),
-        Account(
-            code="315", 
-            name="Produits finis",
-            account_class=3,
-            account_type="Asset",
-            parent_id=stocks_account.id
-        ),
-    ]
-    
-    for account in stocks_accounts:
-        db.session.add(account)
-    
-    # Receivables (34)
-    receivables_account = next(a for a in accounts if a.code == "34")
-    receivables_accounts = [
-        Account(
-            code="341", 
-            name="Fournisseurs débiteurs, avances et acomptes",
-            account_class=3,
-            account_type="Asset",
-            parent_id=receivables_account.id
-        ),
-        Account(
-            code="342", 
-            name="Clients et comptes rattachés",
-            account_class=3,
-            account_type="Asset",
-            parent_id=receivables_account.id
-        ),
-        Account(
-            code="343", 
-            name="Personnel - débiteur",
-            account_class=3,
-            account_type="Asset",
-            parent_id=receivables_account.id
-        ),
-        Account(
-            code="345", 
-            name="État - débiteur",
-            account_class=3,
-            account_type="Asset",
-            parent_id=receivables_account.id
-        ),
-        Account(
-            code="346", 
-            name="Comptes d'associés - débiteurs",
-            account_class=3,
-            account_type="Asset",
-            parent_id=receivables_account.id
-        ),
-        Account(
-            code="348", 
-            name="Autres débiteurs",
-            account_class=3,
-            account_type="Asset",
-            parent_id=receivables_account.id
-        ),
-        Account(
-            code="349", 
-            name="Comptes de régularisation - actif",
-            account_class=3,
-            account_type="Asset",
-            parent_id=receivables_account.id
-        ),
-    ]
-    
-    for account in receivables_accounts:
-        db.session.add(account)
-    
-    # State receivables (345)
-    state_receivables = next(a for a in receivables_accounts if a.code == "345")
-    state_receivables_accounts = [
-        Account(
-            code="3451", 
-            name="Subventions à recevoir",
-            account_class=3,
-            account_type="Asset",
-            parent_id=state_receivables.id
-        ),
-        Account(
-            code="3455", 
-            name="État - TVA récupérable",
-            account_class=3,
-            account_type="Asset",
-            parent_id=state_receivables.id
-        ),
-        Account(
-            code="3456", 
-            name="État - Crédit de TVA (suivant déclaration)",
-            account_class=3,
-            account_type="Asset",
-            parent_id=state_receivables.id
-        ),
-        Account(
-            code="3458", 
-            name="État - Autres comptes débiteurs",
-            account_class=3,
-            account_type="Asset",
-            parent_id=state_receivables.id
-        ),
-    ]
-    
-    for account in state_receivables_accounts:
-        db.session.add(account)
-
-def create_class_4_accounts():
-    """Create Class 4 accounts: Current Liabilities"""
-    # Main parent account
-    class_4 = Account(
-        code="4", 
-        name="Comptes de passif circulant (hors trésorerie)",
-        account_class=4,
-        account_type="Liability"
-    )
-    db.session.add(class_4)
-    db.session.flush()
-    
-    # Subgroup accounts
-    accounts = [
-        Account(
-            code="44", 
-            name="Dettes du passif circulant",
-            account_class=4,
-            account_type="Liability",
-            parent_id=class_4.id
-        ),
-        Account(
-            code="45", 
-            name="Autres provisions pour risques et charges",
-            account_class=4,
-            account_type="Liability",
-            parent_id=class_4.id
-        ),
-        Account(
-            code="47", 
-            name="Écarts de conversion - Passif (Éléments circulants)",
-            account_class=4,
-            account_type="Liability",
-            parent_id=class_4.id
-        ),
-    ]
-    
-    for account in accounts:
-        db.session.add(account)
-    
-    db.session.flush()
-    
-    # Detailed accounts for some subgroups
-    # Payables (44)
-    payables_account = next(a for a in accounts if a.code == "44")
-    payables_accounts = [
-        Account(
-            code="441", 
-            name="Fournisseurs et comptes rattachés",
-            account_class=4,
-            account_type="Liability",
-            parent_id=payables_account.id
-        ),
-        Account(
-            code="442", 
-            name="Clients créditeurs, avances et acomptes",
-            account_class=4,
-            account_type="Liability",
-            parent_id=payables_account.id
-        ),
-        Account(
-            code="443", 
-            name="Personnel - créditeur",
-            account_class=4,
-            account_type="Liability",
-            parent_id=payables_account.id
-        ),
-        Account(
-            code="444", 
-            name="Organismes sociaux",
-            account_class=4,
-            account_type="Liability",
-            parent_id=payables_account.id
-        ),
-        Account(
-            code="445", 
-            name="État - créditeur",
-            account_class=4,
-            account_type="Liability",
-            parent_id=payables_account.id
-        ),
-        Account(
-            code="446", 
-            name="Comptes d'associés - créditeurs",
-            account_class=4,
-            account_type="Liability",
-            parent_id=payables_account.id
-        ),
-        Account(
-            code="448", 
-            name="Autres créanciers",
-            account_class=4,
-            account_type="Liability",
-            parent_id=payables_account.id
-        ),
-        Account(
-            code="449", 
-            name="Comptes de régularisation - passif",
-            account_class=4,
-            account_type="Liability",
-            parent_id=payables_account.id
-        ),
-    ]
-    
-    for account in payables_accounts:
-        db.session.add(account)
-    
-    # State payables (445)
-    state_payables = next(a for a in payables_accounts if a.code == "445")
-    state_payables_accounts = [
-        Account(
-            code="4451", 
-            name="État - TVA facturée",
-            account_class=4,
-            account_type="Liability",
-            parent_id=state_payables.id
-        ),
-        Account(
-            code="4452", 
-            name="État - TVA due (suivant déclaration)",
-            account_class=4,
-            account_type="Liability",
-            parent_id=state_payables.id
-        ),
-        Account(
-            code="4453", 
-            name="État - Acomptes sur impôts sur les résultats",
-            account_class=4,
-            account_type="Liability",
-            parent_id=state_payables.id
-        ),
-        Account(
-            code="4454", 
-            name="État - Impôts sur les résultats",
-            account_class=4,
-            account_type="Liability",
-            parent_id=state_payables.id
-        ),
-        Account(
-            code="4455", 
-            name="État - Taxes sur le chiffre d'affaires",
-            account_class=4,
-            account_type="Liability",
-            parent_id=state_payables.id
-        ),
-        Account(
-            code="4456", 
-            name="État - Taxes sur le revenu",
-            account_class=4,
-            account_type="Liability",
-            parent_id=state_payables.id
-        ),
-        Account(
-            code="4458", 
-            name="État - Autres comptes créditeurs",
-            account_class=4,
-            account_type="Liability",
-            parent_id=state_payables.id
-        ),
-    ]
-    
-    for account in state_payables_accounts:
-        db.session.add(account)
+# Standard PCM accounts as (code, account type, name), ordered by code.
+# The class of an account is the first digit of its code and its parent is
+# the account with the longest code that is a prefix of its own.
+PCM_ACCOUNTS = [
+    # Class 1: Financing Accounts
+    ("1", "Equity", "Comptes de financement permanent"),
+    ("11", "Equity", "Capitaux propres"),
+    ("111", "Equity", "Capital social ou personnel"),
+    ("112", "Equity", "Primes d'émission, de fusion et d'apport"),
+    ("113", "Equity", "Écarts de réévaluation"),
+    ("114", "Equity", "Réserve légale"),
+    ("115", "Equity", "Autres réserves"),
+    ("116", "Equity", "Report à nouveau"),
+    ("118", "Equity", "Résultats nets en instance d'affectation"),
+    ("119", "Equity", "Résultat net de l'exercice"),
+    ("13", "Equity", "Capitaux propres assimilés"),
+    ("14", "Liability", "Dettes de financement"),
+    ("141", "Liability", "Emprunts obligataires"),
+    ("148", "Liability", "Autres dettes de financement"),
+    ("15", "Liability", "Provisions durables pour risques et charges"),
+    ("16", "Equity", "Comptes de liaison des établissements et succursales"),
+    ("17", "Equity", "Écarts de conversion - Passif"),
+    ("18", "Equity", "Comptes de liaison des sociétés en participation"),
+    
+    # Class 2: Fixed Assets
+    ("2", "Asset", "Comptes d'actif immobilisé"),
+    ("21", "Asset", "Immobilisations en non-valeurs"),
+    ("22", "Asset", "Immobilisations incorporelles"),
+    ("221", "Asset", "Immobilisations en recherche et développement"),
+    ("222", "Asset", "Brevets, marques, droits et valeurs similaires"),
+    ("223", "Asset", "Fonds commercial"),
+    ("23", "Asset", "Immobilisations corporelles"),
+    ("231", "Asset", "Terrains"),
+    ("232", "Asset", "Constructions"),
+    ("233", "Asset", "Installations techniques, matériel et outillage"),
+    ("234", "Asset", "Matériel de transport"),
+    ("235", "Asset", "Mobilier, matériel de bureau et aménagements divers"),
+    ("24", "Asset", "Immobilisations financières"),
+    ("25", "Asset", "Immobilisations en cours"),
+    ("27", "Asset", "Écarts de conversion - Actif"),
+    ("28", "Asset", "Amortissements des immobilisations"),
+    ("29", "Asset", "Provisions pour dépréciation des immobilisations"),
+    
+    # Class 3: Current Assets
+    ("3", "Asset", "Comptes d'actif circulant (hors trésorerie)"),
+    ("31", "Asset", "Stocks"),
+    ("311", "Asset", "Marchandises"),
+    ("312", "Asset", "Matières et fournitures consommables"),
+    ("313", "Asset", "Produits en cours"),
+    ("314", "Asset", "Produits intermédiaires et produits résiduels"),
+    ("315", "Asset", "Produits finis"),
+    ("34", "Asset", "Créances de l'actif circulant"),
+    ("341", "Asset", "Fournisseurs débiteurs, avances et acomptes"),
+    ("342", "Asset", "Clients et comptes rattachés"),
+    ("343", "Asset", "Personnel - débiteur"),
+    ("345", "Asset", "État - débiteur"),
+    ("3451", "Asset", "Subventions à recevoir"),
+    ("3455", "Asset", "État - TVA récupérable"),
+    ("3456", "Asset", "État - Crédit de TVA (suivant déclaration)"),
+    ("3458", "Asset", "État - Autres comptes débiteurs"),
+    ("346", "Asset", "Comptes d'associés - débiteurs"),
+    ("348", "Asset", "Autres débiteurs"),
+    ("349", "Asset", "Comptes de régularisation - actif"),
+    ("35", "Asset", "Titres et valeurs de placement"),
+    ("37", "Asset", "Écarts de conversion - Actif (Éléments circulants)"),
+    ("39", "Asset", "Provisions pour dépréciation des comptes de l'actif circulant"),
+    
+    # Class 4: Current Liabilities
+    ("4", "Liability", "Comptes de passif circulant (hors trésorerie)"),
+    ("44", "Liability", "Dettes du passif circulant"),
+    ("441", "Liability", "Fournisseurs et comptes rattachés"),
+    ("442", "Liability", "Clients créditeurs, avances et acomptes"),
+    ("443", "Liability", "Personnel - créditeur"),
+    ("444", "Liability", "Organismes sociaux"),
+    ("445", "Liability", "État - créditeur"),
+    ("4451", "Liability", "État - TVA facturée"),
+    ("4452", "Liability", "État - TVA due (suivant déclaration)"),
+    ("4453", "Liability", "État - Acomptes sur impôts sur les résultats"),
+    ("4454", "Liability", "État - Impôts sur les résultats"),
+    ("4455", "Liability", "État - Taxes sur le chiffre d'affaires"),
+    ("4456", "Liability", "État - Taxes sur le revenu"),
+    ("4458", "Liability", "État - Autres comptes créditeurs"),
+    ("446", "Liability", "Comptes d'associés - créditeurs"),
+    ("448", "Liability", "Autres créanciers"),
+    ("449", "Liability", "Comptes de régularisation - passif"),
+    ("45", "Liability", "Autres provisions pour risques et charges"),
+    ("47", "Liability", "Écarts de conversion - Passif (Éléments circulants)"),
+    
+    # Class 5: Cash and Cash Equivalents
+    ("5", "Asset", "Comptes de trésorerie"),
+    ("51", "Asset", "Trésorerie - Actif"),
+    ("511", "Asset", "Chèques et valeurs à encaisser"),
+    ("512", "Asset", "Banques, Trésorerie Générale et CCP"),
+    ("514", "Asset", "Régies d'avances et accréditifs"),
+    ("516", "Asset", "Caisses, régies d'avances et accréditifs"),
+    ("55", "Liability", "Trésorerie - Passif"),
+    ("552", "Liability", "Crédits d'escompte"),
+    ("553", "Liability", "Crédits de trésorerie"),
+    ("554", "Liability", "Banques (soldes créditeurs)"),
+    ("59", "Asset", "Provisions pour dépréciation des comptes de trésorerie"),
+    
+    # Class 6: Expenses
+    ("6", "Expense", "Comptes de charges"),
+    ("61", "Expense", "Charges d'exploitation"),
+    ("611", "Expense", "Achats revendus de marchandises"),
+    ("612", "Expense", "Achats consommés de matières et fournitures"),
+    ("613", "Expense", "Autres charges externes"),
+    ("6131", "Expense", "Locations et charges locatives"),
+    ("6132", "Expense", "Redevances de crédit-bail"),
+    ("6133", "Expense", "Entretien et réparations"),
+    ("6134", "Expense", "Primes d'assurances"),
+    ("6135", "Expense", "Rémunérations du personnel extérieur à l'entreprise"),
+    ("6136", "Expense", "Rémunérations d'intermédiaires et honoraires"),
+    ("6137", "Expense", "Redevances pour brevets, marques, droits..."),
+    ("614", "Expense", "Charges de personnel"),
+    ("6141", "Expense", "Études, recherches et documentation"),
+    ("6142", "Expense", "Transports"),
+    ("6143", "Expense", "Déplacements, missions et réceptions"),
+    ("6144", "Expense", "Publicité, publications et relations publiques"),
+    ("6145", "Expense", "Frais postaux et frais de télécommunications"),
+    ("6146", "Expense", "Cotisations et dons"),
+    ("6147", "Expense", "Services bancaires"),
+    ("6148", "Expense", "Autres charges externes des exercices antérieurs"),
+    ("63", "Expense", "Charges d'exploitation - Impôts et taxes"),
+    ("64", "Expense", "Charges de personnel"),
+    ("641", "Expense", "Rémunérations du personnel"),
+    ("643", "Expense", "Rémunérations des administrateurs, gérants et associés"),
+    ("644", "Expense", "Charges sociales"),
+    ("646", "Expense", "Charges sociales diverses"),
+    ("65", "Expense", "Autres charges d'exploitation"),
+    ("66", "Expense", "Charges financières"),
+    ("67", "Expense", "Charges non courantes"),
+    ("68", "Expense", "Dotations d'exploitation"),
+    ("69", "Expense", "Impôts sur les résultats"),
+    
+    # Class 7: Revenues
+    ("7", "Revenue", "Comptes de produits"),
+    ("71", "Revenue", "Produits d'exploitation"),
+    ("711", "Revenue", "Ventes de marchandises"),
+    ("712", "Revenue", "Ventes de biens et services produits"),
+    ("7121", "Revenue", "Ventes de biens produits au Maroc"),
+    ("7122", "Revenue", "Ventes de biens produits à l'étranger"),
+    ("7124", "Revenue", "Ventes de services produits au Maroc"),
+    ("7125", "Revenue", "Ventes de services produits à l'étranger"),
+    ("7128", "Revenue", "Autres ventes de biens et services produits"),
+    ("73", "Revenue", "Produits d'exploitation - Variations de stocks"),
+    ("75", "Revenue", "Autres produits d'exploitation"),
+    ("76", "Revenue", "Produits financiers"),
+    ("761", "Revenue", "Produits des titres de participation et autres titres immobilisés"),
+    ("762", "Revenue", "Produits des autres immobilisations financières"),
+    ("763", "Revenue", "Revenus des autres créances"),
+    ("764", "Revenue", "Produits nets sur cessions de titres et valeurs de placement"),
+    ("765", "Revenue", "Intérêts et produits assimilés"),
+    ("766", "Revenue", "Gains de change"),
+    ("768", "Revenue", "Autres produits financiers"),
+    ("77", "Revenue", "Produits non courants"),
+    ("78", "Revenue", "Reprises d'exploitation"),
+    ("79", "Revenue", "Reprises non courantes"),
+]
 
-def create_class_5_accounts():
-    """Create Class 5 accounts: Cash and Cash Equivalents"""
-    # Main parent account
-    class_5 = Account(
-        code="5", 
-        name="Comptes de trésorerie",
-        account_class=5,
-        account_type="Asset"
-    )
-    db.session.add(class_5)
-    db.session.flush()
-    
-    # Subgroup accounts
-    accounts = [
-        Account(
-            code="51", 
-            name="Trésorerie - Actif",
-            account_class=5,
-            account_type="Asset",
-            parent_id=class_5.id
-        ),
-        Account(
-            code="55", 
-            name="Trésorerie - Passif",
-            account_class=5,
-            account_type="Liability",
-            parent_id=class_5.id
-        ),
-        Account(
-            code="59", 
-            name="Provisions pour dépréciation des comptes de trésorerie",
-            account_class=5,
-            account_type="Asset",
-            parent_id=class_5.id
-        ),
-    ]
-    
-    for account in accounts:
-        db.session.add(account)
-    
-    db.session.flush()
-    
-    # Detailed accounts for some subgroups
-    # Cash - Asset (51)
-    cash_asset_account = next(a for a in accounts if a.code == "51")
-    cash_asset_accounts = [
-        Account(
-            code="511", 
-            name="Chèques et valeurs à encaisser",
-            account_class=5,
-            account_type="Asset",
-            parent_id=cash_asset_account.id
-        ),
-        Account(
-            code="512", 
-            name="Banques, Trésorerie Générale et CCP",
-            account_class=5,
-            account_type="Asset",
-            parent_id=cash_asset_account.id
-        ),
-        Account(
-            code="514", 
-            name="Régies d'avances et accréditifs",
-            account_class=5,
-            account_type="Asset",
-            parent_id=cash_asset_account.id
-        ),
-        Account(
-            code="516", 
-            name="Caisses, régies d'avances et accréditifs",
-            account_class=5,
-            account_type="Asset",
-            parent_id=cash_asset_account.id
-        ),
-    ]
-    
-    for account in cash_asset_accounts:
-        db.session.add(account)
-    
-    # Cash - Liability (55)
-    cash_liability_account = next(a for a in accounts if a.code == "55")
-    cash_liability_accounts = [
-        Account(
-            code="552", 
-            name="Crédits d'escompte",
-            account_class=5,
-            account_type="Liability",
-            parent_id=cash_liability_account.id
-        ),
-        Account(
-            code="553", 
-            name="Crédits de trésorerie",
-            account_class=5,
-            account_type="Liability",
-            parent_id=cash_liability_account.id
-        ),
-        Account(
-            code="554", 
-            name="Banques (soldes créditeurs)",
-            account_class=5,
-            account_type="Liability",
-            parent_id=cash_liability_account.id
-        ),
-    ]
-    
-    for account in cash_liability_accounts:
-        db.session.add(account)
-
-def create_class_6_accounts():
-    """Create Class 6 accounts: Expenses"""
-    # Main parent account
-    class_6 = Account(
-        code="6", 
-        name="Comptes de charges",
-        account_class=6,
-        account_type="Expense"
-    )
-    db.session.add(class_6)
-    db.session.flush()
-    
-    # Subgroup accounts
-    accounts = [
-        Account(
-            code="61", 
-            name="Charges d'exploitation",
-            account_class=6,
-            account_type="Expense",
-            parent_id=class_6.id
-        ),
-        Account(
-            code="63", 
-            name="Charges d'exploitation - Impôts et taxes",
-            account_class=6,
-            account_type="Expense",
-            parent_id=class_6.id
-        ),
-        Account(
-            code="64", 
-            name="Charges de personnel",
-            account_class=6,
-            account_type="Expense",
-            parent_id=class_6.id
-        ),
-        Account(
-            code="65", 
-            name="Autres charges d'exploitation",
-            account_class=6,
-            account_type="Expense",
-            parent_id=class_6.id
-        ),
-        Account(
-            code="66", 
-            name="Charges financières",
-            account_class=6,
-            account_type="Expense",
-            parent_id=class_6.id
-        ),
-        Account(
-            code="67", 
-            name="Charges non courantes",
-            account_class=6,
-            account_type="Expense",
-            parent_id=class_6.id
-        ),
-        Account(
-            code="68", 
-            name="Dotations d'exploitation",
-            account_class=6,
-            account_type="Expense",
-            parent_id=class_6.id
-        ),
-        Account(
-            code="69", 
-            name="Impôts sur les résultats",
-            account_class=6,
-            account_type="Expense",
-            parent_id=class_6.id
-        ),
-    ]
-    
-    for account in accounts:
-        db.session.add(account)
-    
-    db.session.flush()
-    
-    # Detailed accounts for some subgroups
-    # Operating expenses (61)
-    operating_expense_account = next(a for a in accounts if a.code == "61")
-    operating_expense_accounts = [
-        Account(
-            code="611", 
-            name="Achats revendus de marchandises",
-            account_class=6,
-            account_type="Expense",
-            parent_id=operating_expense_account.id
-        ),
-        Account(
-            code="612", 
-            name="Achats consommés de matières et fournitures",
-            account_class=6,
-            account_type="Expense",
-            parent_id=operating_expense_account.id
-        ),
-        Account(
-            code="613", 
-            name="Autres charges externes",
-            account_class=6,
-            account_type="Expense",
-            parent_id=operating_expense_account.id
-        ),
-        Account(
-            code="614", 
-            name="Charges de personnel",
-            account_class=6,
-            account_type="Expense",
-            parent_id=operating_expense_account.id
-        ),
-    ]
-    
-    for account in operating_expense_accounts:
-        db.session.add(account)
-    
-    # External expenses (613)
-    external_expense = next(a for a in operating_expense_accounts if a.code == "613")
-    external_expense_accounts = [
-        Account(
-            code="6131", 
-            name="Locations et charges locatives",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6132", 
-            name="Redevances de crédit-bail",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6133", 
-            name="Entretien et réparations",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6134", 
-            name="Primes d'assurances",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6135", 
-            name="Rémunérations du personnel extérieur à l'entreprise",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6136", 
-            name="Rémunérations d'intermédiaires et honoraires",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6137", 
-            name="Redevances pour brevets, marques, droits...",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6141", 
-            name="Études, recherches et documentation",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6142", 
-            name="Transports",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6143", 
-            name="Déplacements, missions et réceptions",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6144", 
-            name="Publicité, publications et relations publiques",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6145", 
-            name="Frais postaux et frais de télécommunications",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6146", 
-            name="Cotisations et dons",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6147", 
-            name="Services bancaires",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-        Account(
-            code="6148", 
-            name="Autres charges externes des exercices antérieurs",
-            account_class=6,
-            account_type="Expense",
-            parent_id=external_expense.id
-        ),
-    ]
-    
-    for account in external_expense_accounts:
-        db.session.add(account)
+def get_parent_code(code, codes):
+    """
+    Get the code of the parent of an account from its code prefixes.
     
-    # Personnel expenses (64)
-    personnel_expense_account = next(a for a in accounts if a.code == "64")
-    personnel_expense_accounts = [
-        Account(
-            code="641", 
-            name="Rémunérations du personnel",
-            account_class=6,
-            account_type="Expense",
-            parent_id=personnel_expense_account.id
-        ),
-        Account(
-            code="643", 
-            name="Rémunérations des administrateurs, gérants et associés",
-            account_class=6,
-            account_type="Expense",
-            parent_id=personnel_expense_account.id
-        ),
-        Account(
-            code="644", 
-            name="Charges sociales",
-            account_class=6,
-            account_type="Expense",
-            parent_id=personnel_expense_account.id
-        ),
-        Account(
-            code="646", 
-            name="Charges sociales diverses",
-            account_class=6,
-            account_type="Expense",
-            parent_id=personnel_expense_account.id
-        ),
-    ]
+    Args:
+        code (str): The account code
+        codes (set or dict): All known account codes
     
-    for account in personnel_expense_accounts:
-        db.session.add(account)
+    Returns:
+        str: The parent code, or None for a top-level account
+    """
+    for length in range(len(code) - 1, 0, -1):
+        if code[:length] in codes:
+            return code[:length]
+    return None
 
-def create_class_7_accounts():
-    """Create Class 7 accounts: Revenues"""
-    # Main parent account
-    class_7 = Account(
-        code="7", 
-        name="Comptes de produits",
-        account_class=7,
-        account_type="Revenue"
-    )
-    db.session.add(class_7)
-    db.session.flush()
-    
-    # Subgroup accounts
-    accounts = [
-        Account(
-            code="71", 
-            name="Produits d'exploitation",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=class_7.id
-        ),
-        Account(
-            code="73", 
-            name="Produits d'exploitation - Variations de stocks",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=class_7.id
-        ),
-        Account(
-            code="75", 
-            name="Autres produits d'exploitation",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=class_7.id
-        ),
-        Account(
-            code="76", 
-            name="Produits financiers",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=class_7.id
-        ),
-        Account(
-            code="77", 
-            name="Produits non courants",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=class_7.id
-        ),
-        Account(
-            code="78", 
-            name="Reprises d'exploitation",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=class_7.id
-        ),
-        Account(
-            code="79", 
-            name="Reprises non courantes",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=class_7.id
-        ),
-    ]
-    
-    for account in accounts:
-        db.session.add(account)
-    
-    db.session.flush()
-    
-    # Detailed accounts for some subgroups
-    # Operating revenues (71)
-    operating_revenue_account = next(a for a in accounts if a.code == "71")
-    operating_revenue_accounts = [
-        Account(
-            code="711", 
-            name="Ventes de marchandises",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=operating_revenue_account.id
-        ),
-        Account(
-            code="712", 
-            name="Ventes de biens et services produits",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=operating_revenue_account.id
-        ),
-    ]
-    
-    for account in operating_revenue_accounts:
-        db.session.add(account)
-    
-    # Sales of goods and services (712)
-    sales_account = next(a for a in operating_revenue_accounts if a.code == "712")
-    sales_accounts = [
-        Account(
-            code="7121", 
-            name="Ventes de biens produits au Maroc",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=sales_account.id
-        ),
-        Account(
-            code="7122", 
-            name="Ventes de biens produits à l'étranger",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=sales_account.id
-        ),
-        Account(
-            code="7124", 
-            name="Ventes de services produits au Maroc",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=sales_account.id
-        ),
-        Account(
-            code="7125", 
-            name="Ventes de services produits à l'étranger",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=sales_account.id
-        ),
-        Account(
-            code="7128", 
-            name="Autres ventes de biens et services produits",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=sales_account.id
-        ),
-    ]
+def initialize_pcm(upsert=False):
+    """
+    Initialize the Moroccan Chart of Accounts in the database.
+    Creates all standard accounts defined in the PCM if they don't already exist.
     
-    for account in sales_accounts:
-        db.session.add(account)
+    The accounts are written with one bulk insert, then their parents are
+    set with one bulk update, whatever the size of the chart.
     
-    # Financial revenues (76)
-    financial_revenue_account = next(a for a in accounts if a.code == "76")
-    financial_revenue_accounts = [
-        Account(
-            code="761", 
-            name="Produits des titres de participation et autres titres immobilisés",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=financial_revenue_account.id
-        ),
-        Account(
-            code="762", 
-            name="Produits des autres immobilisations financières",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=financial_revenue_account.id
-        ),
-        Account(
-            code="763", 
-            name="Revenus des autres créances",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=financial_revenue_account.id
-        ),
-        Account(
-            code="764", 
-            name="Produits nets sur cessions de titres et valeurs de placement",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=financial_revenue_account.id
-        ),
-        Account(
-            code="765", 
-            name="Intérêts et produits assimilés",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=financial_revenue_account.id
-        ),
-        Account(
-            code="766", 
-            name="Gains de change",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=financial_revenue_account.id
-        ),
-        Account(
-            code="768", 
-            name="Autres produits financiers",
-            account_class=7,
-            account_type="Revenue",
-            parent_id=financial_revenue_account.id
-        ),
-    ]
+    Args:
+        upsert (bool): Also add the missing standard accounts when the
+            database already has accounts, and relink every account whose
+            longest code prefix is now another account (existing names and
+            types are left as is)
     
-    for account in financial_revenue_accounts:
-        db.session.add(account)
+    Returns:
+        bool: True if accounts were created or relinked
+    """
+    existing = dict(db.session.query(Account.code, Account.id).all())
+    
+    # Only initialize if there are no accounts in the database, unless upserting
+    if existing and not upsert:
+        return False
+    
+    missing = [row for row in PCM_ACCOUNTS if row[0] not in existing]
+    if missing:
+        db.session.execute(insert(Account), [
+            {
+                'code': code,
+                'name': name,
+                'account_class': int(code[0]),
+                'account_type': account_type
+            }
+            for code, account_type, name in missing
+        ])
+    
+    # Link every account to its parent, which may be one of the new accounts
+    # (accounts without a code prefix in the chart keep their parent)
+    accounts = db.session.query(Account.code, Account.id, Account.parent_id).all()
+    ids = {code: account_id for code, account_id, parent_id in accounts}
+    parents = []
+    for code, account_id, parent_id in accounts:
+        parent_code = get_parent_code(code, ids)
+        if parent_code and ids[parent_code] != parent_id:
+            parents.append({'id': account_id, 'parent_id': ids[parent_code]})
+    
+    if not missing and not parents:
+        return False
+    
+    if parents:
+        db.session.execute(update(Account), parents)
+    
+    # Bulk writes bypass the flush hooks that maintain the hierarchy and versions
+    rebuild_account_tree()
+    bump_ledger_version()
+    bump_ledger_version(version_id=CHART_VERSION_ID)
+    
+    # Commit all changes
+    db.session.commit()
+    
+    return True
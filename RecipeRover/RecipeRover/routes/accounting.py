@@ -2,66 +2,71 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app import db
 from models import (
-    Account, JournalEntry, JournalEntryLine, 
+    Account, AccountClosingBalance, AccountDailyBalance, JournalEntry, JournalEntryLine, 
     Client, Supplier, Invoice, InvoiceLine,
-    Notification
+    Notification, PeriodClosing
 )
 from forms import (
     AccountForm, JournalEntryForm, JournalEntryLineForm,
-    ClientForm, SupplierForm, InvoiceForm, InvoiceLineForm
+    ClientForm, SupplierForm, InvoiceForm, InvoiceLineForm,
+    PeriodClosingForm
 )
-from datetime import datetime
-from sqlalchemy import func
+from utils.ledger import (
+    NOTIFICATION_VERSION_ID,
+    bump_ledger_version,
+    get_closed_until,
+    is_period_closed,
+    record_line_added,
+    record_line_deleted,
+    record_entry_deleted,
+    record_entry_moved
+)
+from utils.period_closing import close_period, reopen_period
+from utils.chart_of_accounts import (
+    get_account_choices,
+    get_account_info,
+    get_subtree_ids,
+    record_account_added,
+    record_account_moved,
+    record_account_deleted
+)
+from utils.report_generator import (
+    account_balance,
+    generate_dashboard,
+    get_account_total,
+    get_dashboard_period,
+    get_rollup_totals
+)
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import joinedload, selectinload
 
 accounting_bp = Blueprint('accounting', __name__)
 
+# Number of journal entries shown per page
+JOURNAL_PAGE_SIZE = 50
+
+# Number of account ledger lines shown per page
+LEDGER_PAGE_SIZE = 100
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD query string value (raises ValueError if invalid)"""
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def closed_period_message():
+    """Message shown when a change targets a closed period"""
+    return f"La période est clôturée jusqu'au {get_closed_until().strftime('%d/%m/%Y')} : ses écritures ne peuvent plus être modifiées."
+
 @accounting_bp.route('/')
 @accounting_bp.route('/dashboard')
 @login_required
 def dashboard():
-    # Get recent journal entries
-    recent_entries = JournalEntry.query.order_by(JournalEntry.date.desc()).limit(5).all()
-    
-    # Get due invoices
-    due_invoices = Invoice.query.filter_by(paid=False).filter(Invoice.due_date >= datetime.now().date()).order_by(Invoice.due_date).limit(5).all()
-    
-    # Get unread notifications
-    notifications = Notification.query.filter_by(user_id=current_user.id, is_read=False).order_by(Notification.created_at.desc()).limit(10).all()
-    
-    # Get financial summary
-    # Total assets
-    total_assets = db.session.query(func.sum(JournalEntryLine.debit - JournalEntryLine.credit)).\
-        join(Account, JournalEntryLine.account_id == Account.id).\
-        filter(Account.account_type == 'Asset').scalar() or 0
-    
-    # Total liabilities
-    total_liabilities = db.session.query(func.sum(JournalEntryLine.credit - JournalEntryLine.debit)).\
-        join(Account, JournalEntryLine.account_id == Account.id).\
-        filter(Account.account_type == 'Liability').scalar() or 0
-    
-    # Total revenue
-    total_revenue = db.session.query(func.sum(JournalEntryLine.credit - JournalEntryLine.debit)).\
-        join(Account, JournalEntryLine.account_id == Account.id).\
-        filter(Account.account_type == 'Revenue').scalar() or 0
-    
-    # Total expenses
-    total_expenses = db.session.query(func.sum(JournalEntryLine.debit - JournalEntryLine.credit)).\
-        join(Account, JournalEntryLine.account_id == Account.id).\
-        filter(Account.account_type == 'Expense').scalar() or 0
-    
-    # Net income
-    net_income = total_revenue - total_expenses
+    # Summary shared by all users, cached per ledger version
+    summary = generate_dashboard(datetime.now().date(), get_dashboard_period())
     
     return render_template('index.html', 
                            title='Tableau de bord',
-                           recent_entries=recent_entries,
-                           due_invoices=due_invoices,
-                           notifications=notifications,
-                           total_assets=total_assets,
-                           total_liabilities=total_liabilities,
-                           total_revenue=total_revenue,
-                           total_expenses=total_expenses,
-                           net_income=net_income)
+                           **summary)
 
 # Accounts management
 @accounting_bp.route('/accounts')
@@ -71,8 +76,16 @@ def accounts():
         flash('Vous n\'avez pas les droits pour accéder à cette page.', 'danger')
         return redirect(url_for('accounting.dashboard'))
     
-    accounts = Account.query.order_by(Account.code).all()
-    return render_template('accounting/accounts.html', accounts=accounts, title='Plan comptable')
+    accounts = Account.query.options(joinedload(Account.parent)).order_by(Account.code).all()
+    
+    # Balance of each account including its sub-accounts
+    totals = get_rollup_totals(datetime.now().date())
+    balances = {
+        account.id: account_balance(account, *totals.get(account.id, (0, 0)))
+        for account in accounts
+    }
+    
+    return render_template('accounting/accounts.html', accounts=accounts, balances=balances, title='Plan comptable')
 
 @accounting_bp.route('/accounts/create', methods=['GET', 'POST'])
 @login_required
@@ -83,7 +96,7 @@ def create_account():
     
     form = AccountForm()
     # Populate parent account choices
-    form.parent_id.choices = [(0, 'Aucun')] + [(a.id, f"{a.code} - {a.name}") for a in Account.query.order_by(Account.code).all()]
+    form.parent_id.choices = [(0, 'Aucun')] + get_account_choices()
     
     if form.validate_on_submit():
         parent_id = form.parent_id.data if form.parent_id.data != 0 else None
@@ -96,6 +109,8 @@ def create_account():
         )
         
         db.session.add(account)
+        db.session.flush()
+        record_account_added(account)
         db.session.commit()
         
         flash('Le compte a été créé avec succès.', 'success')
@@ -113,24 +128,19 @@ def edit_account(account_id):
     account = Account.query.get_or_404(account_id)
     form = AccountForm()
     
-    # Populate parent account choices (excluding self and children)
-    account_ids_to_exclude = [account.id]
-    for child in account.children:
-        account_ids_to_exclude.append(child.id)
-    
-    form.parent_id.choices = [(0, 'Aucun')] + [
-        (a.id, f"{a.code} - {a.name}") 
-        for a in Account.query.filter(~Account.id.in_(account_ids_to_exclude)).order_by(Account.code).all()
-    ]
+    # Populate parent account choices (excluding self and all sub-accounts)
+    form.parent_id.choices = [(0, 'Aucun')] + get_account_choices(exclude=get_subtree_ids(account.id))
     
     if form.validate_on_submit():
         parent_id = form.parent_id.data if form.parent_id.data != 0 else None
+        old_parent_id = account.parent_id
         account.code = form.code.data
         account.name = form.name.data
         account.account_class = form.account_class.data
         account.account_type = form.account_type.data
         account.parent_id = parent_id
         
+        record_account_moved(account, old_parent_id)
         db.session.commit()
         
         flash('Le compte a été mis à jour avec succès.', 'success')
@@ -165,6 +175,16 @@ def delete_account(account_id):
         flash('Ce compte est utilisé dans des écritures comptables et ne peut pas être supprimé.', 'danger')
         return redirect(url_for('accounting.accounts'))
     
+    # Check if account has a balance carried by a period closing
+    closing_balance = AccountClosingBalance.query.filter_by(account_id=account.id).first()
+    if closing_balance:
+        flash('Ce compte a un solde dans une période clôturée et ne peut pas être supprimé.', 'danger')
+        return redirect(url_for('accounting.accounts'))
+    
+    # Remove leftover daily balances of deleted lines
+    AccountDailyBalance.query.filter_by(account_id=account.id).delete()
+    record_account_deleted(account)
+    
     db.session.delete(account)
     db.session.commit()
     
@@ -175,8 +195,64 @@ def delete_account(account_id):
 @accounting_bp.route('/journal')
 @login_required
 def journal():
-    entries = JournalEntry.query.order_by(JournalEntry.date.desc()).all()
-    return render_template('accounting/journal.html', entries=entries, title='Journal comptable')
+    # Get filter parameters
+    start_date = request.args.get('start_date', type=parse_date)
+    end_date = request.args.get('end_date', type=parse_date)
+    account_code = request.args.get('account', '').strip()
+    reference = request.args.get('reference', '').strip()
+    
+    # Get position of the page (last entry of the previous page)
+    cursor_date = request.args.get('cursor_date', type=parse_date)
+    cursor_id = request.args.get('cursor_id', type=int)
+    
+    query = JournalEntry.query.options(
+        selectinload(JournalEntry.lines),
+        joinedload(JournalEntry.created_by)
+    )
+    
+    if start_date:
+        query = query.filter(JournalEntry.date >= start_date)
+    if end_date:
+        query = query.filter(JournalEntry.date <= end_date)
+    if account_code:
+        query = query.filter(JournalEntry.lines.any(
+            JournalEntryLine.account.has(Account.code.startswith(account_code, autoescape=True))
+        ))
+    if reference:
+        query = query.filter(JournalEntry.reference.icontains(reference, autoescape=True))
+    
+    # Seek past the previous page instead of using an offset
+    if cursor_date and cursor_id:
+        query = query.filter(or_(
+            JournalEntry.date < cursor_date,
+            and_(JournalEntry.date == cursor_date, JournalEntry.id < cursor_id)
+        ))
+    
+    entries = query.order_by(JournalEntry.date.desc(), JournalEntry.id.desc()).\
+        limit(JOURNAL_PAGE_SIZE + 1).all()
+    
+    # Fetching one extra entry tells whether there is a next page
+    has_next = len(entries) > JOURNAL_PAGE_SIZE
+    entries = entries[:JOURNAL_PAGE_SIZE]
+    
+    filters = {
+        key: value for key, value in request.args.items()
+        if key in ('start_date', 'end_date', 'account', 'reference') and value
+    }
+    
+    next_url = None
+    if has_next:
+        next_url = url_for('accounting.journal',
+                           cursor_date=entries[-1].date.isoformat(),
+                           cursor_id=entries[-1].id,
+                           **filters)
+    
+    return render_template('accounting/journal.html', 
+                          entries=entries, 
+                          filters=filters,
+                          next_url=next_url,
+                          is_first_page=cursor_id is None,
+                          title='Journal comptable')
 
 @accounting_bp.route('/journal/create', methods=['GET', 'POST'])
 @login_required
@@ -188,6 +264,10 @@ def create_journal_entry():
     form = JournalEntryForm()
     
     if form.validate_on_submit():
+        if is_period_closed(form.date.data):
+            flash(closed_period_message(), 'danger')
+            return render_template('accounting/create_journal_entry.html', form=form, title='Nouvelle écriture')
+        
         # Create journal entry
         entry = JournalEntry(
             date=form.date.data,
@@ -222,9 +302,15 @@ def edit_journal_entry(entry_id):
     
     # Line form for adding new lines
     line_form = JournalEntryLineForm()
-    line_form.account_id.choices = [(a.id, f"{a.code} - {a.name}") for a in Account.query.order_by(Account.code).all()]
+    line_form.account_id.choices = get_account_choices()
     
     if form.validate_on_submit():
+        if is_period_closed(entry.date) or is_period_closed(form.date.data):
+            flash(closed_period_message(), 'danger')
+            return redirect(url_for('accounting.edit_journal_entry', entry_id=entry.id))
+        
+        record_entry_moved(entry, entry.date, form.date.data)
+        
         entry.date = form.date.data
         entry.reference = form.reference.data
         entry.description = form.description.data
@@ -242,7 +328,7 @@ def edit_journal_entry(entry_id):
     # Calculate totals
     total_debit = sum(line.debit for line in entry.lines)
     total_credit = sum(line.credit for line in entry.lines)
-    is_balanced = round(total_debit, 2) == round(total_credit, 2)
+    is_balanced = total_debit == total_credit
     
     return render_template('accounting/edit_journal_entry.html', 
                           form=form, 
@@ -260,8 +346,12 @@ def add_journal_entry_line(entry_id):
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
     
     entry = JournalEntry.query.get_or_404(entry_id)
+    
+    if is_period_closed(entry.date):
+        return jsonify({'status': 'error', 'message': closed_period_message()}), 400
+    
     form = JournalEntryLineForm()
-    form.account_id.choices = [(a.id, f"{a.code} - {a.name}") for a in Account.query.order_by(Account.code).all()]
+    form.account_id.choices = get_account_choices()
     
     if form.validate_on_submit():
         # Make sure either debit or credit is provided (not both)
@@ -280,10 +370,11 @@ def add_journal_entry_line(entry_id):
         )
         
         db.session.add(line)
+        record_line_added(line, entry.date)
         db.session.commit()
         
         # Get account details for response
-        account = Account.query.get(form.account_id.data)
+        account = get_account_info(form.account_id.data)
         
         return jsonify({
             'status': 'success',
@@ -292,8 +383,8 @@ def add_journal_entry_line(entry_id):
                 'id': line.id,
                 'account_code': account.code,
                 'account_name': account.name,
-                'debit': line.debit,
-                'credit': line.credit,
+                'debit': float(line.debit),
+                'credit': float(line.credit),
                 'description': line.description
             }
         })
@@ -309,6 +400,10 @@ def delete_journal_entry_line(entry_id, line_id):
     
     line = JournalEntryLine.query.filter_by(id=line_id, journal_entry_id=entry_id).first_or_404()
     
+    if is_period_closed(line.journal_entry.date):
+        return jsonify({'status': 'error', 'message': closed_period_message()}), 400
+    
+    record_line_deleted(line, line.journal_entry.date)
     db.session.delete(line)
     db.session.commit()
     
@@ -332,12 +427,66 @@ def delete_journal_entry(entry_id):
         flash('Cette écriture est liée à une facture et ne peut pas être supprimée.', 'danger')
         return redirect(url_for('accounting.journal'))
     
+    if is_period_closed(entry.date):
+        flash(closed_period_message(), 'danger')
+        return redirect(url_for('accounting.journal'))
+    
+    record_entry_deleted(entry)
+    
     db.session.delete(entry)
     db.session.commit()
     
     flash('L\'écriture a été supprimée avec succès.', 'success')
     return redirect(url_for('accounting.journal'))
 
+# Period closings
+@accounting_bp.route('/closings', methods=['GET', 'POST'])
+@login_required
+def closings():
+    if not current_user.is_admin():
+        flash('Vous n\'avez pas les droits pour accéder à cette page.', 'danger')
+        return redirect(url_for('accounting.dashboard'))
+    
+    form = PeriodClosingForm()
+    
+    if form.validate_on_submit():
+        try:
+            closing = close_period(form.end_date.data, current_user.id)
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+        else:
+            db.session.commit()
+            flash(f"La période jusqu'au {closing.end_date.strftime('%d/%m/%Y')} a été clôturée.", 'success')
+        
+        return redirect(url_for('accounting.closings'))
+    
+    elif request.method == 'GET':
+        # Default to the end of the previous fiscal year
+        form.end_date.data = datetime(datetime.now().year - 1, 12, 31).date()
+    
+    closings = PeriodClosing.query.options(joinedload(PeriodClosing.closed_by)).\
+        order_by(PeriodClosing.end_date.desc()).all()
+    
+    return render_template('accounting/closings.html', form=form, closings=closings, title='Clôtures')
+
+@accounting_bp.route('/closings/reopen', methods=['POST'])
+@login_required
+def reopen_closing():
+    if not current_user.is_admin():
+        flash('Vous n\'avez pas les droits pour accéder à cette page.', 'danger')
+        return redirect(url_for('accounting.dashboard'))
+    
+    try:
+        closing = reopen_period()
+    except ValueError as e:
+        flash(str(e), 'danger')
+    else:
+        db.session.commit()
+        flash(f"La période jusqu'au {closing.end_date.strftime('%d/%m/%Y')} a été rouverte.", 'success')
+    
+    return redirect(url_for('accounting.closings'))
+
 # Client management
 @accounting_bp.route('/clients')
 @login_required
@@ -518,33 +667,107 @@ def ledger():
 def account_ledger(account_id):
     account = Account.query.get_or_404(account_id)
     
-    # Get all journal entry lines for this account
-    lines = JournalEntryLine.query.filter_by(account_id=account.id).\
-        join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-        order_by(JournalEntry.date).all()
-    
-    # Calculate balance
-    balance = 0
-    ledger_entries = []
-    
-    for line in lines:
-        if account.account_type in ['Asset', 'Expense']:
-            balance += line.debit - line.credit
-        else:
-            balance += line.credit - line.debit
+    # Get filter parameters
+    start_date = request.args.get('start_date', type=parse_date)
+    end_date = request.args.get('end_date', type=parse_date)
+    
+    # Get position of the page (last line of the previous page)
+    cursor_date = request.args.get('cursor_date', type=parse_date)
+    cursor_id = request.args.get('cursor_id', type=int)
+    
+    # Amount of each line on the normal side of the account
+    if account.account_type in ['Asset', 'Expense']:
+        amount = JournalEntryLine.debit - JournalEntryLine.credit
+    else:
+        amount = JournalEntryLine.credit - JournalEntryLine.debit
+    
+    # Balance brought forward from before the period
+    opening_balance = 0
+    if start_date:
+        opening_balance = account_balance(account, *get_account_total(account.id, start_date - timedelta(days=1)))
+    
+    query = db.session.query(
+        JournalEntryLine.id.label('line_id'),
+        JournalEntry.id.label('entry_id'),
+        JournalEntryLine.date,
+        JournalEntry.reference,
+        func.coalesce(func.nullif(JournalEntryLine.description, ''), JournalEntry.description).label('description'),
+        JournalEntryLine.debit,
+        JournalEntryLine.credit,
+        amount.label('amount')
+    ).join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
+        filter(JournalEntryLine.account_id == account.id)
+    
+    # Lines are read in (date, id) order from the account's index on its lines
+    if start_date:
+        query = query.filter(JournalEntryLine.date >= start_date)
+    if end_date:
+        query = query.filter(JournalEntryLine.date <= end_date)
+    
+    # Seek past the previous page instead of using an offset, and start from
+    # the balance after its last line
+    page_balance = opening_balance
+    if cursor_date and cursor_id:
+        query = query.filter(
+            JournalEntryLine.date >= cursor_date,
+            or_(JournalEntryLine.date > cursor_date, JournalEntryLine.id > cursor_id)
+        )
         
-        ledger_entries.append({
-            'date': line.journal_entry.date,
-            'reference': line.journal_entry.reference,
-            'description': line.description or line.journal_entry.description,
+        cursor_day_total = db.session.query(func.sum(amount)).\
+            filter(
+                JournalEntryLine.account_id == account.id,
+                JournalEntryLine.date == cursor_date,
+                JournalEntryLine.id <= cursor_id
+            ).scalar() or 0
+        page_balance = account_balance(account, *get_account_total(account.id, cursor_date - timedelta(days=1))) + \
+            cursor_day_total
+    
+    page = query.order_by(JournalEntryLine.date, JournalEntryLine.id).\
+        limit(LEDGER_PAGE_SIZE + 1).subquery()
+    
+    # Running balance of the page lines
+    lines = db.session.query(
+        page,
+        func.sum(page.c.amount).over(order_by=(page.c.date, page.c.line_id)).label('running_total')
+    ).order_by(page.c.date, page.c.line_id).all()
+    
+    # Fetching one extra line tells whether there is a next page
+    has_next = len(lines) > LEDGER_PAGE_SIZE
+    lines = lines[:LEDGER_PAGE_SIZE]
+    
+    ledger_entries = [
+        {
+            'entry_id': line.entry_id,
+            'date': line.date,
+            'reference': line.reference,
+            'description': line.description,
             'debit': line.debit,
             'credit': line.credit,
-            'balance': balance
-        })
+            'balance': page_balance + line.running_total
+        }
+        for line in lines
+    ]
+    
+    filters = {
+        key: value for key, value in request.args.items()
+        if key in ('start_date', 'end_date') and value
+    }
+    
+    next_url = None
+    if has_next:
+        next_url = url_for('accounting.account_ledger',
+                           account_id=account.id,
+                           cursor_date=lines[-1].date.isoformat(),
+                           cursor_id=lines[-1].line_id,
+                           **filters)
     
     return render_template('accounting/account_ledger.html', 
                           account=account, 
                           entries=ledger_entries, 
+                          filters=filters,
+                          opening_balance=opening_balance,
+                          next_url=next_url,
+                          is_first_page=cursor_id is None,
                           title=f'Grand Livre - {account.code} {account.name}')
 
 # Mark notifications as read
@@ -561,11 +784,8 @@ def mark_notification_read(notification_id):
 @accounting_bp.route('/notifications/mark_all_read', methods=['POST'])
 @login_required
 def mark_all_notifications_read():
-    notifications = Notification.query.filter_by(user_id=current_user.id, is_read=False).all()
-    
-    for notification in notifications:
-        notification.is_read = True
-    
+    Notification.query.filter_by(user_id=current_user.id, is_read=False).update({'is_read': True})
+    bump_ledger_version(version_id=NOTIFICATION_VERSION_ID)
     db.session.commit()
     
     return jsonify({'status': 'success'})
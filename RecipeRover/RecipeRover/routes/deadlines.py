@@ -1,8 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from app import db
-from models import Deadline, Notification, User
+from models import Deadline, Notification
 from forms import DeadlineForm
+from utils.ledger import NOTIFICATION_VERSION_ID, bump_ledger_version
+from utils.notifications import notify_all_users
 from datetime import datetime, timedelta
 from sqlalchemy import and_
 
@@ -74,17 +76,11 @@ def create():
         db.session.commit()
         
         # Create notifications for all users
-        users = User.query.all()
-        for user in users:
-            notification = Notification(
-                user_id=user.id,
-                title=f"Nouvelle échéance: {deadline.title}",
-                message=f"Une nouvelle échéance a été créée pour le {deadline.due_date.strftime('%d/%m/%Y')}.",
-                deadline_id=deadline.id
-            )
-            db.session.add(notification)
-        
-        db.session.commit()
+        notify_all_users(
+            title=f"Nouvelle échéance: {deadline.title}",
+            message=f"Une nouvelle échéance a été créée pour le {deadline.due_date.strftime('%d/%m/%Y')}.",
+            deadline_id=deadline.id
+        )
         
         flash('L\'échéance a été créée avec succès.', 'success')
         return redirect(url_for('deadlines.index'))
@@ -116,17 +112,11 @@ def edit(deadline_id):
         
         # If due date changed, create notifications
         if due_date_changed:
-            users = User.query.all()
-            for user in users:
-                notification = Notification(
-                    user_id=user.id,
-                    title=f"Échéance modifiée: {deadline.title}",
-                    message=f"La date d'échéance a été modifiée pour le {deadline.due_date.strftime('%d/%m/%Y')}.",
-                    deadline_id=deadline.id
-                )
-                db.session.add(notification)
-            
-            db.session.commit()
+            notify_all_users(
+                title=f"Échéance modifiée: {deadline.title}",
+                message=f"La date d'échéance a été modifiée pour le {deadline.due_date.strftime('%d/%m/%Y')}.",
+                deadline_id=deadline.id
+            )
         
         flash('L\'échéance a été mise à jour avec succès.', 'success')
         return redirect(url_for('deadlines.index'))
@@ -157,17 +147,11 @@ def complete(deadline_id):
     db.session.commit()
     
     # Create notifications for all users
-    users = User.query.all()
-    for user in users:
-        notification = Notification(
-            user_id=user.id,
-            title=f"Échéance complétée: {deadline.title}",
-            message=f"L'échéance du {deadline.due_date.strftime('%d/%m/%Y')} a été marquée comme complétée.",
-            deadline_id=deadline.id
-        )
-        db.session.add(notification)
-    
-    db.session.commit()
+    notify_all_users(
+        title=f"Échéance complétée: {deadline.title}",
+        message=f"L'échéance du {deadline.due_date.strftime('%d/%m/%Y')} a été marquée comme complétée.",
+        deadline_id=deadline.id
+    )
     
     flash('L\'échéance a été marquée comme complétée.', 'success')
     return redirect(url_for('deadlines.index'))
@@ -183,6 +167,7 @@ def delete(deadline_id):
     
     # Delete associated notifications
     Notification.query.filter_by(deadline_id=deadline.id).delete()
+    bump_ledger_version(version_id=NOTIFICATION_VERSION_ID)
     
     db.session.delete(deadline)
     db.session.commit()
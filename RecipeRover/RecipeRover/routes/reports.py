@@ -1,19 +1,33 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, make_response, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file
 from flask_login import login_required, current_user
 from app import db
-from models import Account, JournalEntry, JournalEntryLine
-from forms import ExportForm
+from models import Account, AccountDailyBalance, ExportJob, JournalEntryLine
+from forms import ClosingPackForm, ExportForm
 from utils.report_generator import (
     generate_balance_sheet, 
     generate_income_statement,
-    generate_trial_balance
+    generate_trial_balance,
+    get_monthly_totals,
+    report_cache
 )
-from utils.export import export_pdf, export_excel
+from utils.export_jobs import (
+    EXPORT_FORMATS,
+    EXPORT_TITLES,
+    create_export_job,
+    get_export_file_name,
+    get_export_path
+)
+from utils.closing_pack import create_closing_pack_job
 from datetime import datetime
-from sqlalchemy import func, and_
+from sqlalchemy import func
 
 reports_bp = Blueprint('reports', __name__, url_prefix='/reports')
 
+# Years accepted by the chart data, and how many can be compared at once
+CHART_MIN_YEAR = 1900
+CHART_MAX_YEAR = 2100
+CHART_MAX_YEARS = 10
+
 @reports_bp.route('/')
 @login_required
 def index():
@@ -99,55 +113,74 @@ def export():
         start_date = form.start_date.data
         end_date = form.end_date.data
         
-        # Generate the appropriate report data
-        if report_type == 'balance_sheet':
-            report_data = generate_balance_sheet(end_date)
-            title = 'Bilan'
-        elif report_type == 'income_statement':
-            report_data = generate_income_statement(start_date, end_date)
-            title = 'Compte de Produits et Charges (CPC)'
-        elif report_type == 'journal':
-            # Get all journal entries for the period
-            entries = JournalEntry.query.filter(
-                and_(JournalEntry.date >= start_date, JournalEntry.date <= end_date)
-            ).order_by(JournalEntry.date).all()
-            report_data = {'entries': entries}
-            title = 'Journal Comptable'
-        elif report_type == 'ledger':
-            # Get all accounts and their entries for the period
-            accounts = Account.query.order_by(Account.code).all()
-            report_data = {
-                'accounts': accounts,
-                'start_date': start_date,
-                'end_date': end_date
-            }
-            title = 'Grand Livre'
-        elif report_type == 'vat':
-            from utils.tax_calculator import calculate_vat
-            report_data = calculate_vat(
-                start_date.year, 
-                start_date.month,
-                end_date=end_date
-            )
-            title = 'État de TVA'
+        # Generate the file in a background worker
+        job = create_export_job(current_user.id, report_type, format_type, start_date, end_date)
         
-        # Generate the export file
-        if format_type == 'pdf':
-            pdf_data = export_pdf(report_type, report_data, title, start_date, end_date)
-            response = make_response(pdf_data)
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'attachment; filename={report_type}_{start_date}_{end_date}.pdf'
-            return response
-        else:  # Excel
-            excel_data = export_excel(report_type, report_data, title, start_date, end_date)
-            response = make_response(excel_data)
-            response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            response.headers['Content-Disposition'] = f'attachment; filename={report_type}_{start_date}_{end_date}.xlsx'
-            return response
+        return redirect(url_for('reports.export_job', job_id=job.id))
+    
+    # The closing pack defaults to the last completed fiscal year
+    closing_form = ClosingPackForm(year=datetime.now().year - 1)
     
     return render_template('reports/export.html', 
                           title='Exporter un rapport',
-                          form=form)
+                          form=form,
+                          closing_form=closing_form)
+
+@reports_bp.route('/closing_pack', methods=['POST'])
+@login_required
+def closing_pack():
+    form = ClosingPackForm()
+    
+    if not form.validate_on_submit():
+        flash('Exercice invalide.', 'danger')
+        return redirect(url_for('reports.export'))
+    
+    # Generate every year-end report in a background worker
+    job = create_closing_pack_job(current_user.id, form.year.data)
+    
+    return redirect(url_for('reports.export_job', job_id=job.id))
+
+@reports_bp.route('/export/jobs/<int:job_id>')
+@login_required
+def export_job(job_id):
+    job = ExportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    
+    return render_template('reports/export_job.html', 
+                          title='Exporter un rapport',
+                          job=job,
+                          report_title=EXPORT_TITLES[job.report_type])
+
+@reports_bp.route('/export/jobs/<int:job_id>/status')
+@login_required
+def export_job_status(job_id):
+    job = ExportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    
+    return jsonify({
+        'status': job.status,
+        'progress': job.progress,
+        'error': job.error,
+        'download_url': url_for('reports.download_export', job_id=job.id) if job.status == 'done' else None
+    })
+
+@reports_bp.route('/export/jobs/<int:job_id>/download')
+@login_required
+def download_export(job_id):
+    job = ExportJob.query.filter_by(id=job_id, user_id=current_user.id, status='done').first_or_404()
+    
+    return send_file(
+        get_export_path(job),
+        mimetype=EXPORT_FORMATS[job.format_type][1],
+        as_attachment=True,
+        download_name=get_export_file_name(job)
+    )
+
+@reports_bp.route('/cache/stats')
+@login_required
+def cache_stats():
+    if not current_user.is_admin():
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
+    
+    return jsonify(report_cache.stats())
 
 @reports_bp.route('/charts/data')
 @login_required
@@ -155,79 +188,61 @@ def chart_data():
     chart_type = request.args.get('type', 'monthly_revenue_expense')
     
     if chart_type == 'monthly_revenue_expense':
-        # Get monthly revenue and expense data for the current year
-        year = request.args.get('year', datetime.now().year, type=int)
+        # Get monthly revenue and expense data for the current year,
+        # or for several years at once (e.g. ?years=2023,2024)
+        years_str = request.args.get('years')
+        if years_str:
+            try:
+                years = sorted({int(year) for year in years_str.split(',')})
+            except ValueError:
+                return jsonify({'error': 'Invalid years'}), 400
+        else:
+            years = [request.args.get('year', datetime.now().year, type=int)]
+        
+        # Keep the dates valid and the query bounded
+        if len(years) > CHART_MAX_YEARS or not all(CHART_MIN_YEAR <= year <= CHART_MAX_YEAR for year in years):
+            return jsonify({'error': 'Invalid years'}), 400
         
         # Prepare data structure
         months = ['Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin', 
                   'Juillet', 'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre']
-        revenue_data = [0] * 12
-        expense_data = [0] * 12
         
-        # Get revenue data by month
-        revenue_accounts = Account.query.filter_by(account_type='Revenue').all()
-        revenue_account_ids = [account.id for account in revenue_accounts]
+        # Get revenue and expense totals for every month of every year
+        totals = get_monthly_totals(years, ['Revenue', 'Expense'])
         
-        for month in range(1, 13):
-            # Create date range for the month
-            start_date = datetime(year, month, 1).date()
-            if month == 12:
-                end_date = datetime(year + 1, 1, 1).date()
-            else:
-                end_date = datetime(year, month + 1, 1).date()
+        datasets = []
+        for year in years:
+            revenue_data = [0] * 12
+            expense_data = [0] * 12
             
-            # Query for revenue
-            revenue = db.session.query(func.sum(JournalEntryLine.credit - JournalEntryLine.debit)).\
-                join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-                filter(
-                    JournalEntryLine.account_id.in_(revenue_account_ids),
-                    JournalEntry.date >= start_date,
-                    JournalEntry.date < end_date
-                ).scalar() or 0
+            for month in range(1, 13):
+                debit_sum, credit_sum = totals.get((year, month, 'Revenue'), (0, 0))
+                revenue_data[month - 1] = float(credit_sum - debit_sum)
+                
+                debit_sum, credit_sum = totals.get((year, month, 'Expense'), (0, 0))
+                expense_data[month - 1] = float(debit_sum - credit_sum)
             
-            revenue_data[month - 1] = round(revenue, 2)
-        
-        # Get expense data by month
-        expense_accounts = Account.query.filter_by(account_type='Expense').all()
-        expense_account_ids = [account.id for account in expense_accounts]
-        
-        for month in range(1, 13):
-            # Create date range for the month
-            start_date = datetime(year, month, 1).date()
-            if month == 12:
-                end_date = datetime(year + 1, 1, 1).date()
-            else:
-                end_date = datetime(year, month + 1, 1).date()
-            
-            # Query for expenses
-            expense = db.session.query(func.sum(JournalEntryLine.debit - JournalEntryLine.credit)).\
-                join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-                filter(
-                    JournalEntryLine.account_id.in_(expense_account_ids),
-                    JournalEntry.date >= start_date,
-                    JournalEntry.date < end_date
-                ).scalar() or 0
-            
-            expense_data[month - 1] = round(expense, 2)
-        
-        return jsonify({
-            'labels': months,
-            'datasets': [
+            suffix = f' {year}' if years_str else ''
+            datasets.extend([
                 {
-                    'label': 'Produits',
+                    'label': f'Produits{suffix}',
                     'data': revenue_data,
                     'backgroundColor': 'rgba(75, 192, 192, 0.2)',
                     'borderColor': 'rgba(75, 192, 192, 1)',
                     'borderWidth': 1
                 },
                 {
-                    'label': 'Charges',
+                    'label': f'Charges{suffix}',
                     'data': expense_data,
                     'backgroundColor': 'rgba(255, 99, 132, 0.2)',
                     'borderColor': 'rgba(255, 99, 132, 1)',
                     'borderWidth': 1
                 }
-            ]
+            ])
+        
+        return jsonify({
+            'labels': months,
+            'datasets': datasets
         })
     
     elif chart_type == 'assets_liabilities':
@@ -248,7 +263,7 @@ def chart_data():
             'labels': ['Actifs', 'Passifs', 'Capitaux propres'],
             'datasets': [
                 {
-                    'data': [round(assets, 2), round(liabilities, 2), round(equity, 2)],
+                    'data': [float(assets), float(liabilities), float(equity)],
                     'backgroundColor': [
                         'rgba(75, 192, 192, 0.2)',
                         'rgba(255, 99, 132, 0.2)',
@@ -265,19 +280,17 @@ def chart_data():
         })
     
     elif chart_type == 'expense_breakdown':
-        # Get expense breakdown data
-        expense_accounts = Account.query.filter_by(account_type='Expense').all()
+        # Get expense breakdown data (only accounts with non-zero values)
+        balance = func.sum(AccountDailyBalance.debit - AccountDailyBalance.credit)
+        expense_totals = db.session.query(Account.name, balance).\
+            join(AccountDailyBalance, AccountDailyBalance.account_id == Account.id).\
+            filter(Account.account_type == 'Expense').\
+            group_by(Account.id, Account.name).\
+            having(balance > 0).\
+            order_by(Account.id).all()
         
-        labels = []
-        data = []
-        
-        for account in expense_accounts:
-            total = db.session.query(func.sum(JournalEntryLine.debit - JournalEntryLine.credit)).\
-                filter(JournalEntryLine.account_id == account.id).scalar() or 0
-            
-            if total > 0:  # Only include accounts with non-zero values
-                labels.append(account.name)
-                data.append(round(total, 2))
+        labels = [name for name, total in expense_totals]
+        data = [float(total) for name, total in expense_totals]
         
         return jsonify({
             'labels': labels,
@@ -1,4 +1,4 @@
-ûfrom flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from app import db
 from models import Invoice, InvoiceLine, TaxDeclaration, JournalEntry
@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The application reads its database URL and creates its tables on import,
+# so point it at a scratch SQLite database before any test imports it
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from models import Account, User
+from utils.chart_of_accounts import chart_cache, record_account_added
+from utils.notifications import header_notifications_cache
+from utils.report_generator import report_cache
+
+@pytest.fixture(scope='module')
+def app_context():
+    with app.app_context():
+        yield
+
+@pytest.fixture
+def session(app_context):
+    """
+    The database session, rolled back after the test along with the caches
+    filled from it.
+    """
+    yield db.session
+    
+    db.session.rollback()
+    report_cache.clear()
+    chart_cache.clear()
+    header_notifications_cache.clear()
+
+@pytest.fixture
+def admin(session):
+    """The administrator created when the application starts"""
+    return User.query.filter_by(email='admin@example.com').one()
+
+@pytest.fixture
+def make_account(session):
+    """Create accounts in the chart and in its hierarchy"""
+    def make(code, parent=None, name=None):
+        account = Account(code=code, name=name or f"Compte {code}", account_class=int(code[0]),
+                          parent_id=parent.id if parent else None)
+        session.add(account)
+        session.flush()
+        record_account_added(account)
+        return account
+    
+    return make
@@ -0,0 +1,101 @@
+"""
+Check that the account hierarchy (closure table) kept up to date on each
+change matches a rebuild from the parent of each account.
+"""
+from sqlalchemy import select
+from models import Account, AccountTree
+from plan_comptable.pcm import initialize_pcm
+from utils.chart_of_accounts import (
+    get_subtree_ids,
+    rebuild_account_tree,
+    record_account_deleted,
+    record_account_moved
+)
+
+def get_paths(session):
+    """Return the (ancestor, descendant, depth) rows of the hierarchy"""
+    rows = session.execute(select(AccountTree.ancestor_id, AccountTree.descendant_id, AccountTree.depth))
+    return sorted(tuple(row) for row in rows)
+
+def test_added_accounts_are_under_their_ancestors(session, make_account):
+    expenses = make_account('6')
+    purchases = make_account('61', expenses)
+    goods = make_account('611', purchases)
+    
+    assert get_subtree_ids(expenses.id) == {expenses.id, purchases.id, goods.id}
+    assert (expenses.id, goods.id, 2) in get_paths(session)
+    
+    paths = get_paths(session)
+    rebuild_account_tree()
+    assert get_paths(session) == paths
+
+def test_moved_subtree_follows_its_new_parent(session, make_account):
+    expenses = make_account('6')
+    purchases = make_account('61', expenses)
+    goods = make_account('611', purchases)
+    goods_detail = make_account('6111', goods)
+    revenues = make_account('7')
+    
+    goods.parent_id = revenues.id
+    session.flush()
+    record_account_moved(goods, purchases.id)
+    
+    assert get_subtree_ids(expenses.id) == {expenses.id, purchases.id}
+    assert get_subtree_ids(revenues.id) == {revenues.id, goods.id, goods_detail.id}
+    assert (revenues.id, goods_detail.id, 2) in get_paths(session)
+    
+    paths = get_paths(session)
+    rebuild_account_tree()
+    assert get_paths(session) == paths
+
+def test_moved_account_can_become_a_root(session, make_account):
+    expenses = make_account('6')
+    purchases = make_account('61', expenses)
+    goods = make_account('611', purchases)
+    
+    purchases.parent_id = None
+    session.flush()
+    record_account_moved(purchases, expenses.id)
+    
+    assert get_subtree_ids(expenses.id) == {expenses.id}
+    assert get_subtree_ids(purchases.id) == {purchases.id, goods.id}
+    
+    paths = get_paths(session)
+    rebuild_account_tree()
+    assert get_paths(session) == paths
+
+def test_deleted_account_leaves_the_hierarchy(session, make_account):
+    expenses = make_account('6')
+    purchases = make_account('61', expenses)
+    goods = make_account('611', purchases)
+    
+    record_account_deleted(goods)
+    session.delete(goods)
+    session.flush()
+    
+    assert get_subtree_ids(expenses.id) == {expenses.id, purchases.id}
+    assert all(goods.id not in path[:2] for path in get_paths(session))
+    
+    paths = get_paths(session)
+    rebuild_account_tree()
+    assert get_paths(session) == paths
+
+def test_pcm_upsert_relinks_accounts_under_new_parents(session, make_account, monkeypatch):
+    # Keep the seeded chart in the transaction rolled back after the test
+    monkeypatch.setattr(session, 'commit', session.flush)
+    
+    # A custom account created before its standard parent "7121" exists
+    sales = make_account('712')
+    domestic_sales = make_account('71211', sales)
+    
+    assert initialize_pcm(upsert=True)
+    
+    parent_id = session.scalar(select(Account.id).filter_by(code='7121'))
+    assert session.scalar(select(Account.parent_id).filter_by(id=domestic_sales.id)) == parent_id
+    assert get_subtree_ids(parent_id) == {parent_id, domestic_sales.id}
+    
+    paths = get_paths(session)
+    rebuild_account_tree()
+    assert get_paths(session) == paths
+    
+    assert not initialize_pcm(upsert=True)
@@ -0,0 +1,116 @@
+"""
+Check the parsing and validation of journal import rows.
+"""
+from datetime import date
+import pandas as pd
+import pytest
+from utils.journal_import import parse_amounts, validate_chunk
+
+ACCOUNT_IDS = {'5141': 1, '7111': 2}
+
+CSV_COLUMNS = ['date', 'reference', 'description', 'account', 'label', 'debit', 'credit']
+
+def make_chunk(rows):
+    """Build a chunk as read by iter_import_chunks from (date, reference, account, debit, credit) rows"""
+    chunk = pd.DataFrame(
+        [(row_date, reference, 'Écriture', account, '', debit, credit)
+         for row_date, reference, account, debit, credit in rows],
+        columns=CSV_COLUMNS
+    )
+    chunk['row'] = chunk.index + 2
+    keys = chunk[['date', 'reference']]
+    chunk['entry'] = keys.ne(keys.shift()).any(axis=1).cumsum()
+    return chunk
+
+def get_reasons(rows, closed_until=None):
+    """Return the rejection reason of each rejected row number"""
+    accepted, rejected = validate_chunk(make_chunk(rows), 'csv', ACCOUNT_IDS, closed_until)
+    return dict(zip(rejected['row'], rejected['reason']))
+
+@pytest.mark.parametrize('text, centimes', [
+    ('', 0),
+    (' 12 ', 1200),
+    ('12,05', 1205),
+    ('0.1', 10),
+    ('.5', 50),
+    ('5.', 500),
+    ('-3.20', -320),
+    ('1.2300', 123),
+    ('0.29', 29),
+    ('123456789012345.67', 12345678901234567)
+])
+def test_parse_amounts_to_centimes(text, centimes):
+    values, extra_decimals = parse_amounts(pd.Series([text]))
+    
+    assert values[0] == centimes
+    assert not extra_decimals[0]
+
+@pytest.mark.parametrize('text, extra_decimals', [
+    ('1.005', True),
+    ('1,0001', True),
+    ('abc', False),
+    ('.', False),
+    ('-', False),
+    ('1e3', False),
+    ('1 000', False),
+    ('1234567890123456', False)
+])
+def test_parse_amounts_rejects_invalid_amounts(text, extra_decimals):
+    values, extra = parse_amounts(pd.Series([text]))
+    
+    assert pd.isna(values[0])
+    assert extra[0] == extra_decimals
+
+def test_validate_chunk_accepts_balanced_entries():
+    accepted, rejected = validate_chunk(make_chunk([
+        ('2030-01-10', 'A1', '5141', '0.29', ''),
+        ('2030-01-10', 'A1', '5141', '0.57', ''),
+        ('2030-01-10', 'A1', '7111', '', '0.86')
+    ]), 'csv', ACCOUNT_IDS, None)
+    
+    assert rejected.empty
+    assert accepted['debit'].tolist() == [29, 57, 0]
+    assert accepted['credit'].tolist() == [0, 0, 86]
+    assert accepted['account_id'].tolist() == [1, 1, 2]
+
+def test_validate_chunk_rejects_whole_entries():
+    reasons = get_reasons([
+        ('2030-01-10', 'U1', '5141', '10', ''),
+        ('2030-01-10', 'U1', '7111', '', '9.99'),
+        ('2030-01-11', 'P1', '5141', '1.005', ''),
+        ('2030-01-11', 'P1', '7111', '', '1.005'),
+        ('2030-01-12', 'C1', '9999', '5', ''),
+        ('2030-01-12', 'C1', '7111', '', '5'),
+        ('2030-01-13', 'OK', '5141', '5', ''),
+        ('2030-01-13', 'OK', '7111', '', '5')
+    ])
+    
+    assert reasons == {
+        2: 'Écriture déséquilibrée',
+        3: 'Écriture déséquilibrée',
+        4: 'Plus de deux décimales',
+        5: 'Plus de deux décimales',
+        6: 'Compte inconnu',
+        7: "Autre ligne de l'écriture rejetée"
+    }
+
+def test_validate_chunk_requires_references():
+    reasons = get_reasons([
+        ('2030-01-10', '', '5141', '10', ''),
+        ('2030-01-10', '', '7111', '', '10'),
+        ('2030-01-10', '', '5141', '5', ''),
+        ('2030-01-10', '', '7111', '', '5')
+    ])
+    
+    assert set(reasons.values()) == {'Référence manquante'}
+    assert len(reasons) == 4
+
+def test_validate_chunk_rejects_closed_periods():
+    reasons = get_reasons([
+        ('2030-01-31', 'A1', '5141', '10', ''),
+        ('2030-01-31', 'A1', '7111', '', '10'),
+        ('2030-02-01', 'A2', '5141', '10', ''),
+        ('2030-02-01', 'A2', '7111', '', '10')
+    ], closed_until=date(2030, 1, 31))
+    
+    assert reasons == {2: 'Période clôturée', 3: 'Période clôturée'}
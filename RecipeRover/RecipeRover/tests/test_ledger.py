@@ -0,0 +1,137 @@
+"""
+Check the incremental daily balances, period closings, money amounts and
+report cache of the ledger.
+"""
+from datetime import date
+from decimal import Decimal
+import pytest
+from sqlalchemy import BigInteger, select, type_coerce
+from models import AccountDailyBalance, JournalEntry, JournalEntryLine
+from utils.chart_of_accounts import get_account_info
+from utils.ledger import (
+    apply_to_daily_balances,
+    is_period_closed,
+    rebuild_daily_balances,
+    record_entry_deleted,
+    record_entry_moved,
+    record_line_added,
+    record_line_deleted
+)
+from utils.period_closing import close_period
+from utils.report_generator import get_account_totals
+
+def get_daily_balances(session):
+    """Return the non-zero daily balances, read past the session's identity map"""
+    rows = session.execute(select(
+        AccountDailyBalance.account_id,
+        AccountDailyBalance.date,
+        AccountDailyBalance.debit,
+        AccountDailyBalance.credit
+    ))
+    return sorted(tuple(row) for row in rows if row.debit or row.credit)
+
+def post_entry(session, user, entry_date, amounts):
+    """Create a journal entry with (account, debit, credit) lines and post it to the daily balances"""
+    entry = JournalEntry(date=entry_date, reference='TEST', created_by_id=user.id)
+    session.add(entry)
+    session.flush()
+    
+    for account, debit, credit in amounts:
+        line = JournalEntryLine(journal_entry_id=entry.id, account_id=account.id,
+                                debit=Decimal(debit), credit=Decimal(credit))
+        session.add(line)
+        record_line_added(line, entry_date)
+    
+    session.flush()
+    return entry
+
+def test_incremental_daily_balances_match_rebuild(session, admin, make_account):
+    bank = make_account('5141')
+    sales = make_account('7111')
+    
+    post_entry(session, admin, date(2030, 1, 10), [(bank, '100.10', '0'), (sales, '0', '100.10')])
+    moved = post_entry(session, admin, date(2030, 1, 10), [(bank, '20.05', '0'), (bank, '5', '0'), (sales, '0', '25.05')])
+    deleted = post_entry(session, admin, date(2030, 1, 11), [(bank, '7', '0'), (sales, '0', '7')])
+    
+    # Add a line, move an entry to another date, delete a line and an entry
+    extra = JournalEntryLine(journal_entry_id=moved.id, account_id=sales.id, debit=Decimal('1.50'), credit=0)
+    session.add(extra)
+    record_line_added(extra, moved.date)
+    
+    record_entry_moved(moved, moved.date, date(2030, 1, 12))
+    moved.date = date(2030, 1, 12)
+    
+    line = moved.lines[0]
+    record_line_deleted(line, moved.date)
+    session.delete(line)
+    
+    record_entry_deleted(deleted)
+    session.delete(deleted)
+    session.flush()
+    
+    incremental = get_daily_balances(session)
+    rebuild_daily_balances()
+    
+    assert incremental == get_daily_balances(session)
+    assert (bank.id, date(2030, 1, 12), Decimal('5.00'), Decimal('0.00')) in incremental
+
+def test_closed_period_rejects_postings(session, admin, make_account):
+    bank = make_account('5141')
+    sales = make_account('7111')
+    post_entry(session, admin, date(2030, 3, 31), [(bank, '50', '0'), (sales, '0', '50')])
+    
+    close_period(date(2030, 3, 31), admin.id)
+    
+    assert is_period_closed(date(2030, 3, 31))
+    assert not is_period_closed(date(2030, 4, 1))
+    
+    with pytest.raises(ValueError):
+        apply_to_daily_balances([{'account_id': bank.id, 'date': date(2030, 3, 1), 'debit': 1, 'credit': 0}])
+    with pytest.raises(ValueError):
+        close_period(date(2030, 3, 31), admin.id)
+    
+    # Rebuilding the daily balances leaves the closed dates as they were
+    closed_balances = get_daily_balances(session)
+    session.execute(JournalEntryLine.__table__.update().values(debit=JournalEntryLine.debit * 2))
+    rebuild_daily_balances()
+    assert get_daily_balances(session) == closed_balances
+    
+    post_entry(session, admin, date(2030, 4, 1), [(bank, '10', '0'), (sales, '0', '10')])
+    assert get_account_totals(date(2030, 4, 1))[bank.id] == (Decimal('60.00'), Decimal('0.00'))
+
+@pytest.mark.parametrize('amount, expected', [
+    (Decimal('10.005'), Decimal('10.01')),
+    (Decimal('10.004'), Decimal('10.00')),
+    (Decimal('-0.005'), Decimal('-0.01')),
+    (0.1 + 0.2, Decimal('0.30')),
+    (12, Decimal('12.00'))
+])
+def test_money_is_stored_in_centimes(session, admin, make_account, amount, expected):
+    entry = post_entry(session, admin, date(2030, 5, 1), [(make_account('5141'), amount, '0')])
+    line_id = entry.lines[0].id
+    session.expire_all()
+    
+    assert session.get(JournalEntryLine, line_id).debit == expected
+    assert session.scalar(
+        select(type_coerce(JournalEntryLine.debit, BigInteger)).where(JournalEntryLine.id == line_id)
+    ) == int(expected * 100)
+
+def test_report_cache_follows_ledger_and_chart_versions(session, admin, make_account):
+    bank = make_account('5141')
+    sales = make_account('7111')
+    post_entry(session, admin, date(2030, 6, 1), [(bank, '30', '0'), (sales, '0', '30')])
+    
+    totals = get_account_totals(date(2030, 6, 30))
+    assert get_account_totals(date(2030, 6, 30)) is totals
+    with pytest.raises(TypeError):
+        totals[bank.id] = (0, 0)
+    
+    # A new journal line bumps the ledger version
+    post_entry(session, admin, date(2030, 6, 2), [(bank, '5', '0'), (sales, '0', '5')])
+    assert get_account_totals(date(2030, 6, 30))[bank.id] == (Decimal('35.00'), Decimal('0.00'))
+    
+    # A new account bumps the chart version
+    assert get_account_info(bank.id).code == '5141'
+    customers = make_account('3421')
+    session.flush()
+    assert get_account_info(customers.id).code == '3421'
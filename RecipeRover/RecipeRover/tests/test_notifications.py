@@ -0,0 +1,24 @@
+"""
+Check that the header notifications are served from the cache until
+notifications are created, read or deleted.
+"""
+from models import Notification
+from utils.notifications import fan_out_notification, header_notifications_cache
+
+def test_header_notifications_follow_the_notification_version(session, admin):
+    unread_count, latest = header_notifications_cache.load(admin.id)
+    
+    fan_out_notification('Échéance TVA', 'Déclaration à déposer')
+    unread, latest = header_notifications_cache.load(admin.id)
+    assert unread == unread_count + 1
+    assert latest[0].title == 'Échéance TVA'
+    assert header_notifications_cache.load(admin.id)[1] is latest
+    
+    notification = session.get(Notification, latest[0].id)
+    notification.is_read = True
+    session.flush()
+    assert header_notifications_cache.load(admin.id)[0] == unread_count
+    
+    session.delete(notification)
+    session.flush()
+    assert all(info.id != notification.id for info in header_notifications_cache.load(admin.id)[1])
@@ -0,0 +1,83 @@
+"""
+Check that the key ledger, invoice and notification queries are answered
+from their indexes.
+
+The SQLite plans are read from the application's test database. The
+PostgreSQL plans are checked when TEST_POSTGRES_URL points at a server; the
+tables are created in a transaction that is rolled back afterwards, and
+sequential scans are disabled since the planner would otherwise prefer them
+on empty tables.
+"""
+import os
+from datetime import date
+import pytest
+from sqlalchemy import create_engine, text
+from app import db
+from models import Invoice, JournalEntry, JournalEntryLine, Notification
+from utils.tax_calculator import get_vat_lines_query
+
+START_DATE = date(2025, 1, 1)
+END_DATE = date(2025, 3, 31)
+
+QUERY_NAMES = ['journal_page', 'account_ledger', 'entry_lines', 'vat_invoices', 'unread_notifications']
+
+def build_queries():
+    """Build each key query as the application does, with the index it should use"""
+    return {
+        # Journal page, from the keyset position of the previous page
+        'journal_page': (
+            JournalEntry.query.filter(JournalEntry.date <= END_DATE).
+                order_by(JournalEntry.date.desc(), JournalEntry.id.desc()).limit(51),
+            'ix_journal_entry_date_id'
+        ),
+        # Account ledger page
+        'account_ledger': (
+            db.session.query(JournalEntryLine.id, JournalEntryLine.date, JournalEntryLine.debit).
+                filter(JournalEntryLine.account_id == 5, JournalEntryLine.date >= START_DATE).
+                order_by(JournalEntryLine.date, JournalEntryLine.id).limit(101),
+            'ix_journal_entry_line_account_date'
+        ),
+        # Lines of one journal entry
+        'entry_lines': (
+            JournalEntryLine.query.filter_by(journal_entry_id=10),
+            'ix_journal_entry_line_journal_entry_id'
+        ),
+        # Invoice lines of a VAT period
+        'vat_invoices': (
+            get_vat_lines_query(START_DATE, END_DATE, Invoice.invoice_type, Invoice.date),
+            'ix_invoice_type_date'
+        ),
+        # Unread notifications of the header
+        'unread_notifications': (
+            Notification.query.filter_by(user_id=1, is_read=False),
+            'ix_notification_user_read'
+        )
+    }
+
+def explain(connection, prefix, query):
+    """Return the plan of a query as text"""
+    statement = query.statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True})
+    return '\n'.join(' '.join(str(value) for value in row) for row in connection.execute(text(prefix + str(statement))))
+
+@pytest.mark.parametrize('name', QUERY_NAMES)
+def test_sqlite_query_uses_index(app_context, name):
+    query, index_name = build_queries()[name]
+    plan = explain(db.session.connection(), 'EXPLAIN QUERY PLAN ', query)
+    
+    assert index_name in plan, plan
+
+@pytest.mark.skipif(not os.environ.get('TEST_POSTGRES_URL'), reason='TEST_POSTGRES_URL is not set')
+def test_postgresql_queries_use_indexes(app_context):
+    engine = create_engine(os.environ['TEST_POSTGRES_URL'])
+    
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            db.metadata.create_all(connection)
+            connection.execute(text('SET LOCAL enable_seqscan = off'))
+            
+            for name, (query, index_name) in build_queries().items():
+                plan = explain(connection, 'EXPLAIN ', query)
+                assert index_name in plan, f"{name}:\n{plan}"
+        finally:
+            transaction.rollback()
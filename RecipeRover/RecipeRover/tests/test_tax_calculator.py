@@ -0,0 +1,122 @@
+"""
+Check the IS and IR bracket tables and the tax calculations built on them.
+"""
+from datetime import date
+from decimal import Decimal
+import numpy as np
+from models import Employee, JournalEntry, JournalEntryLine, PayrollLine
+from utils.ledger import record_line_added
+from utils.tax_calculator import (
+    IR_BRACKETS,
+    IS_BRACKETS,
+    bracket_label,
+    calculate_ir,
+    calculate_is,
+    calculate_is_years,
+    get_brackets,
+    progressive_tax
+)
+
+def test_get_brackets_picks_the_latest_table_of_a_year():
+    tables = {0: [(0, 10)], 2026: [(0, 15)]}
+    
+    assert get_brackets(tables, 2020) == [(0, 10)]
+    assert get_brackets(tables, 2026) == [(0, 15)]
+    assert get_brackets(tables, 2031) == [(0, 15)]
+    assert get_brackets(IS_BRACKETS, 2025) == [(0, 10), (300000, 20), (1000000, 31)]
+
+def test_bracket_labels():
+    brackets = get_brackets(IS_BRACKETS, 2025)
+    
+    assert [bracket_label(brackets, index) for index in range(3)] == [
+        '≤ 300,000 MAD', '300,001 - 1,000,000 MAD', '> 1,000,000 MAD'
+    ]
+
+def test_progressive_tax_in_centimes():
+    incomes = np.array([0, 300000_00, 1224567_88])
+    taxes, bases = progressive_tax(incomes, get_brackets(IS_BRACKETS, 2025))
+    
+    assert bases.tolist() == [
+        [0, 0, 0],
+        [300000_00, 0, 0],
+        [300000_00, 700000_00, 224567_88]
+    ]
+    assert np.rint(taxes).tolist() == [0, 30000_00, 239616_04]
+
+def test_ir_brackets_match_the_scale():
+    # 30,000 MAD and below are exempt, then 10% up to 50,000 MAD, etc.
+    brackets = get_brackets(IR_BRACKETS, 2025)
+    incomes = np.array([30000_00, 50000_00, 60000_00, 80000_00, 180000_00, 200000_00])
+    
+    assert np.rint(progressive_tax(incomes, brackets)[0]).tolist() == [
+        0, 2000_00, 4000_00, 10000_00, 44000_00, 51600_00
+    ]
+
+def post_year(session, user, year, revenue, expenses, make_account):
+    """Post a year's revenue (class 7) and expenses (class 6) against the bank"""
+    bank = make_account('5141')
+    sales = make_account('7111')
+    purchases = make_account('6111')
+    
+    entry = JournalEntry(date=date(year, 6, 30), reference='IS', created_by_id=user.id)
+    session.add(entry)
+    session.flush()
+    
+    for account, debit, credit in [
+        (bank, revenue, 0), (sales, 0, revenue), (purchases, expenses, 0), (bank, 0, expenses)
+    ]:
+        line = JournalEntryLine(journal_entry_id=entry.id, account_id=account.id,
+                                debit=Decimal(debit), credit=Decimal(credit))
+        session.add(line)
+        record_line_added(line, entry.date)
+    
+    session.flush()
+
+def test_calculate_is(session, admin, make_account):
+    post_year(session, admin, 2030, '1234567.89', '10000.01', make_account)
+    
+    result = calculate_is(2030)
+    
+    assert result['net_income'] == Decimal('1224567.88')
+    assert [detail['is'] for detail in result['is_details']] == [
+        Decimal('30000.00'), Decimal('140000.00'), Decimal('69616.04')
+    ]
+    assert result['total_is'] == Decimal('239616.04')
+
+def test_calculate_is_years_without_profit(session, admin, make_account):
+    post_year(session, admin, 2030, '100', '250.50', make_account)
+    
+    results = calculate_is_years([2029, 2030])
+    
+    assert results[2029]['total_is'] == Decimal('0.00')
+    assert results[2030]['net_income'] == Decimal('-150.50')
+    assert results[2030]['is_details'] == [
+        {'tranche': '≤ 0 MAD', 'base': Decimal('-150.50'), 'rate': 0, 'is': Decimal('0.00')}
+    ]
+    assert results[2030]['total_is'] == Decimal('0.00')
+
+def test_calculate_ir(session):
+    employee = Employee(name='Amina', cin='TEST1')
+    exempt = Employee(name='Karim', cin='TEST2')
+    session.add_all([employee, exempt])
+    session.flush()
+    
+    session.add_all([
+        PayrollLine(employee_id=employee.id, year=2030, month=1,
+                    gross_salary=Decimal('15000'), cnss=Decimal('268.80'), cimr=Decimal('450')),
+        PayrollLine(employee_id=employee.id, year=2030, month=2,
+                    gross_salary=Decimal('15000'), cnss=Decimal('268.80'), cimr=Decimal('450')),
+        PayrollLine(employee_id=exempt.id, year=2030, month=2,
+                    gross_salary=Decimal('2500'), cnss=Decimal('107.50'), cimr=0)
+    ])
+    session.flush()
+    
+    # 14,281.20 MAD net taxable a month: (10,000 + (171,374.40 - 80,000) x 34%) / 12
+    month = calculate_ir(2030, 2)
+    assert {detail['employee']: detail['ir'] for detail in month['ir_details']} == {
+        'Amina': Decimal('3422.27'), 'Karim': Decimal('0.00')
+    }
+    assert month['total_ir'] == Decimal('3422.27')
+    
+    year = calculate_ir(2030)
+    assert year['total_ir'] == Decimal('6844.54')
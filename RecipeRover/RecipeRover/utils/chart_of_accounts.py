@@ -0,0 +1,196 @@
+import threading
+from collections import namedtuple
+from app import db
+from models import Account, AccountTree
+from utils.ledger import CHART_VERSION_ID, get_ledger_version
+from sqlalchemy import delete, insert, literal, or_, select
+from sqlalchemy.orm import aliased
+
+# Lightweight copy of an account, safe to share between requests
+AccountInfo = namedtuple('AccountInfo', ['id', 'code', 'name', 'parent_id'])
+
+class ChartOfAccountsCache:
+    """
+    Process-wide cache of the chart of accounts used to populate form choices.
+    
+    The accounts are reloaded whenever the chart version changes, i.e. after
+    an account is created, edited or deleted in any worker process.
+    """
+    
+    def __init__(self):
+        self.version = None
+        self.accounts = []
+        self.by_id = {}
+        self.choices = []
+        self.lock = threading.Lock()
+    
+    def load(self):
+        """Return the up-to-date cached accounts, reloading them if needed"""
+        version = get_ledger_version(CHART_VERSION_ID)
+        
+        with self.lock:
+            if self.version != version:
+                rows = Account.query.with_entities(Account.id, Account.code, Account.name, Account.parent_id).\
+                    order_by(Account.code).all()
+                
+                self.accounts = [AccountInfo(*row) for row in rows]
+                self.by_id = {account.id: account for account in self.accounts}
+                self.choices = [(account.id, f"{account.code} - {account.name}") for account in self.accounts]
+                self.version = version
+            
+            return self
+    
+    def clear(self):
+        """Drop the cached accounts"""
+        with self.lock:
+            self.version = None
+            self.accounts = []
+            self.by_id = {}
+            self.choices = []
+
+chart_cache = ChartOfAccountsCache()
+
+def get_account_choices(exclude=None):
+    """
+    Get the (id, "code - name") choices of all accounts, sorted by code.
+    
+    Args:
+        exclude (set): Optional account IDs to leave out
+    
+    Returns:
+        list: Choice tuples, shared between requests (copy before modifying)
+    """
+    choices = chart_cache.load().choices
+    
+    if exclude:
+        return [choice for choice in choices if choice[0] not in exclude]
+    
+    return choices
+
+def get_account_info(account_id):
+    """
+    Get the cached details of an account.
+    
+    Args:
+        account_id (int): The account ID
+    
+    Returns:
+        AccountInfo: The account, or None if it does not exist
+    """
+    return chart_cache.load().by_id.get(account_id)
+
+
+def get_subtree_ids(account_id):
+    """
+    Get the IDs of an account and all of its sub-accounts, at any depth.
+    
+    Args:
+        account_id (int): The root account ID
+    
+    Returns:
+        set: Account IDs of the subtree, including the root
+    """
+    return set(db.session.scalars(
+        select(AccountTree.descendant_id).where(AccountTree.ancestor_id == account_id)
+    ))
+
+def record_account_added(account):
+    """
+    Add a new account under its ancestors in the hierarchy.
+    
+    The account must already be flushed so that it has an ID.
+    """
+    db.session.execute(insert(AccountTree).values(ancestor_id=account.id, descendant_id=account.id, depth=0))
+    
+    if account.parent_id:
+        ancestors = select(
+            AccountTree.ancestor_id,
+            literal(account.id),
+            AccountTree.depth + 1
+        ).where(AccountTree.descendant_id == account.parent_id)
+        
+        db.session.execute(
+            insert(AccountTree).from_select(['ancestor_id', 'descendant_id', 'depth'], ancestors)
+        )
+
+def record_account_moved(account, old_parent_id):
+    """
+    Move an account and its whole subtree under the account's new parent.
+    
+    Args:
+        account (Account): The account, with its new parent_id already set
+        old_parent_id (int): The previous parent ID
+    """
+    if account.parent_id == old_parent_id:
+        return
+    
+    subtree = select(AccountTree.descendant_id).where(AccountTree.ancestor_id == account.id)
+    
+    # Detach the subtree from its former ancestors
+    db.session.execute(
+        delete(AccountTree).where(
+            AccountTree.descendant_id.in_(subtree),
+            AccountTree.ancestor_id.not_in(subtree)
+        )
+    )
+    
+    # Attach it to every ancestor of the new parent
+    if account.parent_id:
+        parent_path = aliased(AccountTree)
+        subtree_path = aliased(AccountTree)
+        paths = select(
+            parent_path.ancestor_id,
+            subtree_path.descendant_id,
+            parent_path.depth + subtree_path.depth + 1
+        ).join(subtree_path, subtree_path.ancestor_id == account.id).\
+            where(parent_path.descendant_id == account.parent_id)
+        
+        db.session.execute(
+            insert(AccountTree).from_select(['ancestor_id', 'descendant_id', 'depth'], paths)
+        )
+
+def record_account_deleted(account):
+    """Remove a deleted account from the hierarchy"""
+    db.session.execute(
+        delete(AccountTree).where(
+            or_(AccountTree.ancestor_id == account.id, AccountTree.descendant_id == account.id)
+        )
+    )
+
+def rebuild_account_tree():
+    """
+    Rebuild the whole hierarchy from the parent of each account, one
+    INSERT ... SELECT per level of depth.
+    """
+    db.session.execute(delete(AccountTree))
+    
+    accounts = select(Account.id, Account.id, literal(0))
+    db.session.execute(
+        insert(AccountTree).from_select(['ancestor_id', 'descendant_id', 'depth'], accounts)
+    )
+    
+    # Extend every path of the previous level by one child; a parent cycle
+    # cannot go deeper than the number of accounts
+    max_depth = Account.query.count()
+    depth = 0
+    while depth < max_depth:
+        paths = select(
+            AccountTree.ancestor_id,
+            Account.id,
+            literal(depth + 1)
+        ).join(Account, Account.parent_id == AccountTree.descendant_id).\
+            where(AccountTree.depth == depth)
+        
+        result = db.session.execute(
+            insert(AccountTree).from_select(['ancestor_id', 'descendant_id', 'depth'], paths)
+        )
+        if not result.rowcount:
+            break
+        
+        depth += 1
+
+def init_account_tree():
+    """Populate the hierarchy of an existing chart of accounts the first time it is needed"""
+    if AccountTree.query.first() is None and Account.query.first() is not None:
+        rebuild_account_tree()
+        db.session.commit()
@@ -0,0 +1,143 @@
+import multiprocessing
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from importlib import import_module
+import click
+from app import app
+from utils.export import STREAMED_EXCEL_REPORTS
+from utils.export_jobs import build_report_data, create_export_job, get_report_file_name, render_report
+
+# Reports of the closing pack, longest first so that they start right away
+CLOSING_PACK_REPORTS = ['journal', 'ledger', 'vat', 'trial_balance', 'balance_sheet', 'income_statement']
+
+# Formats in which each report of the closing pack is written
+CLOSING_PACK_FORMATS = ['pdf', 'excel']
+
+def render_closing_report(report_type, format_type, start_date, end_date, report_data, folder):
+    """
+    Write one report of the closing pack from a worker process.
+    
+    Args:
+        report_type (str): Type of report ('balance_sheet', 'income_statement', etc.)
+        format_type (str): 'pdf' or 'excel'
+        start_date (date): Start date of the fiscal year
+        end_date (date): End date of the fiscal year
+        report_data (dict): Data computed by the parent process, or None to
+            read it in the worker (journals and ledgers are streamed)
+        folder (str): Folder in which to write the file
+    
+    Returns:
+        str: Path of the written file
+    """
+    with app.app_context():
+        content = render_report(report_type, format_type, start_date, end_date, report_data)
+    
+    path = os.path.join(folder, get_report_file_name(report_type, format_type, start_date, end_date))
+    with open(path, 'wb') as report_file:
+        report_file.write(content)
+    
+    return path
+
+def generate_closing_pack(start_date, end_date, path, workers=None, progress=None):
+    """
+    Write every year-end report to a single zip file.
+    
+    The aggregates shared by the PDF and Excel versions of a report (balance
+    sheet, CPC, trial balance, VAT totals) are computed once here, then the
+    files are rendered in parallel by a pool of processes.
+    
+    Args:
+        start_date (date): Start date of the fiscal year
+        end_date (date): End date of the fiscal year
+        path (str): Path of the zip file to write
+        workers (int, optional): Number of processes, CLOSING_PACK_WORKERS by default
+        progress (callable, optional): Called with the completed fraction (0 to 1)
+    
+    Returns:
+        list: Names of the files in the pack
+    """
+    # Compute the report data once for both formats (journals and ledgers
+    # are streamed by the workers instead)
+    report_data = {}
+    for report_type in CLOSING_PACK_REPORTS:
+        if report_type not in STREAMED_EXCEL_REPORTS:
+            report_data[report_type] = build_report_data(report_type, start_date, end_date)
+    
+    tasks = [
+        (report_type, format_type)
+        for report_type in CLOSING_PACK_REPORTS
+        for format_type in CLOSING_PACK_FORMATS
+    ]
+    workers = min(workers or app.config['CLOSING_PACK_WORKERS'], len(tasks))
+    file_names = []
+    
+    # Worker processes are started fresh rather than forked from a process
+    # running other threads, and load the application before the report
+    # functions that depend on it
+    with tempfile.TemporaryDirectory() as folder, \
+            ProcessPoolExecutor(max_workers=workers,
+                                mp_context=multiprocessing.get_context('spawn'),
+                                initializer=import_module, initargs=('app',)) as pool, \
+            zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as pack:
+        futures = [
+            pool.submit(render_closing_report, report_type, format_type, start_date, end_date,
+                        report_data.get(report_type), folder)
+            for report_type, format_type in tasks
+        ]
+        
+        try:
+            # Add each file to the pack as soon as it is ready
+            for future in as_completed(futures):
+                report_path = future.result()
+                file_names.append(os.path.basename(report_path))
+                pack.write(report_path, file_names[-1])
+                os.remove(report_path)
+                
+                if progress:
+                    progress(len(file_names) / len(tasks))
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+    
+    return file_names
+
+def write_closing_pack_file(job, path, progress):
+    """Write the closing pack of an export job to a file"""
+    generate_closing_pack(job.start_date, job.end_date, path, progress=progress)
+
+def create_closing_pack_job(user_id, year):
+    """
+    Queue the generation of the closing pack of a fiscal year.
+    
+    Args:
+        user_id (int): The user requesting the pack
+        year (int): The fiscal year
+    
+    Returns:
+        ExportJob: The queued job
+    """
+    return create_export_job(user_id, 'closing_pack', 'zip', date(year, 1, 1), date(year, 12, 31),
+                             write_closing_pack_file)
+
+@click.command('closing-pack')
+@click.argument('year', type=int)
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Path of the zip file to write.')
+@click.option('--workers', '-w', type=int, help='Number of worker processes.')
+def closing_pack_command(year, output, workers):
+    """Generate the year-end closing pack of YEAR."""
+    start_date = date(year, 1, 1)
+    end_date = date(year, 12, 31)
+    path = output or get_report_file_name('closing_pack', 'zip', start_date, end_date)
+    
+    started = time.monotonic()
+    with app.app_context():
+        file_names = generate_closing_pack(start_date, end_date, path, workers)
+    
+    for file_name in file_names:
+        click.echo(f"  {file_name}")
+    click.echo(f"{len(file_names)} rapports écrits dans {path} en {time.monotonic() - started:.1f} s")
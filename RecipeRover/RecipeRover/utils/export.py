@@ -7,8 +7,128 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 import pandas as pd
+from utils.report_generator import iter_general_ledger, iter_journal
 
-def export_pdf(report_type, report_data, title, start_date, end_date):
+# Excel reports written row by row in constant memory mode
+STREAMED_EXCEL_REPORTS = ['journal', 'ledger']
+
+def create_pdf_styles():
+    """Create the paragraph styles of the PDF reports"""
+    styles = getSampleStyleSheet()
+    
+    # Add custom styles
+    styles.add(ParagraphStyle(
+        name='ReportTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        alignment=1,  # Center
+        spaceAfter=20
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='Subtitle',
+        parent=styles['Heading2'],
+        fontSize=12,
+        alignment=1,  # Center
+        spaceAfter=10
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='RightAlign',
+        parent=styles['Normal'],
+        alignment=2  # Right
+    ))
+    
+    return styles
+
+def create_table_style(amount_columns, total_row=True):
+    """
+    Create the style of a PDF table with a header row.
+    
+    Args:
+        amount_columns (tuple): First and last column of the right-aligned amounts
+        total_row (bool): Whether the last row holds totals
+    
+    Returns:
+        TableStyle: The table style
+    """
+    first, last = amount_columns
+    commands = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('ALIGN', (first, 1), (last, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('BOX', (0, 0), (-1, -1), 2, colors.black),
+    ]
+    
+    if total_row:
+        commands.extend([
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ])
+    
+    return TableStyle(commands)
+
+# Styles are built once and shared by all exports (they are never modified)
+PDF_STYLES = create_pdf_styles()
+
+ACCOUNTS_TABLE_STYLE = create_table_style((2, 2))
+JOURNAL_TABLE_STYLE = create_table_style((2, 3))
+LEDGER_TABLE_STYLE = create_table_style((3, 5), total_row=False)
+VAT_TABLE_STYLE = create_table_style((3, 5))
+TRIAL_BALANCE_TABLE_STYLE = create_table_style((2, 3))
+
+TOTAL_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BOX', (0, 0), (-1, -1), 2, colors.black),
+])
+
+VAT_SUMMARY_TABLE_STYLE = TableStyle([
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, -1), (1, -1), 'Helvetica-Bold'),
+    ('LINEBELOW', (0, 0), (1, 0), 1, colors.black),
+    ('LINEBELOW', (0, 1), (1, 1), 1, colors.black),
+    ('LINEBELOW', (0, -1), (1, -1), 2, colors.black),
+])
+
+def create_pdf_table(data, col_widths, style, header_rows=1):
+    """
+    Create a PDF table that is split between pages when it is too long, with
+    its header rows repeated at the top of each page.
+    
+    Args:
+        data (list): Rows of the table, header rows first
+        col_widths (list): Width of each column
+        style (TableStyle): One of the shared table styles
+        header_rows (int): Number of header rows to repeat
+    
+    Returns:
+        Table: The table
+    """
+    return Table(data, colWidths=col_widths, style=style, repeatRows=header_rows, splitByRow=1)
+
+def scale_progress(progress, start, end):
+    """Map the progress of a step (0 to 1) to its share of the whole export"""
+    if progress is None:
+        return None
+    return lambda fraction: progress(start + (end - start) * fraction)
+
+def period_fraction(date, start_date, end_date):
+    """Return how far a date is into a period, from 0 to 1"""
+    days = (end_date - start_date).days
+    if days <= 0:
+        return 1
+    return (date - start_date).days / days
+
+def export_pdf(report_type, report_data, title, start_date, end_date, progress=None):
     """
     Generate a PDF report based on the report type and data.
     
@@ -18,6 +138,8 @@ def export_pdf(report_type, report_data, title, start_date, end_date):
         title (str): Title of the report
         start_date (date): Start date of the report period
         end_date (date): End date of the report period
+        progress (callable, optional): Called with the completed fraction (0 to 1)
+            while a journal or ledger is generated
         
     Returns:
         bytes: PDF data
@@ -34,37 +156,14 @@ def export_pdf(report_type, report_data, title, start_date, end_date):
         bottomMargin=30
     )
     
-    # Styles
-    styles = getSampleStyleSheet()
-    
-    # Add custom styles
-    styles.add(ParagraphStyle(
-        name='Title',
-        parent=styles['Heading1'],
-        fontSize=16,
-        alignment=1,  # Center
-        spaceAfter=20
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='Subtitle',
-        parent=styles['Heading2'],
-        fontSize=12,
-        alignment=1,  # Center
-        spaceAfter=10
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='RightAlign',
-        parent=styles['Normal'],
-        alignment=2  # Right
-    ))
+    # Shared styles
+    styles = PDF_STYLES
     
     # Elements to be added to the PDF
     elements = []
     
     # Add title
-    elements.append(Paragraph(title, styles['Title']))
+    elements.append(Paragraph(title, styles['ReportTitle']))
     
     # Add period
     period_text = f"Période: du {start_date.strftime('%d/%m/%Y')} au {end_date.strftime('%d/%m/%Y')}"
@@ -76,13 +175,28 @@ def export_pdf(report_type, report_data, title, start_date, end_date):
         create_balance_sheet_pdf(elements, report_data, styles)
     elif report_type == 'income_statement':
         create_income_statement_pdf(elements, report_data, styles)
+    elif report_type == 'trial_balance':
+        create_trial_balance_pdf(elements, report_data, styles)
     elif report_type == 'journal':
-        create_journal_pdf(elements, report_data, styles)
+        create_journal_pdf(elements, report_data, styles, scale_progress(progress, 0, 0.5))
     elif report_type == 'ledger':
-        create_ledger_pdf(elements, report_data, styles)
+        create_ledger_pdf(elements, report_data, styles, scale_progress(progress, 0, 0.5))
     elif report_type == 'vat':
         create_vat_pdf(elements, report_data, styles)
     
+    # Report the layout of the pages as the second half of the progress
+    if progress and report_type in ['journal', 'ledger']:
+        layout_progress = scale_progress(progress, 0.5, 1)
+        flowable_count = len(elements)
+        laid_out = 0
+        
+        def after_flowable(flowable):
+            nonlocal laid_out
+            laid_out += 1
+            layout_progress(min(laid_out / flowable_count, 1))
+        
+        doc.afterFlowable = after_flowable
+    
     # Build the PDF
     doc.build(elements)
     
@@ -108,19 +222,7 @@ def create_balance_sheet_pdf(elements, balance_sheet, styles):
         
         data.append(["", "Total actif immobilisé", f"{balance_sheet['assets']['total_non_current']:,.2f}"])
         
-        table = Table(data, colWidths=[60, 300, 100])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 2, colors.black),
-        ]))
+        table = create_pdf_table(data, [60, 300, 100], ACCOUNTS_TABLE_STYLE)
         
         elements.append(table)
     else:
@@ -138,19 +240,7 @@ def create_balance_sheet_pdf(elements, balance_sheet, styles):
         
         data.append(["", "Total actif circulant", f"{balance_sheet['assets']['total_current']:,.2f}"])
         
-        table = Table(data, colWidths=[60, 300, 100])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 2, colors.black),
-        ]))
+        table = create_pdf_table(data, [60, 300, 100], ACCOUNTS_TABLE_STYLE)
         
         elements.append(table)
     else:
@@ -168,19 +258,7 @@ def create_balance_sheet_pdf(elements, balance_sheet, styles):
         
         data.append(["", "Total trésorerie", f"{balance_sheet['assets']['total_cash']:,.2f}"])
         
-        table = Table(data, colWidths=[60, 300, 100])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 2, colors.black),
-        ]))
+        table = create_pdf_table(data, [60, 300, 100], ACCOUNTS_TABLE_STYLE)
         
         elements.append(table)
     else:
@@ -191,16 +269,7 @@ def create_balance_sheet_pdf(elements, balance_sheet, styles):
     # Total assets
     data = [["TOTAL ACTIF", f"{balance_sheet['assets']['total']:,.2f}"]]
     
-    table = Table(data, colWidths=[360, 100])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BOX', (0, 0), (-1, -1), 2, colors.black),
-    ]))
+    table = create_pdf_table(data, [360, 100], TOTAL_TABLE_STYLE, header_rows=0)
     
     elements.append(table)
     elements.append(Spacer(1, 20))
@@ -219,19 +288,7 @@ def create_balance_sheet_pdf(elements, balance_sheet, styles):
         
         data.append(["", "Total capitaux propres", f"{balance_sheet['liabilities']['total_equity']:,.2f}"])
         
-        table = Table(data, colWidths=[60, 300, 100])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 2, colors.black),
-        ]))
+        table = create_pdf_table(data, [60, 300, 100], ACCOUNTS_TABLE_STYLE)
         
         elements.append(table)
     else:
@@ -249,19 +306,7 @@ def create_balance_sheet_pdf(elements, balance_sheet, styles):
         
         data.append(["", "Total passif non courant", f"{balance_sheet['liabilities']['total_non_current']:,.2f}"])
         
-        table = Table(data, colWidths=[60, 300, 100])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 2, colors.black),
-        ]))
+        table = create_pdf_table(data, [60, 300, 100], ACCOUNTS_TABLE_STYLE)
         
         elements.append(table)
     else:
@@ -279,19 +324,7 @@ def create_balance_sheet_pdf(elements, balance_sheet, styles):
         
         data.append(["", "Total passif courant", f"{balance_sheet['liabilities']['total_current']:,.2f}"])
         
-        table = Table(data, colWidths=[60, 300, 100])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 2, colors.black),
-        ]))
+        table = create_pdf_table(data, [60, 300, 100], ACCOUNTS_TABLE_STYLE)
         
         elements.append(table)
     else:
@@ -302,16 +335,7 @@ def create_balance_sheet_pdf(elements, balance_sheet, styles):
     # Total liabilities and equity
     data = [["TOTAL PASSIF", f"{balance_sheet['liabilities']['total']:,.2f}"]]
     
-    table = Table(data, colWidths=[360, 100])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BOX', (0, 0), (-1, -1), 2, colors.black),
-    ]))
+    table = create_pdf_table(data, [360, 100], TOTAL_TABLE_STYLE, header_rows=0)
     
     elements.append(table)
 
@@ -328,19 +352,7 @@ def create_income_statement_pdf(elements, income_statement, styles):
         
         data.append(["", "Total des produits", f"{income_statement['total_revenue']:,.2f}"])
         
-        table = Table(data, colWidths=[60, 300, 100])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 2, colors.black),
-        ]))
+        table = create_pdf_table(data, [60, 300, 100], ACCOUNTS_TABLE_STYLE)
         
         elements.append(table)
     else:
@@ -359,19 +371,7 @@ def create_income_statement_pdf(elements, income_statement, styles):
         
         data.append(["", "Total des charges", f"{income_statement['total_expense']:,.2f}"])
         
-        table = Table(data, colWidths=[60, 300, 100])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 2, colors.black),
-        ]))
+        table = create_pdf_table(data, [60, 300, 100], ACCOUNTS_TABLE_STYLE)
         
         elements.append(table)
     else:
@@ -385,73 +385,76 @@ def create_income_statement_pdf(elements, income_statement, styles):
     
     data = [["Résultat net", f"{income_statement['net_income']:,.2f}"]]
     
-    table = Table(data, colWidths=[360, 100])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BOX', (0, 0), (-1, -1), 2, colors.black),
-    ]))
+    table = create_pdf_table(data, [360, 100], TOTAL_TABLE_STYLE, header_rows=0)
     
     elements.append(table)
 
-def create_journal_pdf(elements, journal_data, styles):
+def create_trial_balance_pdf(elements, trial_balance, styles):
+    """Create trial balance section for PDF"""
+    elements.append(Paragraph("BALANCE", styles['Heading2']))
+    elements.append(Spacer(1, 10))
+    
+    if trial_balance['accounts']:
+        data = [["Code", "Compte", "Débit (MAD)", "Crédit (MAD)"]]
+        for account in trial_balance['accounts']:
+            data.append([account['code'], account['name'], f"{account['debit']:,.2f}", f"{account['credit']:,.2f}"])
+        
+        data.append(["", "Totaux", f"{trial_balance['total_debit']:,.2f}", f"{trial_balance['total_credit']:,.2f}"])
+        
+        table = create_pdf_table(data, [60, 240, 80, 80], TRIAL_BALANCE_TABLE_STYLE)
+        
+        elements.append(table)
+    else:
+        elements.append(Paragraph("Aucun compte mouvementé", styles['Normal']))
+
+def create_journal_pdf(elements, journal_data, styles, progress=None):
     """Create journal section for PDF"""
     elements.append(Paragraph("JOURNAL COMPTABLE", styles['Heading2']))
     elements.append(Spacer(1, 10))
     
-    if journal_data['entries']:
-        for entry in journal_data['entries']:
-            # Entry header
-            entry_header = f"Écriture #{entry.id} - {entry.date.strftime('%d/%m/%Y')} - Réf: {entry.reference or 'N/A'}"
-            elements.append(Paragraph(entry_header, styles['Heading3']))
-            
-            if entry.description:
-                elements.append(Paragraph(f"Description: {entry.description}", styles['Normal']))
-            
-            elements.append(Spacer(1, 5))
-            
-            # Entry lines
-            data = [["Compte", "Libellé", "Débit (MAD)", "Crédit (MAD)"]]
-            total_debit = 0
-            total_credit = 0
-            
-            for line in entry.lines:
-                data.append([
-                    f"{line.account.code} - {line.account.name}", 
-                    line.description or "", 
-                    f"{line.debit:,.2f}" if line.debit > 0 else "", 
-                    f"{line.credit:,.2f}" if line.credit > 0 else ""
-                ])
-                total_debit += line.debit
-                total_credit += line.credit
-            
-            data.append(["", "Totaux", f"{total_debit:,.2f}", f"{total_credit:,.2f}"])
-            
-            table = Table(data, colWidths=[150, 210, 80, 80])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-                ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('BOX', (0, 0), (-1, -1), 2, colors.black),
-            ]))
-            
-            elements.append(table)
-            elements.append(Spacer(1, 20))
-    else:
+    has_entries = False
+    
+    for entry, lines in iter_journal(journal_data['start_date'], journal_data['end_date']):
+        has_entries = True
+        
+        if progress:
+            progress(period_fraction(entry.date, journal_data['start_date'], journal_data['end_date']))
+        
+        # Entry header
+        entry_header = f"Écriture #{entry.entry_id} - {entry.date.strftime('%d/%m/%Y')} - Réf: {entry.reference or 'N/A'}"
+        elements.append(Paragraph(entry_header, styles['Heading3']))
+        
+        if entry.entry_description:
+            elements.append(Paragraph(f"Description: {entry.entry_description}", styles['Normal']))
+        
+        elements.append(Spacer(1, 5))
+        
+        # Entry lines
+        data = [["Compte", "Libellé", "Débit (MAD)", "Crédit (MAD)"]]
+        total_debit = 0
+        total_credit = 0
+        
+        for line in lines:
+            data.append([
+                f"{line.code} - {line.name}", 
+                line.description or "", 
+                f"{line.debit:,.2f}" if line.debit > 0 else "", 
+                f"{line.credit:,.2f}" if line.credit > 0 else ""
+            ])
+            total_debit += line.debit
+            total_credit += line.credit
+        
+        data.append(["", "Totaux", f"{total_debit:,.2f}", f"{total_credit:,.2f}"])
+        
+        table = create_pdf_table(data, [150, 210, 80, 80], JOURNAL_TABLE_STYLE)
+        
+        elements.append(table)
+        elements.append(Spacer(1, 20))
+    
+    if not has_entries:
         elements.append(Paragraph("Aucune écriture dans le journal", styles['Normal']))
 
-def create_ledger_pdf(elements, ledger_data, styles):
+def create_ledger_pdf(elements, ledger_data, styles, progress=None):
     """Create ledger section for PDF"""
     elements.append(Paragraph("GRAND LIVRE", styles['Heading2']))
     elements.append(Spacer(1, 10))
@@ -460,80 +463,36 @@ def create_ledger_pdf(elements, ledger_data, styles):
     end_date = ledger_data['end_date']
     
     if ledger_data['accounts']:
-        for account in ledger_data['accounts']:
+        ledger = iter_general_ledger(ledger_data['accounts'], start_date, end_date)
+        
+        for index, (account, opening_balance, entries) in enumerate(ledger):
+            if progress:
+                progress(index / len(ledger_data['accounts']))
+            
             # Account header
             account_header = f"{account.code} - {account.name}"
             elements.append(Paragraph(account_header, styles['Heading3']))
             elements.append(Spacer(1, 5))
             
-            # Get account entries
-            entries_query = (
-                "SELECT je.date, je.reference, jel.description, "
-                "jel.debit, jel.credit "
-                "FROM journal_entry_line jel "
-                "JOIN journal_entry je ON jel.journal_entry_id = je.id "
-                "WHERE jel.account_id = ? "
-                "AND je.date BETWEEN ? AND ? "
-                "ORDER BY je.date, je.id"
-            )
-            
-            # This is pseudo-code as we can't execute SQL directly here
-            # In a real implementation, we'd use SQLAlchemy or direct database access
+            data = [["Date", "Référence", "Description", "Débit (MAD)", "Crédit (MAD)", "Solde (MAD)"]]
             
-            # For demonstration, let's create sample data
-            from datetime import timedelta
-            import random
+            if opening_balance:
+                data.append(["", "", "Solde initial", "", "", f"{opening_balance:,.2f}"])
             
-            # Simulate entries
-            entries = []
-            date = start_date
-            balance = 0
+            header_rows = len(data)
             
-            while date <= end_date:
-                if random.random() > 0.7:  # 30% chance of having an entry on this date
-                    debit = random.randint(0, 10000) if random.random() > 0.5 else 0
-                    credit = random.randint(0, 10000) if debit == 0 else 0
-                    
-                    if account.account_type in ['Asset', 'Expense']:
-                        balance += debit - credit
-                    else:
-                        balance += credit - debit
-                    
-                    entries.append({
-                        'date': date,
-                        'reference': f'REF-{random.randint(1000, 9999)}',
-                        'description': f'Sample transaction on {date}',
-                        'debit': debit,
-                        'credit': credit,
-                        'balance': balance
-                    })
-                
-                date += timedelta(days=random.randint(1, 10))
+            for entry in entries:
+                data.append([
+                    entry['date'].strftime('%d/%m/%Y'),
+                    entry['reference'] or "",
+                    entry['description'] or "",
+                    f"{entry['debit']:,.2f}" if entry['debit'] > 0 else "",
+                    f"{entry['credit']:,.2f}" if entry['credit'] > 0 else "",
+                    f"{entry['balance']:,.2f}"
+                ])
             
-            if entries:
-                data = [["Date", "Référence", "Description", "Débit (MAD)", "Crédit (MAD)", "Solde (MAD)"]]
-                
-                for entry in entries:
-                    data.append([
-                        entry['date'].strftime('%d/%m/%Y'),
-                        entry['reference'],
-                        entry['description'],
-                        f"{entry['debit']:,.2f}" if entry['debit'] > 0 else "",
-                        f"{entry['credit']:,.2f}" if entry['credit'] > 0 else "",
-                        f"{entry['balance']:,.2f}"
-                    ])
-                
-                table = Table(data, colWidths=[70, 80, 150, 70, 70, 80])
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                    ('ALIGN', (3, 1), (5, -1), 'RIGHT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('BOX', (0, 0), (-1, -1), 2, colors.black),
-                ]))
+            if len(data) > header_rows:
+                table = create_pdf_table(data, [70, 80, 150, 70, 70, 80], LEDGER_TABLE_STYLE)
                 
                 elements.append(table)
             else:
@@ -567,19 +526,7 @@ def create_vat_pdf(elements, vat_data, styles):
         
         data.append(["", "", "", "", "Total TVA collectée", f"{vat_data['vat_collected']:,.2f}"])
         
-        table = Table(data, colWidths=[70, 70, 140, 80, 70, 80])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (3, 1), (5, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (5, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 2, colors.black),
-        ]))
+        table = create_pdf_table(data, [70, 70, 140, 80, 70, 80], VAT_TABLE_STYLE)
         
         elements.append(table)
     else:
@@ -606,19 +553,7 @@ def create_vat_pdf(elements, vat_data, styles):
         
         data.append(["", "", "", "", "Total TVA déductible", f"{vat_data['vat_deductible']:,.2f}"])
         
-        table = Table(data, colWidths=[70, 70, 140, 80, 70, 80])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (3, 1), (5, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (5, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 2, colors.black),
-        ]))
+        table = create_pdf_table(data, [70, 70, 140, 80, 70, 80], VAT_TABLE_STYLE)
         
         elements.append(table)
     else:
@@ -636,18 +571,11 @@ def create_vat_pdf(elements, vat_data, styles):
         ["TVA à payer", f"{vat_data['vat_due']:,.2f}"]
     ]
     
-    table = Table(data, colWidths=[200, 100])
-    table.setStyle(TableStyle([
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, -1), (1, -1), 'Helvetica-Bold'),
-        ('LINEBELOW', (0, 0), (1, 0), 1, colors.black),
-        ('LINEBELOW', (0, 1), (1, 1), 1, colors.black),
-        ('LINEBELOW', (0, -1), (1, -1), 2, colors.black),
-    ]))
+    table = create_pdf_table(data, [200, 100], VAT_SUMMARY_TABLE_STYLE, header_rows=0)
     
     elements.append(table)
 
-def export_excel(report_type, report_data, title, start_date, end_date):
+def export_excel(report_type, report_data, title, start_date, end_date, progress=None):
     """
     Generate an Excel report based on the report type and data.
     
@@ -657,6 +585,8 @@ def export_excel(report_type, report_data, title, start_date, end_date):
         title (str): Title of the report
         start_date (date): Start date of the report period
         end_date (date): End date of the report period
+        progress (callable, optional): Called with the completed fraction (0 to 1)
+            while a journal or ledger is generated
         
     Returns:
         bytes: Excel data
@@ -664,17 +594,23 @@ def export_excel(report_type, report_data, title, start_date, end_date):
     buffer = io.BytesIO()
     
     # Create a pandas Excel writer
-    writer = pd.ExcelWriter(buffer, engine='xlsxwriter')
+    # (streamed reports are written row by row and can flush rows to disk)
+    if report_type in STREAMED_EXCEL_REPORTS:
+        writer = pd.ExcelWriter(buffer, engine='xlsxwriter', engine_kwargs={'options': {'constant_memory': True}})
+    else:
+        writer = pd.ExcelWriter(buffer, engine='xlsxwriter')
     
     # Create report based on type
     if report_type == 'balance_sheet':
         create_balance_sheet_excel(writer, report_data, title, end_date)
     elif report_type == 'income_statement':
         create_income_statement_excel(writer, report_data, title, start_date, end_date)
+    elif report_type == 'trial_balance':
+        create_trial_balance_excel(writer, report_data, title, end_date)
     elif report_type == 'journal':
-        create_journal_excel(writer, report_data, title, start_date, end_date)
+        create_journal_excel(writer, report_data, title, start_date, end_date, progress)
     elif report_type == 'ledger':
-        create_ledger_excel(writer, report_data, title, start_date, end_date)
+        create_ledger_excel(writer, report_data, title, start_date, end_date, progress)
     elif report_type == 'vat':
         create_vat_excel(writer, report_data, title, start_date, end_date)
     
@@ -1027,15 +963,31 @@ def create_income_statement_excel(writer, income_statement, title, start_date, e
     for worksheet in writer.sheets.values():
         worksheet.autofit()
 
-def create_journal_excel(writer, journal_data, title, start_date, end_date):
-    """Create journal worksheet in Excel"""
-    # Period string
-    period = f"Du {start_date.strftime('%d/%m/%Y')} au {end_date.strftime('%d/%m/%Y')}"
+def create_trial_balance_excel(writer, trial_balance, title, date):
+    """Create trial balance worksheet in Excel"""
+    period = f"Au {date.strftime('%d/%m/%Y')}"
     
-    # Create a workbook and add the journal
-    sheet_name = "Journal"
+    # Accounts
+    accounts = []
+    for account in trial_balance['accounts']:
+        accounts.append({
+            'Code': account['code'],
+            'Compte': account['name'],
+            'Débit (MAD)': account['debit'],
+            'Crédit (MAD)': account['credit']
+        })
     
-    # Determine starting rows for each section
+    df_accounts = pd.DataFrame(accounts)
+    
+    # Add total row
+    totals = pd.DataFrame([{
+        'Code': '',
+        'Compte': 'Totaux',
+        'Débit (MAD)': trial_balance['total_debit'],
+        'Crédit (MAD)': trial_balance['total_credit']
+    }])
+    
+    sheet_name = "Balance"
     row = 0
     
     # Write title and period
@@ -1047,142 +999,145 @@ def create_journal_excel(writer, journal_data, title, start_date, end_date):
     period_df.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False, header=False)
     row += 2
     
-    if journal_data['entries']:
-        for entry in journal_data['entries']:
-            # Entry header
-            entry_header = f"Écriture #{entry.id} - {entry.date.strftime('%d/%m/%Y')} - Réf: {entry.reference or 'N/A'}"
-            header_df = pd.DataFrame([{'A': entry_header}])
-            header_df.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False, header=False)
-            row += 1
-            
-            if entry.description:
-                desc_df = pd.DataFrame([{'A': f"Description: {entry.description}"}])
-                desc_df.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False, header=False)
-                row += 1
-            
-            # Entry lines
-            lines_data = []
-            total_debit = 0
-            total_credit = 0
-            
-            for line in entry.lines:
-                lines_data.append({
-                    'Compte': f"{line.account.code} - {line.account.name}",
-                    'Libellé': line.description or "",
-                    'Débit (MAD)': line.debit if line.debit > 0 else None,
-                    'Crédit (MAD)': line.credit if line.credit > 0 else None
-                })
-                total_debit += line.debit
-                total_credit += line.credit
-            
-            df_lines = pd.DataFrame(lines_data)
-            
-            if not df_lines.empty:
-                df_lines.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False)
-                row += len(df_lines) + 1
-                
-                # Add totals
-                totals_df = pd.DataFrame([{
-                    'Compte': '',
-                    'Libellé': 'Totaux',
-                    'Débit (MAD)': total_debit,
-                    'Crédit (MAD)': total_credit
-                }])
-                
-                totals_df.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False, header=False)
-                row += 2
-            else:
-                empty_df = pd.DataFrame([{'A': 'Aucune ligne dans cette écriture'}])
-                empty_df.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False, header=False)
-                row += 2
+    if not df_accounts.empty:
+        df_accounts.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False)
+        row += len(df_accounts) + 1
+        totals.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False, header=False)
     else:
-        empty_df = pd.DataFrame([{'A': 'Aucune écriture dans le journal'}])
+        empty_df = pd.DataFrame([{'A': 'Aucun compte mouvementé'}])
         empty_df.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False, header=False)
     
     # Auto-adjust columns
     for worksheet in writer.sheets.values():
         worksheet.autofit()
 
-def create_ledger_excel(writer, ledger_data, title, start_date, end_date):
+def create_journal_excel(writer, journal_data, title, start_date, end_date, progress=None):
+    """Create journal worksheet in Excel"""
+    # Period string
+    period = f"Du {start_date.strftime('%d/%m/%Y')} au {end_date.strftime('%d/%m/%Y')}"
+    
+    # Rows are written directly to the workbook, in order, so that the
+    # writer can flush them to disk (constant memory mode)
+    workbook = writer.book
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+    amount_format = workbook.add_format({'num_format': '#,##0.00'})
+    
+    worksheet = workbook.add_worksheet("Journal")
+    worksheet.set_column(0, 0, 40)
+    worksheet.set_column(1, 1, 40)
+    worksheet.set_column(2, 3, 15, amount_format)
+    
+    # Write title and period
+    worksheet.write(0, 0, title)
+    worksheet.write(1, 0, period)
+    row = 3
+    
+    for entry, lines in iter_journal(journal_data['start_date'], journal_data['end_date']):
+        if progress:
+            progress(period_fraction(entry.date, journal_data['start_date'], journal_data['end_date']))
+        
+        # Entry header
+        worksheet.write(row, 0, f"Écriture #{entry.entry_id} - {entry.date.strftime('%d/%m/%Y')} - Réf: {entry.reference or 'N/A'}")
+        row += 1
+        
+        if entry.entry_description:
+            worksheet.write(row, 0, f"Description: {entry.entry_description}")
+            row += 1
+        
+        if entry.line_id is None:
+            worksheet.write(row, 0, 'Aucune ligne dans cette écriture')
+            row += 2
+            continue
+        
+        # Entry lines
+        worksheet.write_row(row, 0, ['Compte', 'Libellé', 'Débit (MAD)', 'Crédit (MAD)'], header_format)
+        row += 1
+        total_debit = 0
+        total_credit = 0
+        
+        for line in lines:
+            worksheet.write_row(row, 0, [
+                f"{line.code} - {line.name}",
+                line.description or "",
+                line.debit if line.debit > 0 else None,
+                line.credit if line.credit > 0 else None
+            ])
+            row += 1
+            total_debit += line.debit
+            total_credit += line.credit
+        
+        # Add totals
+        worksheet.write_row(row, 0, ['', 'Totaux', total_debit, total_credit])
+        row += 2
+    
+    if row == 3:
+        worksheet.write(row, 0, 'Aucune écriture dans le journal')
+
+def create_ledger_excel(writer, ledger_data, title, start_date, end_date, progress=None):
     """Create ledger worksheet in Excel"""
     # Period string
     period = f"Du {start_date.strftime('%d/%m/%Y')} au {end_date.strftime('%d/%m/%Y')}"
     
+    # Rows are written directly to the workbook, in order, so that the
+    # writer can flush them to disk (constant memory mode)
+    workbook = writer.book
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+    amount_format = workbook.add_format({'num_format': '#,##0.00'})
+    
     # Create a workbook and add the ledger with one worksheet per account
     if ledger_data['accounts']:
-        for account in ledger_data['accounts']:
+        ledger = iter_general_ledger(ledger_data['accounts'], start_date, end_date)
+        
+        for index, (account, opening_balance, entries) in enumerate(ledger):
+            if progress:
+                progress(index / len(ledger_data['accounts']))
+            
             sheet_name = f"{account.code}"
             
             # Limit sheet name length (Excel has a 31-character limit)
             if len(sheet_name) > 31:
                 sheet_name = sheet_name[:31]
             
-            # Determine starting rows for each section
-            row = 0
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.set_column(0, 1, 12)
+            worksheet.set_column(2, 2, 40)
+            worksheet.set_column(3, 5, 15, amount_format)
             
             # Write title and period
-            title_df = pd.DataFrame([{'A': f"{title} - {account.code} {account.name}"}])
-            title_df.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False, header=False)
-            row += 1
+            worksheet.write(0, 0, f"{title} - {account.code} {account.name}")
+            worksheet.write(1, 0, period)
             
-            period_df = pd.DataFrame([{'A': period}])
-            period_df.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False, header=False)
-            row += 2
+            row = 3
+            worksheet.write_row(row, 0, ['Date', 'Référence', 'Description', 'Débit (MAD)', 'Crédit (MAD)', 'Solde (MAD)'], header_format)
+            row += 1
             
-            # Generate sample entries for demonstration
-            # In a real implementation, we'd query the database for actual entries
-            from datetime import timedelta
-            import random
+            if opening_balance:
+                worksheet.write_row(row, 0, ['', '', 'Solde initial', None, None, opening_balance])
+                row += 1
             
-            # Simulate entries
-            entries = []
-            date = start_date
-            balance = 0
+            first_row = row
             
-            while date <= end_date:
-                if random.random() > 0.7:  # 30% chance of having an entry on this date
-                    debit = random.randint(0, 10000) if random.random() > 0.5 else 0
-                    credit = random.randint(0, 10000) if debit == 0 else 0
-                    
-                    if account.account_type in ['Asset', 'Expense']:
-                        balance += debit - credit
-                    else:
-                        balance += credit - debit
-                    
-                    entries.append({
-                        'Date': date.strftime('%d/%m/%Y'),
-                        'Référence': f'REF-{random.randint(1000, 9999)}',
-                        'Description': f'Sample transaction on {date}',
-                        'Débit (MAD)': debit if debit > 0 else None,
-                        'Crédit (MAD)': credit if credit > 0 else None,
-                        'Solde (MAD)': balance
-                    })
-                
-                date += timedelta(days=random.randint(1, 10))
+            for entry in entries:
+                worksheet.write_row(row, 0, [
+                    entry['date'].strftime('%d/%m/%Y'),
+                    entry['reference'] or '',
+                    entry['description'] or '',
+                    entry['debit'] if entry['debit'] > 0 else None,
+                    entry['credit'] if entry['credit'] > 0 else None,
+                    entry['balance']
+                ])
+                row += 1
             
-            if entries:
-                df_entries = pd.DataFrame(entries)
-                df_entries.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False)
-            else:
-                empty_df = pd.DataFrame([{'A': 'Aucune écriture pour ce compte dans la période'}])
-                empty_df.to_excel(writer, sheet_name=sheet_name, startrow=row, index=False, header=False)
+            if row == first_row:
+                worksheet.write(row, 0, 'Aucune écriture pour ce compte dans la période')
     else:
         # Create a single worksheet if no accounts
-        sheet_name = "Grand Livre"
+        worksheet = workbook.add_worksheet("Grand Livre")
         
         # Write title and period
-        title_df = pd.DataFrame([{'A': title}])
-        title_df.to_excel(writer, sheet_name=sheet_name, startrow=0, index=False, header=False)
-        
-        period_df = pd.DataFrame([{'A': period}])
-        period_df.to_excel(writer, sheet_name=sheet_name, startrow=1, index=False, header=False)
-        
-        empty_df = pd.DataFrame([{'A': 'Aucun compte dans le grand livre'}])
-        empty_df.to_excel(writer, sheet_name=sheet_name, startrow=3, index=False, header=False)
-    
-    # Auto-adjust columns
-    for worksheet in writer.sheets.values():
-        worksheet.autofit()
+        worksheet.write(0, 0, title)
+        worksheet.write(1, 0, period)
+        worksheet.write(3, 0, 'Aucun compte dans le grand livre')
 
 def create_vat_excel(writer, vat_data, title, start_date, end_date):
     """Create VAT report worksheet in Excel"""
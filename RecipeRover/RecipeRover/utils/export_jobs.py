@@ -0,0 +1,233 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app import app, db
+from models import Account, ExportJob
+from utils.export import export_excel, export_pdf
+from utils.report_generator import generate_balance_sheet, generate_income_statement, generate_trial_balance
+from utils.tax_calculator import calculate_vat
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Exports run outside of the requests, a few at a time
+export_executor = ThreadPoolExecutor(max_workers=app.config['EXPORT_WORKERS'], thread_name_prefix='exports')
+
+# Shortest time between two progress updates of a job (in seconds)
+PROGRESS_INTERVAL = 1
+
+# Title of each exported report
+EXPORT_TITLES = {
+    'balance_sheet': 'Bilan',
+    'income_statement': 'Compte de Produits et Charges (CPC)',
+    'trial_balance': 'Balance de vérification',
+    'journal': 'Journal Comptable',
+    'ledger': 'Grand Livre',
+    'vat': 'État de TVA',
+    'closing_pack': 'Dossier de clôture'
+}
+
+# File extension and content type of each export format
+EXPORT_FORMATS = {
+    'pdf': ('pdf', 'application/pdf'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'zip': ('zip', 'application/zip')
+}
+
+def build_report_data(report_type, start_date, end_date):
+    """
+    Get the data of a report to export.
+    
+    Journals and ledgers are only described by their period: their lines are
+    streamed while the file is written.
+    
+    Args:
+        report_type (str): Type of report ('balance_sheet', 'income_statement', etc.)
+        start_date (date): Start date of the report period
+        end_date (date): End date of the report period
+        
+    Returns:
+        dict: Data for the report
+    """
+    if report_type == 'balance_sheet':
+        return generate_balance_sheet(end_date)
+    elif report_type == 'income_statement':
+        return generate_income_statement(start_date, end_date)
+    elif report_type == 'trial_balance':
+        return generate_trial_balance(end_date)
+    elif report_type == 'journal':
+        return {
+            'start_date': start_date,
+            'end_date': end_date
+        }
+    elif report_type == 'ledger':
+        return {
+            'accounts': Account.query.order_by(Account.code).all(),
+            'start_date': start_date,
+            'end_date': end_date
+        }
+    elif report_type == 'vat':
+        return calculate_vat(start_date.year, start_date.month, end_date=end_date)
+    
+    raise ValueError(f"Unknown report type: {report_type}")
+
+def render_report(report_type, format_type, start_date, end_date, report_data=None, progress=None):
+    """
+    Generate the file of a report.
+    
+    Args:
+        report_type (str): Type of report ('balance_sheet', 'income_statement', etc.)
+        format_type (str): 'pdf' or 'excel'
+        start_date (date): Start date of the report period
+        end_date (date): End date of the report period
+        report_data (dict, optional): Data for the report, read from the database if not given
+        progress (callable, optional): Called with the completed fraction (0 to 1)
+        
+    Returns:
+        bytes: File data
+    """
+    if report_data is None:
+        report_data = build_report_data(report_type, start_date, end_date)
+    
+    export = export_pdf if format_type == 'pdf' else export_excel
+    return export(report_type, report_data, EXPORT_TITLES[report_type], start_date, end_date, progress)
+
+def get_export_path(job):
+    """Return the path of the file generated by an export job"""
+    return os.path.join(app.config['EXPORT_FOLDER'], job.file_name)
+
+def get_report_file_name(report_type, format_type, start_date, end_date):
+    """Return the file name under which a report is downloaded"""
+    extension = EXPORT_FORMATS[format_type][0]
+    return f"{report_type}_{start_date}_{end_date}.{extension}"
+
+def get_export_file_name(job):
+    """Return the file name under which an export is downloaded"""
+    return get_report_file_name(job.report_type, job.format_type, job.start_date, job.end_date)
+
+class ProgressReporter:
+    """
+    Save the progress of an export job, at most once every PROGRESS_INTERVAL.
+    
+    Progress is written through its own connection so that it does not end
+    the transaction streaming the report lines. If the database refuses the
+    write (an SQLite database that is not in write-ahead logging mode blocks
+    writers while the lines are being read), progress is no longer saved
+    until the job ends.
+    """
+    
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.progress = 0
+        self.saved_at = 0
+        self.enabled = True
+    
+    def update(self, fraction):
+        """Record the completed fraction (0 to 1) of the export"""
+        progress = min(int(fraction * 100), 99)
+        
+        if not self.enabled or progress <= self.progress or time.monotonic() - self.saved_at < PROGRESS_INTERVAL:
+            return
+        
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(
+                    update(ExportJob).where(ExportJob.id == self.job_id).values(progress=progress)
+                )
+        except OperationalError:
+            logger.warning("Could not save the progress of export job %s", self.job_id)
+            self.enabled = False
+            return
+        
+        self.progress = progress
+        self.saved_at = time.monotonic()
+
+def write_report_file(job, path, progress):
+    """Write the report of an export job to a file"""
+    content = render_report(job.report_type, job.format_type, job.start_date, job.end_date, progress=progress)
+    
+    with open(path, 'wb') as export_file:
+        export_file.write(content)
+
+def run_export_job(job_id, write_file=write_report_file):
+    """
+    Generate the file of an export job in a background worker.
+    
+    Args:
+        job_id (int): The job to run
+        write_file (callable): Called with the job, the path of its file and
+            a progress callback to write the file
+    """
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        job.status = 'running'
+        db.session.commit()
+        
+        try:
+            # Write the file before marking the job as done
+            file_name = f"export_{job_id}.{EXPORT_FORMATS[job.format_type][0]}"
+            os.makedirs(app.config['EXPORT_FOLDER'], exist_ok=True)
+            write_file(job, os.path.join(app.config['EXPORT_FOLDER'], file_name), ProgressReporter(job_id).update)
+            
+            # End the transaction used to read the report
+            db.session.rollback()
+            job = db.session.get(ExportJob, job_id)
+            job.file_name = file_name
+            job.status = 'done'
+            job.progress = 100
+        except Exception as e:
+            logger.exception("Export job %s failed", job_id)
+            db.session.rollback()
+            job = db.session.get(ExportJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)[:255]
+        
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+def purge_expired_jobs():
+    """Delete the export jobs older than EXPORT_RETENTION_HOURS and their files"""
+    expiry = datetime.utcnow() - timedelta(hours=app.config['EXPORT_RETENTION_HOURS'])
+    expired = ExportJob.query.filter(ExportJob.created_at < expiry).all()
+    
+    for job in expired:
+        if job.file_name:
+            try:
+                os.remove(get_export_path(job))
+            except FileNotFoundError:
+                pass
+        db.session.delete(job)
+
+def create_export_job(user_id, report_type, format_type, start_date, end_date, write_file=write_report_file):
+    """
+    Queue the export of a report.
+    
+    Args:
+        user_id (int): The user requesting the export
+        report_type (str): Type of report ('balance_sheet', 'income_statement', etc.)
+        format_type (str): 'pdf' or 'excel'
+        start_date (date): Start date of the report period
+        end_date (date): End date of the report period
+        write_file (callable): Writes the file of the job (see run_export_job)
+        
+    Returns:
+        ExportJob: The queued job
+    """
+    purge_expired_jobs()
+    
+    job = ExportJob(
+        user_id=user_id,
+        report_type=report_type,
+        format_type=format_type,
+        start_date=start_date,
+        end_date=end_date
+    )
+    db.session.add(job)
+    db.session.commit()
+    
+    export_executor.submit(run_export_job, job.id, write_file)
+    
+    return job
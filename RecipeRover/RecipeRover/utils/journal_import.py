@@ -0,0 +1,379 @@
+import time
+from decimal import Decimal
+import click
+import numpy as np
+import pandas as pd
+from app import app, db
+from models import JournalEntry, JournalEntryLine, User
+from utils.chart_of_accounts import chart_cache
+from utils.ledger import apply_to_daily_balances, bump_ledger_version, get_closed_until
+
+# Layouts of the import files: separators, date format, column of the file
+# for each field, and the columns whose consecutive equal values make up one
+# journal entry
+IMPORT_FORMATS = {
+    # date,reference,description,account,label,debit,credit (one line per row,
+    # the rows of an entry share its reference)
+    'csv': {
+        'separators': [','],
+        'date_format': '%Y-%m-%d',
+        'columns': {
+            'date': 'date',
+            'reference': 'reference',
+            'description': 'description',
+            'account': 'account',
+            'label': 'label',
+            'debit': 'debit',
+            'credit': 'credit'
+        },
+        'entry_columns': ['date', 'reference']
+    },
+    # Fichier des écritures comptables (tab or pipe separated)
+    'fec': {
+        'separators': ['\t', '|'],
+        'date_format': '%Y%m%d',
+        'columns': {
+            'JournalCode': 'journal',
+            'EcritureNum': 'reference',
+            'EcritureDate': 'date',
+            'CompteNum': 'account',
+            'EcritureLib': 'label',
+            'Debit': 'debit',
+            'Credit': 'credit'
+        },
+        'entry_columns': ['journal', 'reference']
+    }
+}
+
+# Amounts: optional sign, at most 15 digits of units, and decimals after a
+# decimal point or comma
+AMOUNT_PATTERN = r'^(?P<sign>[+-]?)(?P<units>\d{0,15})(?:[.,](?P<decimals>\d*))?$'
+
+# Longest texts accepted by the journal tables
+REFERENCE_LENGTH = JournalEntry.reference.type.length
+DESCRIPTION_LENGTH = JournalEntryLine.description.type.length
+
+def read_separator(path, format_type, encoding):
+    """
+    Find the column separator of an import file from its header line.
+    
+    Raises:
+        ValueError: If a column of the layout is missing from the header
+    """
+    layout = IMPORT_FORMATS[format_type]
+    
+    with open(path, encoding=encoding) as import_file:
+        header = import_file.readline().rstrip('\r\n')
+    
+    separator = max(layout['separators'], key=header.count)
+    missing = [column for column in layout['columns'] if column not in header.split(separator)]
+    if missing:
+        raise ValueError(f"Colonnes manquantes dans le fichier : {', '.join(missing)}")
+    
+    return separator
+
+def iter_import_chunks(path, format_type, encoding, chunk_size):
+    """
+    Read an import file in chunks of whole journal entries.
+    
+    The rows of an entry must follow each other in the file. The last entry
+    of a chunk is held back until the next chunk, in case it continues there.
+    
+    Args:
+        path (str): Path of the file
+        format_type (str): 'csv' or 'fec'
+        encoding (str): Encoding of the file
+        chunk_size (int): Number of rows to read at a time
+    
+    Yields:
+        DataFrame: Rows of the chunk with the fields of the layout as text,
+            their row number in the file, and the number of their entry
+    """
+    layout = IMPORT_FORMATS[format_type]
+    separator = read_separator(path, format_type, encoding)
+    reader = pd.read_csv(path, sep=separator, encoding=encoding, dtype=str, keep_default_na=False,
+                         usecols=list(layout['columns']), chunksize=chunk_size)
+    
+    pending = None
+    with reader:
+        for chunk in reader:
+            if chunk.empty:
+                continue
+            
+            chunk = chunk.rename(columns=layout['columns'])
+            chunk['row'] = chunk.index + 2
+            
+            if pending is not None:
+                chunk = pd.concat([pending, chunk])
+            
+            # A new entry starts on each change of the entry columns
+            keys = chunk[layout['entry_columns']]
+            chunk['entry'] = keys.ne(keys.shift()).any(axis=1).cumsum()
+            
+            last_entry = chunk['entry'] == chunk['entry'].iloc[-1]
+            pending = chunk[last_entry]
+            
+            if not last_entry.all():
+                yield chunk[~last_entry]
+    
+    if pending is not None:
+        yield pending
+
+def parse_amounts(values):
+    """
+    Parse amounts written with a decimal point or comma to integer centimes.
+    
+    The text of the amounts is split into units and decimals, so amounts never
+    go through floating point. Empty amounts are zero.
+    
+    Args:
+        values (Series): Amounts as text
+    
+    Returns:
+        tuple: (nullable integer Series of centimes, missing for invalid
+            amounts and amounts with more than two decimals, boolean Series of
+            the amounts with more than two decimals other than trailing zeros)
+    """
+    values = values.str.strip()
+    parts = values.str.extract(AMOUNT_PATTERN)
+    units = parts['units'].fillna('')
+    decimals = parts['decimals'].fillna('').str.rstrip('0')
+    
+    valid = parts['units'].notna() & ((units + decimals != '') | (values == ''))
+    extra_decimals = valid & (decimals.str.len() > 2)
+    valid &= ~extra_decimals
+    
+    centimes = units.where(valid & (units != ''), '0').astype('int64') * 100 + \
+        decimals.str.ljust(2, '0').where(valid, '0').astype('int64')
+    centimes = centimes.where(parts['sign'] != '-', -centimes)
+    
+    return centimes.astype('Int64').where(valid), extra_decimals
+
+def validate_chunk(chunk, format_type, account_ids, closed_until):
+    """
+    Check the rows of a chunk, one column at a time.
+    
+    An entry is rejected with all of its rows if one of them is invalid, if
+    its rows have different dates or if its debits and credits differ.
+    
+    Args:
+        chunk (DataFrame): Rows from iter_import_chunks
+        format_type (str): 'csv' or 'fec'
+        account_ids (dict): Account ID of each account code
+        closed_until (date): End of the latest closed period, or None
+    
+    Returns:
+        tuple: (accepted rows with parsed date, account_id, debit and credit
+            in centimes, rejected rows with the reason)
+    """
+    layout = IMPORT_FORMATS[format_type]
+    debit, debit_extra_decimals = parse_amounts(chunk['debit'])
+    credit, credit_extra_decimals = parse_amounts(chunk['credit'])
+    
+    chunk = chunk.assign(
+        date=pd.to_datetime(chunk['date'].str.strip(), format=layout['date_format'], errors='coerce'),
+        account_id=chunk['account'].str.strip().map(account_ids),
+        debit=debit,
+        credit=credit
+    )
+    if 'description' not in chunk:
+        chunk['description'] = chunk['label']
+    
+    # Reason of the first failed check of each row. Entries are made of
+    # consecutive rows with the same reference, so rows without one could
+    # merge several entries
+    checks = [
+        (chunk['date'].isna(), 'Date invalide'),
+        (chunk['reference'].str.strip() == '', 'Référence manquante'),
+        (chunk['account_id'].isna(), 'Compte inconnu'),
+        (debit_extra_decimals | credit_extra_decimals, 'Plus de deux décimales'),
+        (chunk['debit'].isna() | chunk['credit'].isna(), 'Montant invalide'),
+        ((chunk['debit'] < 0) | (chunk['credit'] < 0), 'Montant négatif'),
+        (chunk['reference'].str.len() > REFERENCE_LENGTH, 'Référence trop longue'),
+        ((chunk['label'].str.len() > DESCRIPTION_LENGTH) |
+         (chunk['description'].str.len() > DESCRIPTION_LENGTH), 'Libellé trop long')
+    ]
+    if closed_until:
+        checks.append((chunk['date'] <= pd.Timestamp(closed_until), 'Période clôturée'))
+    
+    # Then the checks of whole entries
+    entries = chunk.groupby('entry')
+    checks += [
+        (entries['date'].transform('nunique') > 1, 'Dates différentes dans l\'écriture'),
+        (entries['debit'].transform('sum') != entries['credit'].transform('sum'), 'Écriture déséquilibrée')
+    ]
+    
+    reason = pd.Series(
+        np.select([condition.to_numpy(dtype=bool, na_value=False) for condition, message in checks],
+                  [message for condition, message in checks], default=''),
+        index=chunk.index
+    )
+    
+    rejected_entry = (reason != '').groupby(chunk['entry']).transform('any')
+    reason = reason.mask(rejected_entry & (reason == ''), 'Autre ligne de l\'écriture rejetée')
+    
+    rejected = chunk.loc[rejected_entry, ['row', 'reference', 'account']].assign(reason=reason[rejected_entry])
+    
+    return chunk[~rejected_entry], rejected
+
+def insert_chunk(rows, user_id):
+    """
+    Insert the accepted rows of a chunk with one bulk INSERT per table and add
+    them to the daily balances.
+    
+    Returns:
+        int: Number of journal entries inserted
+    """
+    if rows.empty:
+        return 0
+    
+    rows = rows.assign(
+        date=rows['date'].dt.date,
+        debit=rows['debit'].astype('int64'),
+        credit=rows['credit'].astype('int64')
+    )
+    
+    # The first row of each entry holds its header
+    headers = rows.drop_duplicates('entry')
+    
+    # Core inserts on the tables skip the per-row work of ORM bulk inserts
+    entry_table = JournalEntry.__table__
+    entry_ids = db.session.scalars(
+        entry_table.insert().returning(entry_table.c.id, sort_by_parameter_order=True),
+        [
+            {
+                'date': entry_date,
+                'reference': reference,
+                'description': description or None,
+                'created_by_id': user_id
+            }
+            for entry_date, reference, description in zip(headers['date'], headers['reference'], headers['description'])
+        ]
+    ).all()
+    
+    # Lines are inserted with their entry date, which the ORM would copy on flush
+    journal_entry_ids = rows['entry'].map(dict(zip(headers['entry'], entry_ids)))
+    db.session.execute(
+        JournalEntryLine.__table__.insert(),
+        [
+            {
+                'journal_entry_id': journal_entry_id,
+                'account_id': account_id,
+                'debit': Decimal(debit).scaleb(-2),
+                'credit': Decimal(credit).scaleb(-2),
+                'description': label or None,
+                'date': line_date
+            }
+            for journal_entry_id, account_id, debit, credit, label, line_date in zip(
+                journal_entry_ids.tolist(), rows['account_id'].astype('int64').tolist(),
+                rows['debit'].tolist(), rows['credit'].tolist(), rows['label'], rows['date']
+            )
+        ]
+    )
+    
+    totals = rows.groupby(['account_id', 'date'], as_index=False)[['debit', 'credit']].sum()
+    apply_to_daily_balances([
+        {
+            'account_id': int(account_id),
+            'date': balance_date,
+            'debit': Decimal(int(debit)).scaleb(-2),
+            'credit': Decimal(int(credit)).scaleb(-2)
+        }
+        for account_id, balance_date, debit, credit in totals.itertuples(index=False)
+    ])
+    
+    return len(entry_ids)
+
+def import_journal(path, format_type, user_id, encoding='utf-8-sig', chunk_size=None, progress=None):
+    """
+    Import the journal entries of a CSV or FEC file.
+    
+    Each chunk is committed on its own, so the entries of the previous chunks
+    stay imported if a later one fails. Invalid entries are skipped and
+    reported with the reason of each of their rows.
+    
+    Args:
+        path (str): Path of the file
+        format_type (str): 'csv' or 'fec'
+        user_id (int): The user recorded as author of the entries
+        encoding (str): Encoding of the file
+        chunk_size (int, optional): Rows per chunk, JOURNAL_IMPORT_CHUNK_SIZE by default
+        progress (callable, optional): Called with the number of rows read after each chunk
+    
+    Returns:
+        dict: Numbers of imported entries and lines, rejected rows (DataFrame
+            with the row, reference, account and reason) and duration
+    """
+    started = time.monotonic()
+    account_ids = {account.code: account.id for account in chart_cache.load().accounts}
+    closed_until = get_closed_until()
+    
+    entry_count = 0
+    line_count = 0
+    row_count = 0
+    rejected = []
+    
+    for chunk in iter_import_chunks(path, format_type, encoding, chunk_size or app.config['JOURNAL_IMPORT_CHUNK_SIZE']):
+        accepted, chunk_rejected = validate_chunk(chunk, format_type, account_ids, closed_until)
+        
+        try:
+            entry_count += insert_chunk(accepted, user_id)
+            bump_ledger_version()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        line_count += len(accepted)
+        row_count += len(chunk)
+        rejected.append(chunk_rejected)
+        
+        if progress:
+            progress(row_count)
+    
+    return {
+        'entries': entry_count,
+        'lines': line_count,
+        'rejected': pd.concat(rejected, ignore_index=True) if rejected else
+            pd.DataFrame(columns=['row', 'reference', 'account', 'reason']),
+        'seconds': time.monotonic() - started
+    }
+
+@click.command('import-journal')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format_type', type=click.Choice(list(IMPORT_FORMATS)), default='csv',
+              show_default=True, help='Layout of the file.')
+@click.option('--user', 'email', required=True, help='Email of the user recorded as author of the entries.')
+@click.option('--encoding', default='utf-8-sig', show_default=True, help='Encoding of the file.')
+@click.option('--chunk-size', type=int, help='Number of rows read at a time.')
+@click.option('--rejects', type=click.Path(dir_okay=False), help='Path of a CSV file listing the rejected rows.')
+def import_journal_command(path, format_type, email, encoding, chunk_size, rejects):
+    """Import the journal entries of a CSV or FEC file at PATH."""
+    with app.app_context():
+        user = User.query.filter_by(email=email).first()
+        if not user:
+            raise click.BadParameter(f"Aucun utilisateur avec l'email {email}.", param_hint='--user')
+        
+        try:
+            result = import_journal(path, format_type, user.id, encoding, chunk_size,
+                                    progress=lambda rows: click.echo(f"  {rows} lignes lues"))
+        except ValueError as error:
+            raise click.ClickException(str(error))
+    
+    seconds = result['seconds']
+    click.echo(f"{result['entries']} écritures ({result['lines']} lignes) importées en {seconds:.1f} s "
+               f"({result['lines'] / seconds if seconds else 0:,.0f} lignes/s)")
+    
+    rejected = result['rejected']
+    if rejected.empty:
+        return
+    
+    click.echo(f"{len(rejected)} lignes rejetées")
+    if rejects:
+        rejected.to_csv(rejects, index=False)
+        click.echo(f"Détail des rejets écrit dans {rejects}")
+    else:
+        for row in rejected.head(20).itertuples(index=False):
+            click.echo(f"  ligne {row.row} ({row.reference or 'sans référence'}, compte {row.account or '-'}) : {row.reason}")
+        if len(rejected) > 20:
+            click.echo("  ... (utilisez --rejects pour la liste complète)")
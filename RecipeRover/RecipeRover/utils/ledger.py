@@ -0,0 +1,241 @@
+from app import db
+from models import Account, AccountDailyBalance, JournalEntry, JournalEntryLine, LedgerVersion, PeriodClosing
+from sqlalchemy import event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+LEDGER_VERSION_ID = 1
+CHART_VERSION_ID = 2
+NOTIFICATION_VERSION_ID = 3
+
+# INSERT constructs with ON CONFLICT support of each database
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+def get_ledger_version(version_id=LEDGER_VERSION_ID):
+    """
+    Get the current ledger version.
+    
+    The version is incremented in the same transaction as every write to
+    journal entries, lines or accounts, so it can be used to invalidate cached
+    reports across all worker processes. Separate versions only track writes
+    to the chart of accounts (CHART_VERSION_ID) and to notifications
+    (NOTIFICATION_VERSION_ID).
+    
+    Args:
+        version_id (int): The version to read (LEDGER_VERSION_ID, CHART_VERSION_ID
+            or NOTIFICATION_VERSION_ID)
+    
+    Returns:
+        int: Current version
+    """
+    return db.session.query(LedgerVersion.version).filter_by(id=version_id).scalar() or 0
+
+def bump_ledger_version(connection=None, version_id=LEDGER_VERSION_ID):
+    """
+    Increment the ledger version.
+    
+    Must be called explicitly after bulk (non-ORM) writes to journal or
+    account tables; ORM writes are detected automatically on flush.
+    """
+    statement = update(LedgerVersion).\
+        where(LedgerVersion.id == version_id).\
+        values(version=LedgerVersion.version + 1)
+    
+    if connection is not None:
+        connection.execute(statement)
+    else:
+        db.session.execute(statement)
+
+@event.listens_for(Session, 'after_flush')
+def bump_ledger_version_on_flush(session, flush_context):
+    """Increment the ledger versions whenever journal entries, lines or accounts are flushed"""
+    objects = list(session.new) + list(session.dirty) + list(session.deleted)
+    
+    if any(isinstance(obj, (JournalEntry, JournalEntryLine, Account)) for obj in objects):
+        bump_ledger_version(session.connection())
+    
+    if any(isinstance(obj, Account) for obj in objects):
+        bump_ledger_version(session.connection(), CHART_VERSION_ID)
+
+@event.listens_for(Session, 'before_flush')
+def sync_line_dates(session, flush_context, instances):
+    """
+    Copy the date of journal entries to their lines, so that the lines of an
+    account can be read in date order from a single index.
+    """
+    for obj in session.new:
+        if isinstance(obj, JournalEntryLine) and obj.date is None:
+            entry = obj.journal_entry or session.get(JournalEntry, obj.journal_entry_id)
+            obj.date = entry.date
+    
+    for obj in session.dirty:
+        if isinstance(obj, JournalEntry) and inspect(obj).attrs.date.history.has_changes():
+            for line in obj.lines:
+                line.date = obj.date
+
+def get_latest_closing(date=None):
+    """
+    Get the latest closed period.
+    
+    Args:
+        date (date, optional): Only consider periods ending on or before this date
+    
+    Returns:
+        PeriodClosing: The closing, or None if no period is closed
+    """
+    query = PeriodClosing.query
+    
+    if date:
+        query = query.filter(PeriodClosing.end_date <= date)
+    
+    return query.order_by(PeriodClosing.end_date.desc()).first()
+
+def get_closed_until():
+    """Return the end date of the latest closed period, or None if no period is closed"""
+    return db.session.query(func.max(PeriodClosing.end_date)).scalar()
+
+def is_period_closed(date):
+    """Return whether journal entries of a date are locked by a period closing"""
+    closed_until = get_closed_until()
+    return closed_until is not None and date <= closed_until
+
+def increment_daily_balances(totals):
+    """
+    Add debit and credit totals to daily balances, with one atomic
+    INSERT ... ON CONFLICT DO UPDATE statement per account and date.
+    
+    The amounts are added by the database rather than read and written back,
+    so concurrent postings to the same account and date are all counted, and
+    the first postings of a day cannot both try to insert its balance. The
+    totals are sent as one executemany of the statement, without reading the
+    existing balances first.
+    
+    Args:
+        totals (list): Dicts with the account_id, date, debit and credit to add,
+            at most one per account and date
+    """
+    if not totals:
+        return
+    
+    table = AccountDailyBalance.__table__
+    statement = UPSERT_INSERTS[db.session.get_bind().dialect.name](table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.account_id, table.c.date],
+        set_={
+            'debit': table.c.debit + statement.excluded.debit,
+            'credit': table.c.credit + statement.excluded.credit
+        }
+    )
+    
+    db.session.execute(statement, totals)
+
+def apply_to_daily_balances(totals):
+    """
+    Add debit and credit totals to the daily balances, after checking once
+    that none of their dates is closed.
+    
+    Args:
+        totals (list): Dicts with the account_id, date, debit and credit to add
+            (negative to remove), at most one per account and date
+    
+    Raises:
+        ValueError: If a date belongs to a closed period
+    """
+    if not totals:
+        return
+    
+    # Closed periods are summarized by their closing balances and must not change
+    first_date = min(total['date'] for total in totals)
+    if is_period_closed(first_date):
+        raise ValueError(f"La période du {first_date.strftime('%d/%m/%Y')} est clôturée.")
+    
+    increment_daily_balances(totals)
+
+def line_totals(lines, date, sign=1):
+    """
+    Sum the amounts of journal entry lines per account.
+    
+    Args:
+        lines (list): Journal entry lines
+        date (date): The date of their entry
+        sign (int): 1 to add the lines, -1 to remove them
+    
+    Returns:
+        list: Daily balance totals, one per account
+    """
+    totals = {}
+    for line in lines:
+        debit, credit = totals.get(line.account_id, (0, 0))
+        totals[line.account_id] = (debit + sign * (line.debit or 0), credit + sign * (line.credit or 0))
+    
+    return [
+        {'account_id': account_id, 'date': date, 'debit': debit, 'credit': credit}
+        for account_id, (debit, credit) in totals.items()
+    ]
+
+def record_line_added(line, date):
+    """Add a new journal entry line to the daily balances"""
+    apply_to_daily_balances(line_totals([line], date))
+
+def record_line_deleted(line, date):
+    """Remove a journal entry line from the daily balances"""
+    apply_to_daily_balances(line_totals([line], date, -1))
+
+def record_entry_deleted(entry):
+    """Remove all the lines of a journal entry from the daily balances"""
+    apply_to_daily_balances(line_totals(entry.lines, entry.date, -1))
+
+def record_entry_moved(entry, old_date, new_date):
+    """Move the lines of a journal entry from one date to another in the daily balances"""
+    if old_date == new_date:
+        return
+    
+    apply_to_daily_balances(line_totals(entry.lines, old_date, -1) + line_totals(entry.lines, new_date))
+
+def rebuild_daily_balances():
+    """
+    Rebuild the daily balance table from the journal entry lines.
+    
+    Only the dates after the latest closed period are rebuilt: closed periods
+    are summarized by their closing balances, and their daily balances are
+    kept as they were when the period was closed.
+    """
+    closed_until = get_closed_until()
+    
+    balances = AccountDailyBalance.query
+    lines = select(
+        JournalEntryLine.account_id,
+        JournalEntry.date,
+        func.coalesce(func.sum(JournalEntryLine.debit), 0),
+        func.coalesce(func.sum(JournalEntryLine.credit), 0)
+    ).join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
+        group_by(JournalEntryLine.account_id, JournalEntry.date)
+    
+    if closed_until is not None:
+        balances = balances.filter(AccountDailyBalance.date > closed_until)
+        lines = lines.where(JournalEntry.date > closed_until)
+    
+    balances.delete()
+    db.session.execute(
+        insert(AccountDailyBalance).from_select(['account_id', 'date', 'debit', 'credit'], lines)
+    )
+    bump_ledger_version()
+
+def init_ledger():
+    """
+    Create the ledger version rows and populate the daily balances of an
+    existing ledger the first time they are needed.
+    """
+    for version_id in (LEDGER_VERSION_ID, CHART_VERSION_ID, NOTIFICATION_VERSION_ID):
+        if not LedgerVersion.query.get(version_id):
+            db.session.add(LedgerVersion(id=version_id, version=0))
+    db.session.commit()
+    
+    # Periods can only be closed once daily balances exist, so an empty table
+    # means a ledger without closings and is rebuilt from all its lines
+    if AccountDailyBalance.query.first() is None and JournalEntryLine.query.first() is not None:
+        rebuild_daily_balances()
+        db.session.commit()
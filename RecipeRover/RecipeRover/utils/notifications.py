@@ -0,0 +1,142 @@
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from flask_login import current_user
+from app import db
+from models import Notification, User
+from utils.ledger import NOTIFICATION_VERSION_ID, bump_ledger_version, get_ledger_version
+from sqlalchemy import Boolean, DateTime, Integer, String, event, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+# Single worker so that background fan-outs are written one at a time
+notification_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notifications')
+
+# Number of notifications shown in the header dropdown
+HEADER_NOTIFICATIONS = 5
+
+# Detached copy of the notification fields shown in the header
+NotificationInfo = namedtuple('NotificationInfo', ['id', 'title', 'message', 'deadline_id', 'is_read', 'created_at'])
+
+class HeaderNotificationsCache:
+    """
+    Process-wide cache of the unread count and latest notifications of each
+    user, shown in the header of every page.
+    
+    The cache is emptied whenever the notification version changes, i.e. after
+    notifications are created, read or deleted in any worker process.
+    """
+    
+    def __init__(self):
+        self.version = None
+        self.by_user = {}
+        self.lock = threading.Lock()
+    
+    def load(self, user_id):
+        """
+        Return the up-to-date header notifications of a user, loading them if needed.
+        
+        Args:
+            user_id (int): User ID
+        
+        Returns:
+            tuple: Unread count and list of NotificationInfo, newest first
+        """
+        version = get_ledger_version(NOTIFICATION_VERSION_ID)
+        
+        with self.lock:
+            if self.version != version:
+                self.by_user = {}
+                self.version = version
+            
+            if user_id not in self.by_user:
+                unread_count = db.session.query(func.count(Notification.id)).\
+                    filter_by(user_id=user_id, is_read=False).\
+                    scalar()
+                rows = Notification.query.with_entities(*[getattr(Notification, field) for field in NotificationInfo._fields]).\
+                    filter_by(user_id=user_id).\
+                    order_by(Notification.created_at.desc(), Notification.id.desc()).\
+                    limit(HEADER_NOTIFICATIONS).all()
+                
+                self.by_user[user_id] = (unread_count, [NotificationInfo(*row) for row in rows])
+            
+            return self.by_user[user_id]
+    
+    def clear(self):
+        """Drop the cached notifications"""
+        with self.lock:
+            self.version = None
+            self.by_user = {}
+
+header_notifications_cache = HeaderNotificationsCache()
+
+def inject_notifications():
+    """Provide the unread count and latest notifications to the layout header"""
+    if not current_user.is_authenticated:
+        return {}
+    
+    unread_count, latest = header_notifications_cache.load(current_user.id)
+    
+    return {
+        'unread_notification_count': unread_count,
+        'latest_notifications': latest
+    }
+
+@event.listens_for(Session, 'after_flush')
+def bump_notification_version_on_flush(session, flush_context):
+    """Increment the notification version whenever notifications are flushed"""
+    objects = list(session.new) + list(session.dirty) + list(session.deleted)
+    
+    if any(isinstance(obj, Notification) for obj in objects):
+        bump_ledger_version(session.connection(), NOTIFICATION_VERSION_ID)
+
+def fan_out_notification(title, message, deadline_id=None):
+    """
+    Create the same notification for every user with a single INSERT ... SELECT.
+    
+    Args:
+        title (str): Notification title
+        message (str): Notification message
+        deadline_id (int, optional): Related deadline
+    """
+    users = select(
+        User.id,
+        literal(title, String),
+        literal(message, String),
+        literal(deadline_id, Integer),
+        literal(False, Boolean),
+        literal(datetime.utcnow(), DateTime)
+    )
+    
+    db.session.execute(
+        insert(Notification).from_select(
+            ['user_id', 'title', 'message', 'deadline_id', 'is_read', 'created_at'],
+            users
+        )
+    )
+    bump_ledger_version(version_id=NOTIFICATION_VERSION_ID)
+
+def run_fan_out(app, title, message, deadline_id):
+    """Fan out a notification from a background thread"""
+    with app.app_context():
+        try:
+            fan_out_notification(title, message, deadline_id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logging.exception("Notification fan-out failed: %s", title)
+
+def notify_all_users(title, message, deadline_id=None):
+    """
+    Notify every user, in a background worker if NOTIFICATIONS_IN_BACKGROUND is set.
+    
+    In the foreground, the notifications are committed before returning.
+    """
+    if current_app.config.get('NOTIFICATIONS_IN_BACKGROUND'):
+        app = current_app._get_current_object()
+        notification_executor.submit(run_fan_out, app, title, message, deadline_id)
+    else:
+        fan_out_notification(title, message, deadline_id)
+        db.session.commit()
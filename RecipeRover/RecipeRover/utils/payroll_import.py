@@ -0,0 +1,193 @@
+import time
+from decimal import Decimal
+import click
+import numpy as np
+import pandas as pd
+from app import app, db
+from models import Employee, PayrollLine
+from utils.journal_import import parse_amounts
+from utils.ledger import UPSERT_INSERTS
+
+# Columns of a payroll file: cin,name,year,month,gross_salary,cnss,cimr (one
+# employee and month per row, empty contributions are zero)
+PAYROLL_COLUMNS = ['cin', 'name', 'year', 'month', 'gross_salary', 'cnss', 'cimr']
+
+# Years accepted in payroll files
+PAYROLL_MIN_YEAR = 1900
+PAYROLL_MAX_YEAR = 2100
+
+# Longest texts accepted by the employee table
+CIN_LENGTH = Employee.cin.type.length
+NAME_LENGTH = Employee.name.type.length
+
+def validate_payroll(rows):
+    """
+    Check the rows of a payroll file, one column at a time.
+    
+    Args:
+        rows (DataFrame): Rows of the file as text, with their row number
+    
+    Returns:
+        tuple: (accepted rows with year, month and amounts in centimes,
+            rejected rows with the reason)
+    """
+    gross_salary, gross_extra_decimals = parse_amounts(rows['gross_salary'])
+    cnss, cnss_extra_decimals = parse_amounts(rows['cnss'])
+    cimr, cimr_extra_decimals = parse_amounts(rows['cimr'])
+    
+    rows = rows.assign(
+        cin=rows['cin'].str.strip(),
+        name=rows['name'].str.strip(),
+        year=pd.to_numeric(rows['year'].str.strip(), errors='coerce'),
+        month=pd.to_numeric(rows['month'].str.strip(), errors='coerce'),
+        gross_salary=gross_salary,
+        cnss=cnss,
+        cimr=cimr
+    )
+    
+    # Reason of the first failed check of each row
+    checks = [
+        (rows['cin'] == '', 'CIN manquant'),
+        (rows['cin'].str.len() > CIN_LENGTH, 'CIN trop long'),
+        (rows['name'] == '', 'Nom manquant'),
+        (rows['name'].str.len() > NAME_LENGTH, 'Nom trop long'),
+        (~rows['year'].between(PAYROLL_MIN_YEAR, PAYROLL_MAX_YEAR) | (rows['year'] % 1 != 0), 'Année invalide'),
+        (~rows['month'].between(1, 12) | (rows['month'] % 1 != 0), 'Mois invalide'),
+        (gross_extra_decimals | cnss_extra_decimals | cimr_extra_decimals, 'Plus de deux décimales'),
+        (rows['gross_salary'].isna() | rows['cnss'].isna() | rows['cimr'].isna(), 'Montant invalide'),
+        ((rows['gross_salary'] < 0) | (rows['cnss'] < 0) | (rows['cimr'] < 0), 'Montant négatif'),
+        (rows.duplicated(['cin', 'year', 'month'], keep=False), 'Mois en double dans le fichier')
+    ]
+    
+    reason = pd.Series(
+        np.select([condition.to_numpy(dtype=bool, na_value=False) for condition, message in checks],
+                  [message for condition, message in checks], default=''),
+        index=rows.index
+    )
+    
+    rejected = rows.loc[reason != '', ['row', 'cin', 'name']].assign(reason=reason[reason != ''])
+    
+    return rows[reason == ''], rejected
+
+def get_employee_ids(rows):
+    """
+    Get the ID of the employee of each CIN, creating the employees that do not
+    exist yet.
+    
+    Returns:
+        tuple: (employee ID of each CIN, number of employees created)
+    """
+    names = dict(zip(rows['cin'], rows['name']))
+    employee_ids = dict(
+        db.session.query(Employee.cin, Employee.id).filter(Employee.cin.in_(names))
+    )
+    
+    new_employees = [Employee(cin=cin, name=name) for cin, name in names.items() if cin not in employee_ids]
+    if new_employees:
+        db.session.add_all(new_employees)
+        db.session.flush()
+        employee_ids.update((employee.cin, employee.id) for employee in new_employees)
+    
+    return employee_ids, len(new_employees)
+
+def import_payroll(path, encoding='utf-8-sig'):
+    """
+    Import the monthly payroll lines of a CSV file.
+    
+    Employees are identified by their CIN and created with the name of the
+    file if they do not exist. A month already imported for an employee is
+    replaced by the amounts of the file. Invalid rows are skipped and
+    reported with their reason.
+    
+    Args:
+        path (str): Path of the file
+        encoding (str): Encoding of the file
+    
+    Returns:
+        dict: Numbers of imported lines and created employees, rejected rows
+            (DataFrame with the row, cin, name and reason) and duration
+    
+    Raises:
+        ValueError: If a column is missing from the file
+    """
+    started = time.monotonic()
+    
+    rows = pd.read_csv(path, encoding=encoding, dtype=str, keep_default_na=False)
+    missing = [column for column in PAYROLL_COLUMNS if column not in rows.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes dans le fichier : {', '.join(missing)}")
+    
+    rows = rows[PAYROLL_COLUMNS].assign(row=rows.index + 2)
+    accepted, rejected = validate_payroll(rows)
+    
+    employee_count = 0
+    try:
+        if not accepted.empty:
+            employee_ids, employee_count = get_employee_ids(accepted)
+            
+            # One atomic statement per employee and month replaces the months
+            # imported before
+            table = PayrollLine.__table__
+            statement = UPSERT_INSERTS[db.session.get_bind().dialect.name](table)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.employee_id, table.c.year, table.c.month],
+                set_={
+                    'gross_salary': statement.excluded.gross_salary,
+                    'cnss': statement.excluded.cnss,
+                    'cimr': statement.excluded.cimr
+                }
+            )
+            db.session.execute(statement, [
+                {
+                    'employee_id': employee_ids[cin],
+                    'year': int(year),
+                    'month': int(month),
+                    'gross_salary': Decimal(int(gross_salary)).scaleb(-2),
+                    'cnss': Decimal(int(cnss)).scaleb(-2),
+                    'cimr': Decimal(int(cimr)).scaleb(-2)
+                }
+                for cin, year, month, gross_salary, cnss, cimr in accepted[
+                    ['cin', 'year', 'month', 'gross_salary', 'cnss', 'cimr']
+                ].itertuples(index=False)
+            ])
+        
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    return {
+        'lines': len(accepted),
+        'employees': employee_count,
+        'rejected': rejected.reset_index(drop=True),
+        'seconds': time.monotonic() - started
+    }
+
+@click.command('import-payroll')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--encoding', default='utf-8-sig', show_default=True, help='Encoding of the file.')
+@click.option('--rejects', type=click.Path(dir_okay=False), help='Path of a CSV file listing the rejected rows.')
+def import_payroll_command(path, encoding, rejects):
+    """Import the monthly payroll lines (cin,name,year,month,gross_salary,cnss,cimr) of a CSV file at PATH."""
+    with app.app_context():
+        try:
+            result = import_payroll(path, encoding)
+        except ValueError as error:
+            raise click.ClickException(str(error))
+    
+    click.echo(f"{result['lines']} lignes de paie importées, {result['employees']} salariés créés "
+               f"en {result['seconds']:.1f} s")
+    
+    rejected = result['rejected']
+    if rejected.empty:
+        return
+    
+    click.echo(f"{len(rejected)} lignes rejetées")
+    if rejects:
+        rejected.to_csv(rejects, index=False)
+        click.echo(f"Détail des rejets écrit dans {rejects}")
+    else:
+        for row in rejected.head(20).itertuples(index=False):
+            click.echo(f"  ligne {row.row} ({row.cin or 'sans CIN'}) : {row.reason}")
+        if len(rejected) > 20:
+            click.echo("  ... (utilisez --rejects pour la liste complète)")
@@ -0,0 +1,72 @@
+from app import db
+from models import AccountClosingBalance, PeriodClosing
+from utils.ledger import get_latest_closing, is_period_closed
+from utils.report_generator import get_account_totals
+from sqlalchemy import insert
+
+def close_period(end_date, user_id):
+    """
+    Close the fiscal period ending on a date.
+    
+    The debit and credit totals of every account up to the end date are saved
+    as closing balances, so that reports as of a later date only sum the daily
+    balances after it, and journal entries up to the end date are locked.
+    
+    Args:
+        end_date (date): Last day of the period
+        user_id (int): The user closing the period
+    
+    Returns:
+        PeriodClosing: The closing
+    
+    Raises:
+        ValueError: If the period is already closed or its entries are not balanced
+    """
+    if is_period_closed(end_date):
+        raise ValueError(f"La période du {end_date.strftime('%d/%m/%Y')} est déjà clôturée.")
+    
+    # Totals from the previous closing and the daily balances after it
+    totals = get_account_totals(end_date)
+    
+    total_debit = sum(debit for debit, credit in totals.values())
+    total_credit = sum(credit for debit, credit in totals.values())
+    if total_debit != total_credit:
+        raise ValueError(
+            f"Les écritures jusqu'au {end_date.strftime('%d/%m/%Y')} ne sont pas équilibrées "
+            f"(débit {total_debit:,.2f}, crédit {total_credit:,.2f})."
+        )
+    
+    closing = PeriodClosing(end_date=end_date, closed_by_id=user_id)
+    db.session.add(closing)
+    db.session.flush()
+    
+    # Accounts left without any amount (their lines were deleted) need no closing balance
+    balances = [
+        {'closing_id': closing.id, 'account_id': account_id, 'debit': debit, 'credit': credit}
+        for account_id, (debit, credit) in totals.items()
+        if debit or credit
+    ]
+    
+    if balances:
+        db.session.execute(insert(AccountClosingBalance), balances)
+    
+    return closing
+
+def reopen_period():
+    """
+    Reopen the latest closed period, unlocking its journal entries.
+    
+    Returns:
+        PeriodClosing: The deleted closing
+    
+    Raises:
+        ValueError: If no period is closed
+    """
+    closing = get_latest_closing()
+    
+    if not closing:
+        raise ValueError("Aucune période n'est clôturée.")
+    
+    db.session.delete(closing)
+    
+    return closing
@@ -1,8 +1,133 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import wraps
+from itertools import chain, groupby
+from types import MappingProxyType
 from app import db
-from models import Account, JournalEntry, JournalEntryLine
-from datetime import datetime
-from sqlalchemy import and_, func
+from models import Account, AccountClosingBalance, AccountDailyBalance, AccountTree, Invoice, JournalEntry, JournalEntryLine
+from utils.ledger import get_latest_closing, get_ledger_version
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, extract, func, or_
 
+# Upper bound for the memory used by cached report results (in bytes)
+REPORT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Longest time the dashboard may show invoices changed since it was cached (in seconds)
+DASHBOARD_CACHE_TTL = 60
+
+# Number of journal entries and due invoices listed on the dashboard
+DASHBOARD_LIST_SIZE = 5
+
+def estimate_size(value):
+    """Roughly estimate the memory used by a report result, in bytes"""
+    size = sys.getsizeof(value)
+    
+    if isinstance(value, Mapping):
+        for key, item in value.items():
+            size += estimate_size(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+    
+    return size
+
+class ReportCache:
+    """
+    LRU cache of generated reports, bounded by memory.
+    
+    Each result is stored with the ledger version it was computed at and is
+    only served while the ledger version is unchanged.
+    """
+    
+    def __init__(self, max_bytes=REPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key, version):
+        """Return the cached result for a key, or None if missing or stale"""
+        with self.lock:
+            entry = self.entries.get(key)
+            
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, key, version, value):
+        """Store a result, evicting the least recently used ones if needed"""
+        size = estimate_size(value)
+        
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            
+            if size > self.max_bytes:
+                return
+            
+            self.entries[key] = (version, value, size)
+            self.size += size
+            
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+    
+    def clear(self):
+        """Remove all cached results and reset the counters"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self):
+        """Return cache statistics"""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'size': self.size,
+                'max_size': self.max_bytes
+            }
+    
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[2]
+
+report_cache = ReportCache()
+
+def cached_report(report_type):
+    """
+    Cache the results of a report function by report type and arguments.
+    
+    Cached results are shared between requests and must not be modified.
+    """
+    def decorator(report_function):
+        @wraps(report_function)
+        def wrapper(*args):
+            key = (report_type,) + args
+            version = get_ledger_version()
+            
+            result = report_cache.get(key, version)
+            if result is None:
+                result = report_function(*args)
+                report_cache.set(key, version, result)
+            
+            return result
+        return wrapper
+    return decorator
+
+@cached_report('balance_sheet')
 def generate_balance_sheet(date):
     """
     Generate a balance sheet as of a specific date.
@@ -16,6 +141,10 @@ def generate_balance_sheet(date):
     # Get all accounts
     accounts = Account.query.all()
     
+    # Get all-time and year-to-date totals for every account
+    totals = get_account_totals(date)
+    period_totals = get_account_totals(date, date.replace(month=1, day=1))
+    
     # Prepare balance sheet structure
     balance_sheet = {
         'date': date,
@@ -41,23 +170,15 @@ def generate_balance_sheet(date):
     
     # Process each account
     for account in accounts:
+        debit_sum, credit_sum = totals.get(account.id, (0, 0))
+        
         # Calculate account balance
         if account.account_type == 'Asset':
             # For asset accounts: Debit - Credit
-            balance = db.session.query(func.sum(JournalEntryLine.debit - JournalEntryLine.credit)).\
-                join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-                filter(
-                    JournalEntryLine.account_id == account.id,
-                    JournalEntry.date <= date
-                ).scalar() or 0
+            balance = debit_sum - credit_sum
         else:
             # For liability and equity accounts: Credit - Debit
-            balance = db.session.query(func.sum(JournalEntryLine.credit - JournalEntryLine.debit)).\
-                join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-                filter(
-                    JournalEntryLine.account_id == account.id,
-                    JournalEntry.date <= date
-                ).scalar() or 0
+            balance = credit_sum - debit_sum
         
         # Skip accounts with zero balance
         if balance == 0:
@@ -97,7 +218,7 @@ def generate_balance_sheet(date):
             balance_sheet['liabilities']['total'] += balance
     
     # Add net income to equity
-    net_income = calculate_net_income(date.replace(month=1, day=1), date)
+    net_income = net_income_from_totals(accounts, period_totals)
     
     balance_sheet['liabilities']['equity'].append({
         'code': '',
@@ -110,6 +231,7 @@ def generate_balance_sheet(date):
     
     return balance_sheet
 
+@cached_report('income_statement')
 def generate_income_statement(start_date, end_date):
     """
     Generate an income statement for a specific period.
@@ -136,15 +258,15 @@ def generate_income_statement(start_date, end_date):
         'net_income': 0
     }
     
+    # Get totals for every account over the period
+    totals = get_account_totals(end_date, start_date)
+    
     # Process revenue accounts
     for account in revenue_accounts:
+        debit_sum, credit_sum = totals.get(account.id, (0, 0))
+        
         # Calculate account balance: Credit - Debit
-        balance = db.session.query(func.sum(JournalEntryLine.credit - JournalEntryLine.debit)).\
-            join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-            filter(
-                JournalEntryLine.account_id == account.id,
-                and_(JournalEntry.date >= start_date, JournalEntry.date <= end_date)
-            ).scalar() or 0
+        balance = credit_sum - debit_sum
         
         # Skip accounts with zero balance
         if balance == 0:
@@ -160,13 +282,10 @@ def generate_income_statement(start_date, end_date):
     
     # Process expense accounts
     for account in expense_accounts:
+        debit_sum, credit_sum = totals.get(account.id, (0, 0))
+        
         # Calculate account balance: Debit - Credit
-        balance = db.session.query(func.sum(JournalEntryLine.debit - JournalEntryLine.credit)).\
-            join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-            filter(
-                JournalEntryLine.account_id == account.id,
-                and_(JournalEntry.date >= start_date, JournalEntry.date <= end_date)
-            ).scalar() or 0
+        balance = debit_sum - credit_sum
         
         # Skip accounts with zero balance
         if balance == 0:
@@ -185,6 +304,7 @@ def generate_income_statement(start_date, end_date):
     
     return income_statement
 
+@cached_report('trial_balance')
 def generate_trial_balance(date):
     """
     Generate a trial balance as of a specific date.
@@ -198,6 +318,9 @@ def generate_trial_balance(date):
     # Get all accounts
     accounts = Account.query.order_by(Account.code).all()
     
+    # Get debit and credit totals for every account in one query
+    totals = get_account_totals(date)
+    
     # Prepare trial balance structure
     trial_balance = {
         'date': date,
@@ -208,20 +331,7 @@ def generate_trial_balance(date):
     
     # Process each account
     for account in accounts:
-        # Get sum of debits and credits for the account
-        debit_sum = db.session.query(func.sum(JournalEntryLine.debit)).\
-            join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-            filter(
-                JournalEntryLine.account_id == account.id,
-                JournalEntry.date <= date
-            ).scalar() or 0
-        
-        credit_sum = db.session.query(func.sum(JournalEntryLine.credit)).\
-            join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-            filter(
-                JournalEntryLine.account_id == account.id,
-                JournalEntry.date <= date
-            ).scalar() or 0
+        debit_sum, credit_sum = totals.get(account.id, (0, 0))
         
         # Calculate account balance
         if account.account_type in ['Asset', 'Expense']:
@@ -250,40 +360,405 @@ def generate_trial_balance(date):
     
     return trial_balance
 
-def calculate_net_income(start_date, end_date):
+@cached_report('dashboard')
+def generate_dashboard(today, period):
     """
-    Calculate net income for a specific period.
+    Generate the dashboard summary.
+    
+    Journal changes invalidate the summary through the ledger version; invoice
+    changes are picked up once the cache period changes.
     
     Args:
+        today (date): The current date, for the due invoices
+        period (int): Current cache period, see get_dashboard_period()
+        
+    Returns:
+        dict: Dashboard data
+    """
+    # Totals by account type in one conditional aggregation
+    balance = AccountDailyBalance.debit - AccountDailyBalance.credit
+    totals = db.session.query(
+        func.sum(case((Account.account_type == 'Asset', balance), else_=0)),
+        func.sum(case((Account.account_type == 'Liability', -balance), else_=0)),
+        func.sum(case((Account.account_type == 'Revenue', -balance), else_=0)),
+        func.sum(case((Account.account_type == 'Expense', balance), else_=0))
+    ).join(Account, AccountDailyBalance.account_id == Account.id).\
+        filter(Account.account_type.in_(['Asset', 'Liability', 'Revenue', 'Expense'])).one()
+    
+    total_assets, total_liabilities, total_revenue, total_expenses = (total or 0 for total in totals)
+    
+    # Latest journal entries with their debit total
+    recent_ids = db.session.query(JournalEntry.id).\
+        order_by(JournalEntry.date.desc(), JournalEntry.id.desc()).\
+        limit(DASHBOARD_LIST_SIZE).subquery()
+    
+    recent_entries = db.session.query(
+        JournalEntry.date,
+        JournalEntry.reference,
+        JournalEntry.description,
+        func.coalesce(func.sum(JournalEntryLine.debit), 0).label('total_debit')
+    ).join(recent_ids, recent_ids.c.id == JournalEntry.id).\
+        outerjoin(JournalEntryLine, and_(
+            JournalEntryLine.journal_entry_id == JournalEntry.id,
+            JournalEntryLine.debit > 0
+        )).\
+        group_by(JournalEntry.id, JournalEntry.date, JournalEntry.reference, JournalEntry.description).\
+        order_by(JournalEntry.date.desc(), JournalEntry.id.desc()).all()
+    
+    # Unpaid invoices coming due
+    due_invoices = db.session.query(
+        Invoice.invoice_number,
+        Invoice.invoice_type,
+        Invoice.due_date,
+        Invoice.total_ttc
+    ).filter(Invoice.paid == False, Invoice.due_date >= today).\
+        order_by(Invoice.due_date).limit(DASHBOARD_LIST_SIZE).all()
+    
+    return {
+        'recent_entries': recent_entries,
+        'due_invoices': due_invoices,
+        'total_assets': total_assets,
+        'total_liabilities': total_liabilities,
+        'total_revenue': total_revenue,
+        'total_expenses': total_expenses,
+        'net_income': total_revenue - total_expenses
+    }
+
+def get_dashboard_period():
+    """Return the current dashboard cache period, which changes every DASHBOARD_CACHE_TTL seconds"""
+    return int(time.time() // DASHBOARD_CACHE_TTL)
+
+def account_balance(account, debit, credit):
+    """Return the balance of an account according to its normal side"""
+    if account.account_type in ['Asset', 'Expense']:
+        return debit - credit
+    return credit - debit
+
+def iter_general_ledger(accounts, start_date, end_date, batch_size=1000):
+    """
+    Stream the general ledger of a period, account by account.
+    
+    All lines of the period are read with a single query ordered by account
+    code, date and id, fetched in batches from a server-side cursor, so
+    memory use does not depend on the number of lines.
+    
+    Args:
+        accounts (list): Accounts to include, ordered by code
         start_date (date): The start date of the period
         end_date (date): The end date of the period
+        batch_size (int): Number of lines fetched per round trip
+        
+    Yields:
+        tuple: (account, opening_balance, entries) for each account, where
+        entries is an iterator of ledger rows with a running balance. Each
+        entries iterator must be consumed before moving to the next account.
+    """
+    # Balances brought forward from before the period
+    opening_totals = get_account_totals(start_date - timedelta(days=1))
+    
+    lines = db.session.query(
+        JournalEntryLine.account_id,
+        JournalEntry.date,
+        JournalEntry.reference,
+        JournalEntryLine.description,
+        JournalEntry.description.label('entry_description'),
+        JournalEntryLine.debit,
+        JournalEntryLine.credit
+    ).join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
+        join(Account, JournalEntryLine.account_id == Account.id).\
+        filter(JournalEntry.date >= start_date, JournalEntry.date <= end_date).\
+        order_by(Account.code, JournalEntry.date, JournalEntry.id, JournalEntryLine.id).\
+        yield_per(batch_size)
+    
+    groups = groupby(lines, key=lambda line: line.account_id)
+    current = next(groups, None)
+    
+    for account in accounts:
+        debit_sum, credit_sum = opening_totals.get(account.id, (0, 0))
+        opening_balance = account_balance(account, debit_sum, credit_sum)
+        
+        if current is not None and current[0] == account.id:
+            yield account, opening_balance, iter_ledger_entries(account, opening_balance, current[1])
+            current = next(groups, None)
+        else:
+            yield account, opening_balance, iter(())
+
+def iter_ledger_entries(account, opening_balance, lines):
+    """Compute the running balance of an account's ledger lines on the fly"""
+    balance = opening_balance
+    
+    for line in lines:
+        debit = line.debit or 0
+        credit = line.credit or 0
+        balance += account_balance(account, debit, credit)
+        
+        yield {
+            'date': line.date,
+            'reference': line.reference,
+            'description': line.description or line.entry_description,
+            'debit': debit,
+            'credit': credit,
+            'balance': balance
+        }
+
+def iter_journal(start_date, end_date, batch_size=1000):
+    """
+    Stream the journal entries of a period with their lines.
+    
+    Entries and lines are read with a single query ordered by date, entry and
+    line, fetched in batches from a server-side cursor, so memory use does
+    not depend on the number of entries.
+    
+    Args:
+        start_date (date): The start date of the period
+        end_date (date): The end date of the period
+        batch_size (int): Number of lines fetched per round trip
+        
+    Yields:
+        tuple: (entry, lines) for each entry, where entry is a row with the
+        entry_id, date, reference and entry_description of the entry and lines
+        is an iterator of its rows with a line (account code and name,
+        description, debit and credit). The line_id of entry is None for an
+        entry without lines. Each lines iterator must be consumed before
+        moving to the next entry.
+    """
+    rows = db.session.query(
+        JournalEntry.id.label('entry_id'),
+        JournalEntry.date,
+        JournalEntry.reference,
+        JournalEntry.description.label('entry_description'),
+        JournalEntryLine.id.label('line_id'),
+        Account.code,
+        Account.name,
+        JournalEntryLine.description,
+        JournalEntryLine.debit,
+        JournalEntryLine.credit
+    ).outerjoin(JournalEntryLine, JournalEntryLine.journal_entry_id == JournalEntry.id).\
+        outerjoin(Account, JournalEntryLine.account_id == Account.id).\
+        filter(JournalEntry.date >= start_date, JournalEntry.date <= end_date).\
+        order_by(JournalEntry.date, JournalEntry.id, JournalEntryLine.id).\
+        yield_per(batch_size)
+    
+    for entry_id, group in groupby(rows, key=lambda row: row.entry_id):
+        entry = next(group)
+        
+        # An entry without lines comes back as a single row without a line
+        if entry.line_id is None:
+            yield entry, iter(())
+        else:
+            yield entry, chain([entry], group)
+
+def add_totals(totals, rows):
+    """
+    Add (account id, debit, credit) rows to a mapping of account id to
+    (debit, credit) totals.
+    """
+    for account_id, debit_sum, credit_sum in rows:
+        debit, credit = totals.get(account_id, (0, 0))
+        totals[account_id] = (debit + (debit_sum or 0), credit + (credit_sum or 0))
+    
+    return totals
+
+@cached_report('account_totals')
+def get_account_totals(end_date, start_date=None):
+    """
+    Get the debit and credit totals of every account in a single grouped query.
+    
+    Totals are summed from the per-day account balances rather than from
+    individual journal entry lines. Totals from the start of the ledger begin
+    at the closing balances of the latest closed period and only sum the
+    daily balances after it.
+    
+    Args:
+        end_date (date): Last journal entry date to include
+        start_date (date, optional): First journal entry date to include
         
     Returns:
-        float: Net income
+        MappingProxyType: Read-only mapping of account id to a (debit, credit)
+        tuple, for accounts with at least one line in the period (the mapping
+        is cached and shared between callers)
     """
-    # Get all revenue accounts (Class 7)
-    revenue_accounts = Account.query.filter(Account.code.like('7%')).all()
-    revenue_account_ids = [account.id for account in revenue_accounts]
+    totals = {}
     
-    # Get all expense accounts (Class 6)
-    expense_accounts = Account.query.filter(Account.code.like('6%')).all()
-    expense_account_ids = [account.id for account in expense_accounts]
+    if not start_date:
+        closing = get_latest_closing(end_date)
+        
+        if closing:
+            totals = add_totals(totals, db.session.query(
+                AccountClosingBalance.account_id,
+                AccountClosingBalance.debit,
+                AccountClosingBalance.credit
+            ).filter(AccountClosingBalance.closing_id == closing.id))
+            start_date = closing.end_date + timedelta(days=1)
     
-    # Calculate total revenue
-    total_revenue = db.session.query(func.sum(JournalEntryLine.credit - JournalEntryLine.debit)).\
-        join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-        filter(
-            JournalEntryLine.account_id.in_(revenue_account_ids),
-            and_(JournalEntry.date >= start_date, JournalEntry.date <= end_date)
-        ).scalar() or 0
+    query = db.session.query(
+        AccountDailyBalance.account_id,
+        func.sum(AccountDailyBalance.debit),
+        func.sum(AccountDailyBalance.credit)
+    ).filter(AccountDailyBalance.date <= end_date)
+    
+    if start_date:
+        query = query.filter(AccountDailyBalance.date >= start_date)
+    
+    query = query.group_by(AccountDailyBalance.account_id)
+    
+    return MappingProxyType(add_totals(totals, query))
+
+def get_account_total(account_id, end_date):
+    """
+    Get the debit and credit totals of one account from the start of the
+    ledger up to a date, starting at the closing balances of the latest
+    closed period.
+    
+    Args:
+        account_id (int): The account
+        end_date (date): Last journal entry date to include
+        
+    Returns:
+        tuple: (debit, credit) totals
+    """
+    debit, credit = 0, 0
+    query = db.session.query(
+        func.sum(AccountDailyBalance.debit),
+        func.sum(AccountDailyBalance.credit)
+    ).filter(AccountDailyBalance.account_id == account_id, AccountDailyBalance.date <= end_date)
+    
+    closing = get_latest_closing(end_date)
+    if closing:
+        balance = db.session.get(AccountClosingBalance, (closing.id, account_id))
+        if balance:
+            debit, credit = balance.debit, balance.credit
+        query = query.filter(AccountDailyBalance.date > closing.end_date)
+    
+    debit_sum, credit_sum = query.one()
+    
+    return debit + (debit_sum or 0), credit + (credit_sum or 0)
+
+def get_rollup_totals(end_date, start_date=None):
+    """
+    Get the debit and credit totals of every account including all of its
+    sub-accounts (e.g. 61 includes 611 and 6111), in a single grouped query.
+    
+    Like get_account_totals, totals from the start of the ledger begin at the
+    closing balances of the latest closed period.
+    
+    Args:
+        end_date (date): Last journal entry date to include
+        start_date (date, optional): First journal entry date to include
+        
+    Returns:
+        dict: Mapping of account id to a (debit, credit) tuple, for accounts
+        whose subtree has at least one line in the period
+    """
+    totals = {}
+    
+    if not start_date:
+        closing = get_latest_closing(end_date)
+        
+        if closing:
+            totals = add_totals(totals, db.session.query(
+                AccountTree.ancestor_id,
+                func.sum(AccountClosingBalance.debit),
+                func.sum(AccountClosingBalance.credit)
+            ).join(AccountClosingBalance, AccountClosingBalance.account_id == AccountTree.descendant_id).\
+                filter(AccountClosingBalance.closing_id == closing.id).\
+                group_by(AccountTree.ancestor_id))
+            start_date = closing.end_date + timedelta(days=1)
     
-    # Calculate total expenses
-    total_expenses = db.session.query(func.sum(JournalEntryLine.debit - JournalEntryLine.credit)).\
-        join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
+    query = db.session.query(
+        AccountTree.ancestor_id,
+        func.sum(AccountDailyBalance.debit),
+        func.sum(AccountDailyBalance.credit)
+    ).join(AccountDailyBalance, AccountDailyBalance.account_id == AccountTree.descendant_id).\
+        filter(AccountDailyBalance.date <= end_date)
+    
+    if start_date:
+        query = query.filter(AccountDailyBalance.date >= start_date)
+    
+    query = query.group_by(AccountTree.ancestor_id)
+    
+    return add_totals(totals, query)
+
+def get_monthly_totals(years, account_types):
+    """
+    Get debit and credit totals per year, month and account type in a single grouped query.
+    
+    Args:
+        years (list): The years to include
+        account_types (list): The account types to include ('Revenue', 'Expense', etc.)
+        
+    Returns:
+        dict: Mapping of (year, month, account_type) to a (debit, credit) tuple
+    """
+    year = extract('year', AccountDailyBalance.date)
+    month = extract('month', AccountDailyBalance.date)
+    
+    query = db.session.query(
+        year,
+        month,
+        Account.account_type,
+        func.sum(AccountDailyBalance.debit),
+        func.sum(AccountDailyBalance.credit)
+    ).join(Account, AccountDailyBalance.account_id == Account.id).\
         filter(
-            JournalEntryLine.account_id.in_(expense_account_ids),
-            and_(JournalEntry.date >= start_date, JournalEntry.date <= end_date)
-        ).scalar() or 0
+            Account.account_type.in_(account_types),
+            # Only read the requested years, not the years between them
+            or_(*(
+                and_(
+                    AccountDailyBalance.date >= datetime(selected_year, 1, 1).date(),
+                    AccountDailyBalance.date < datetime(selected_year + 1, 1, 1).date()
+                )
+                for selected_year in years
+            ))
+        ).\
+        group_by(year, month, Account.account_type)
+    
+    return {
+        (int(row_year), int(row_month), account_type): (debit_sum or 0, credit_sum or 0)
+        for row_year, row_month, account_type, debit_sum, credit_sum in query
+    }
+
+def net_income_from_totals(accounts, totals):
+    """
+    Calculate net income from preloaded accounts and their totals.
+    
+    Args:
+        accounts (list): Accounts to consider (only classes 6 and 7 are used)
+        totals (Mapping): Account totals as returned by get_account_totals
+        
+    Returns:
+        float: Net income
+    """
+    total_revenue = 0
+    total_expenses = 0
+    
+    for account in accounts:
+        if account.id not in totals:
+            continue
+        
+        debit_sum, credit_sum = totals[account.id]
+        
+        if account.code.startswith('7'):
+            total_revenue += credit_sum - debit_sum
+        elif account.code.startswith('6'):
+            total_expenses += debit_sum - credit_sum
     
-    # Net income
     return total_revenue - total_expenses
+
+def calculate_net_income(start_date, end_date):
+    """
+    Calculate net income for a specific period.
+    
+    Args:
+        start_date (date): The start date of the period
+        end_date (date): The end date of the period
+        
+    Returns:
+        float: Net income
+    """
+    # Get all revenue (Class 7) and expense (Class 6) accounts
+    accounts = Account.query.filter(
+        or_(Account.code.like('7%'), Account.code.like('6%'))
+    ).all()
+    
+    return net_income_from_totals(accounts, get_account_totals(end_date, start_date))
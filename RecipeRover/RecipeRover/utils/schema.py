@@ -0,0 +1,146 @@
+import logging
+from app import db
+from models import Money, SchemaMigration
+from sqlalchemy import Integer, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+def create_missing_indexes():
+    """
+    Create the indexes declared on the models that are missing from an
+    existing database.
+    
+    db.create_all() only creates indexes together with new tables, so this
+    upgrades databases created before an index was added to a model. It is
+    safe to run on every startup.
+    
+    Returns:
+        list: Names of the created indexes
+    """
+    inspector = inspect(db.engine)
+    created = []
+    
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+                logger.info("Created index %s on %s", index.name, table.name)
+    
+    return created
+
+def enable_sqlite_wal():
+    """
+    Switch an SQLite database to write-ahead logging.
+    
+    In the default rollback journal mode, a long read such as a streamed
+    export blocks every write until it ends. With write-ahead logging,
+    readers and a writer work concurrently. The mode is stored in the
+    database file, so this only changes it once.
+    """
+    if db.engine.dialect.name != 'sqlite' or db.engine.url.database in (None, '', ':memory:'):
+        return
+    
+    with db.engine.connect() as connection:
+        mode = connection.exec_driver_sql('PRAGMA journal_mode=WAL').scalar()
+        if mode != 'wal':
+            logger.warning("Could not enable write-ahead logging on SQLite (journal mode: %s)", mode)
+
+def convert_money_to_centimes(connection):
+    """
+    Convert the amounts stored as floating point MAD into integer centimes.
+    
+    Only the Money columns whose database type is not already an integer are
+    converted, so databases created with the Money type are left untouched.
+    
+    Args:
+        connection: The connection of the migration transaction
+    """
+    inspector = inspect(connection)
+    
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+        
+        for column in table.columns:
+            if not isinstance(column.type, Money) or isinstance(existing.get(column.name), Integer):
+                continue
+            
+            if connection.dialect.name == 'postgresql':
+                connection.execute(text(
+                    f'ALTER TABLE "{table.name}" ALTER COLUMN "{column.name}" TYPE BIGINT '
+                    f'USING ROUND("{column.name}" * 100)'
+                ))
+            else:
+                # SQLite keeps the declared REAL type; the rounded values are read back as centimes
+                connection.execute(text(
+                    f'UPDATE "{table.name}" SET "{column.name}" = ROUND("{column.name}" * 100)'
+                ))
+            
+            logger.info("Converted %s.%s to centimes", table.name, column.name)
+
+def add_journal_entry_line_date(connection):
+    """
+    Add the journal entry date to the journal entry lines of an existing
+    database and fill it from their entries.
+    
+    Args:
+        connection: The connection of the migration transaction
+    """
+    columns = {column['name'] for column in inspect(connection).get_columns('journal_entry_line')}
+    
+    if 'date' not in columns:
+        connection.execute(text('ALTER TABLE journal_entry_line ADD COLUMN date DATE'))
+    
+    connection.execute(text(
+        'UPDATE journal_entry_line SET date = '
+        '(SELECT journal_entry.date FROM journal_entry WHERE journal_entry.id = journal_entry_line.journal_entry_id) '
+        'WHERE date IS NULL'
+    ))
+    logger.info("Filled journal_entry_line.date")
+
+# Data migrations, applied once each and in order
+MIGRATIONS = [
+    ('money_centimes', convert_money_to_centimes),
+    ('journal_entry_line_date', add_journal_entry_line_date),
+]
+
+def apply_migrations():
+    """
+    Apply the data migrations that have not yet been applied to the database.
+    
+    Each migration runs in the same transaction as the record marking it as
+    applied, so a worker starting at the same time cannot apply it twice.
+    
+    Returns:
+        list: Names of the applied migrations
+    """
+    applied = {migration.name for migration in SchemaMigration.query.all()}
+    done = []
+    
+    for name, migration in MIGRATIONS:
+        if name in applied:
+            continue
+        
+        try:
+            db.session.add(SchemaMigration(name=name))
+            db.session.flush()
+            migration(db.session.connection())
+            db.session.commit()
+        except IntegrityError:
+            # Another worker applied it first
+            db.session.rollback()
+            continue
+        
+        done.append(name)
+        logger.info("Applied migration %s", name)
+    
+    return done
@@ -1,8 +1,43 @@
+import numpy as np
+import pandas as pd
 from app import db
-from models import Invoice, InvoiceLine, JournalEntry, JournalEntryLine, Account
+from models import (
+    Invoice, InvoiceLine, Account, AccountDailyBalance,
+    Client, Supplier, Employee, PayrollLine
+)
 from datetime import datetime
+from decimal import Decimal
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import and_, func
+from sqlalchemy import BigInteger, extract, func, type_coerce
+
+# Columns of the invoice lines frame used for VAT calculations
+VAT_LINE_COLUMNS = ['invoice_type', 'tva_rate', 'amount_ht', 'tva_amount']
+
+# Columns of the payroll lines frame used for IR calculations
+PAYROLL_LINE_COLUMNS = ['employee_id', 'gross_salary', 'cnss', 'cimr']
+
+def centimes(column):
+    """Select a money column as its stored integer number of centimes"""
+    return type_coerce(column, BigInteger)
+
+def to_centimes(values):
+    """Convert selected centimes to an int64 array (older SQLite databases return them as REAL)"""
+    return np.rint(np.asarray(values, dtype=float)).astype('int64')
+
+def to_money(amount):
+    """Convert an integer number of centimes to a Decimal amount in MAD"""
+    return Decimal(int(amount)).scaleb(-2)
+
+# Progressive tax brackets as (lower bound in MAD, rate in %) pairs, by first
+# fiscal year each table applies to (0: every year before the first dated table)
+IS_BRACKETS = {
+    0: [(0, 10), (300000, 20), (1000000, 31)]
+}
+
+# Annual income tax (IR) brackets
+IR_BRACKETS = {
+    0: [(0, 0), (30000, 10), (50000, 20), (60000, 30), (80000, 34), (180000, 38)]
+}
 
 def calculate_vat(year, month=None, quarter=None, end_date=None):
     """
@@ -44,98 +79,139 @@ def calculate_vat(year, month=None, quarter=None, end_date=None):
             next_month = start_date + relativedelta(months=1)
             end_date = next_month - relativedelta(days=1)
     
-    # Get all invoices for the period
-    client_invoices = Invoice.query.filter(
-        and_(
-            Invoice.date >= start_date,
-            Invoice.date <= end_date,
-            Invoice.invoice_type == 'client'
-        )
-    ).all()
+    # Get the VAT amounts of all invoice lines of the period
+    lines = pd.DataFrame(
+        get_vat_lines_query(
+            start_date, end_date,
+            Invoice.invoice_type, InvoiceLine.tva_rate, centimes(InvoiceLine.total_ht), centimes(InvoiceLine.total_tva)
+        ).all(),
+        columns=VAT_LINE_COLUMNS
+    )
     
-    supplier_invoices = Invoice.query.filter(
-        and_(
-            Invoice.date >= start_date,
-            Invoice.date <= end_date,
-            Invoice.invoice_type == 'supplier'
-        )
-    ).all()
+    # Amounts are summed as integer centimes
+    lines = lines.assign(
+        tva_rate=lines['tva_rate'].astype(float),
+        amount_ht=to_centimes(lines['amount_ht']),
+        tva_amount=to_centimes(lines['tva_amount'])
+    )
     
-    # Calculate VAT collected (from client invoices)
-    vat_collected = 0
-    vat_collected_details = []
+    # Group data by invoice type and VAT rate
+    by_rate = lines.groupby(['invoice_type', 'tva_rate'])[['amount_ht', 'tva_amount']].sum()
+    vat_collected_by_rate = {}
+    vat_deductible_by_rate = {}
     
-    for invoice in client_invoices:
-        for line in invoice.lines:
-            vat_amount = line.total_tva
-            vat_collected += vat_amount
-            
-            vat_collected_details.append({
-                'invoice_number': invoice.invoice_number,
-                'date': invoice.date,
-                'client': invoice.client.name if invoice.client else 'N/A',
-                'amount_ht': line.total_ht,
-                'tva_rate': line.tva_rate,
-                'tva_amount': vat_amount
-            })
-    
-    # Calculate VAT deductible (from supplier invoices)
-    vat_deductible = 0
-    vat_deductible_details = []
-    
-    for invoice in supplier_invoices:
-        for line in invoice.lines:
-            vat_amount = line.total_tva
-            vat_deductible += vat_amount
-            
-            vat_deductible_details.append({
-                'invoice_number': invoice.invoice_number,
-                'date': invoice.date,
-                'supplier': invoice.supplier.name if invoice.supplier else 'N/A',
-                'amount_ht': line.total_ht,
-                'tva_rate': line.tva_rate,
-                'tva_amount': vat_amount
-            })
+    for (invoice_type, rate), row in by_rate.iterrows():
+        rates = vat_collected_by_rate if invoice_type == 'client' else vat_deductible_by_rate
+        rates[float(rate)] = {
+            'base_ht': to_money(row['amount_ht']),
+            'tva': to_money(row['tva_amount'])
+        }
     
-    # Calculate VAT due
-    vat_due = vat_collected - vat_deductible
+    totals = lines.groupby('invoice_type')['tva_amount'].agg(['sum', 'count'])
     
-    # Group data by VAT rate
-    vat_collected_by_rate = {}
-    vat_deductible_by_rate = {}
+    # Calculate VAT collected (from client invoices) and deductible (from supplier invoices)
+    vat_collected = to_money(totals['sum'].get('client', 0))
+    vat_deductible = to_money(totals['sum'].get('supplier', 0))
     
-    for detail in vat_collected_details:
-        rate = detail['tva_rate']
-        if rate not in vat_collected_by_rate:
-            vat_collected_by_rate[rate] = {
-                'base_ht': 0,
-                'tva': 0
-            }
-        vat_collected_by_rate[rate]['base_ht'] += detail['amount_ht']
-        vat_collected_by_rate[rate]['tva'] += detail['tva_amount']
-    
-    for detail in vat_deductible_details:
-        rate = detail['tva_rate']
-        if rate not in vat_deductible_by_rate:
-            vat_deductible_by_rate[rate] = {
-                'base_ht': 0,
-                'tva': 0
-            }
-        vat_deductible_by_rate[rate]['base_ht'] += detail['amount_ht']
-        vat_deductible_by_rate[rate]['tva'] += detail['tva_amount']
+    # Calculate VAT due
+    vat_due = vat_collected - vat_deductible
     
     return {
         'start_date': start_date,
         'end_date': end_date,
         'vat_collected': vat_collected,
-        'vat_collected_details': vat_collected_details,
+        'vat_collected_details': VatDetails(start_date, end_date, 'client', int(totals['count'].get('client', 0))),
         'vat_collected_by_rate': vat_collected_by_rate,
         'vat_deductible': vat_deductible,
-        'vat_deductible_details': vat_deductible_details,
+        'vat_deductible_details': VatDetails(start_date, end_date, 'supplier', int(totals['count'].get('supplier', 0))),
         'vat_deductible_by_rate': vat_deductible_by_rate,
         'vat_due': vat_due
     }
 
+def get_vat_lines_query(start_date, end_date, *columns):
+    """
+    Build a query over the client and supplier invoice lines of a period.
+    
+    Args:
+        start_date (date): First invoice date to include
+        end_date (date): Last invoice date to include
+        *columns: Invoice and invoice line columns to select
+        
+    Returns:
+        Query: The invoice lines query
+    """
+    return db.session.query(*columns).\
+        select_from(InvoiceLine).\
+        join(Invoice, InvoiceLine.invoice_id == Invoice.id).\
+        filter(
+            Invoice.date >= start_date,
+            Invoice.date <= end_date,
+            Invoice.invoice_type.in_(['client', 'supplier'])
+        )
+
+class VatDetails:
+    """
+    Invoice line details of a VAT calculation, loaded lazily.
+    
+    Behaves like the list of detail dicts it replaces (len, truth value,
+    iteration), but lines are only read from the database when iterated
+    (streamed in batches) or paged.
+    """
+    
+    def __init__(self, start_date, end_date, invoice_type, count):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.invoice_type = invoice_type
+        self.count = count
+    
+    def __len__(self):
+        return self.count
+    
+    def __iter__(self):
+        return self.rows(self.query().yield_per(1000))
+    
+    def page(self, page, per_page=50):
+        """
+        Get one page of details.
+        
+        Args:
+            page (int): Page number, starting at 1
+            per_page (int): Number of details per page
+            
+        Returns:
+            list: Detail dicts of the page
+        """
+        return list(self.rows(self.query().offset((page - 1) * per_page).limit(per_page)))
+    
+    def query(self):
+        """Build the query of the invoice lines, ordered as entered"""
+        partner = Client if self.invoice_type == 'client' else Supplier
+        partner_id = Invoice.client_id if self.invoice_type == 'client' else Invoice.supplier_id
+        
+        return get_vat_lines_query(
+            self.start_date, self.end_date,
+            Invoice.invoice_number,
+            Invoice.date,
+            func.coalesce(partner.name, 'N/A'),
+            InvoiceLine.total_ht,
+            InvoiceLine.tva_rate,
+            InvoiceLine.total_tva
+        ).outerjoin(partner, partner_id == partner.id).\
+            filter(Invoice.invoice_type == self.invoice_type).\
+            order_by(Invoice.id, InvoiceLine.id)
+    
+    def rows(self, lines):
+        """Yield the detail dict of each invoice line"""
+        for invoice_number, date, partner, amount_ht, tva_rate, tva_amount in lines:
+            yield {
+                'invoice_number': invoice_number,
+                'date': date,
+                self.invoice_type: partner,
+                'amount_ht': amount_ht,
+                'tva_rate': tva_rate,
+                'tva_amount': tva_amount
+            }
+
 def calculate_is(year):
     """
     Calculate IS (Corporate Tax) for a given year.
@@ -146,116 +222,175 @@ def calculate_is(year):
     Returns:
         dict: IS calculation details
     """
-    # Determine fiscal year dates
-    start_date = datetime(year, 1, 1).date()
-    end_date = datetime(year, 12, 31).date()
-    
-    # Calculate net income for the period
-    # Get all revenue accounts (Class 7)
-    revenue_accounts = Account.query.filter(Account.code.like('7%')).all()
-    revenue_account_ids = [account.id for account in revenue_accounts]
-    
-    # Get all expense accounts (Class 6)
-    expense_accounts = Account.query.filter(Account.code.like('6%')).all()
-    expense_account_ids = [account.id for account in expense_accounts]
-    
-    # Calculate total revenue
-    total_revenue = db.session.query(func.sum(JournalEntryLine.credit - JournalEntryLine.debit)).\
-        join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-        filter(
-            JournalEntryLine.account_id.in_(revenue_account_ids),
-            JournalEntry.date >= start_date,
-            JournalEntry.date <= end_date
-        ).scalar() or 0
-    
-    # Calculate total expenses
-    total_expenses = db.session.query(func.sum(JournalEntryLine.debit - JournalEntryLine.credit)).\
-        join(JournalEntry, JournalEntryLine.journal_entry_id == JournalEntry.id).\
-        filter(
-            JournalEntryLine.account_id.in_(expense_account_ids),
-            JournalEntry.date >= start_date,
-            JournalEntry.date <= end_date
-        ).scalar() or 0
-    
-    # Net income
-    net_income = total_revenue - total_expenses
-    
-    # Calculate IS based on Moroccan progressive rates
-    # 10% for income <= 300,000 MAD
-    # 20% for income between 300,001 and 1,000,000 MAD
-    # 31% for income > 1,000,000 MAD
-    
-    is_amount = 0
-    is_details = []
-    
-    if net_income <= 0:
-        is_amount = 0
-        is_details = [{
-            'tranche': '≤ 0 MAD',
-            'base': net_income,
-            'rate': 0,
-            'is': 0
-        }]
-    else:
-        if net_income <= 300000:
-            is_amount = net_income * 0.10
+    return calculate_is_years([year])[year]
+
+def calculate_is_years(years):
+    """
+    Calculate IS (Corporate Tax) for several years at once.
+    
+    The revenue and expense totals of all years come from a single grouped
+    query, and the brackets are applied to all net incomes sharing the same
+    bracket table at once.
+    
+    Args:
+        years (list): The years for which to calculate IS
+        
+    Returns:
+        dict: Mapping of year to IS calculation details
+    """
+    years = sorted(set(years))
+    totals = get_class_totals_by_year(years, ['6', '7'])
+    
+    # Net income of each year, from revenue (Class 7) and expenses (Class 6)
+    # (in integer centimes)
+    revenues = [totals.get((year, '7'), (0, 0)) for year in years]
+    expenses = [totals.get((year, '6'), (0, 0)) for year in years]
+    total_revenues = to_centimes([credit_sum - debit_sum for debit_sum, credit_sum in revenues])
+    total_expenses = to_centimes([debit_sum - credit_sum for debit_sum, credit_sum in expenses])
+    net_incomes = total_revenues - total_expenses
+    
+    # Apply Moroccan progressive rates to all years sharing a bracket table at once
+    brackets_by_year = [get_brackets(IS_BRACKETS, year) for year in years]
+    taxable = np.maximum(net_incomes, 0)
+    bases = [None] * len(years)
+    
+    for brackets in IS_BRACKETS.values():
+        rows = np.flatnonzero([year_brackets is brackets for year_brackets in brackets_by_year])
+        if len(rows):
+            table_bases = progressive_tax(taxable[rows], brackets)[1]
+            for row, year_bases in zip(rows, table_bases):
+                bases[row] = year_bases
+    
+    results = {}
+    for i, year in enumerate(years):
+        net_income = net_incomes[i]
+        
+        if net_income <= 0:
             is_details = [{
-                'tranche': '≤ 300,000 MAD',
-                'base': net_income,
-                'rate': 10,
-                'is': is_amount
+                'tranche': '≤ 0 MAD',
+                'base': to_money(net_income),
+                'rate': 0,
+                'is': to_money(0)
             }]
-        elif net_income <= 1000000:
-            is_amount = 300000 * 0.10 + (net_income - 300000) * 0.20
-            is_details = [
-                {
-                    'tranche': '≤ 300,000 MAD',
-                    'base': 300000,
-                    'rate': 10,
-                    'is': 300000 * 0.10
-                },
-                {
-                    'tranche': '300,001 - 1,000,000 MAD',
-                    'base': net_income - 300000,
-                    'rate': 20,
-                    'is': (net_income - 300000) * 0.20
-                }
-            ]
         else:
-            is_amount = 300000 * 0.10 + 700000 * 0.20 + (net_income - 1000000) * 0.31
+            # The tax of each bracket is rounded to the centime, and the total
+            # is the sum of the rounded amounts
             is_details = [
                 {
-                    'tranche': '≤ 300,000 MAD',
-                    'base': 300000,
-                    'rate': 10,
-                    'is': 300000 * 0.10
-                },
-                {
-                    'tranche': '300,001 - 1,000,000 MAD',
-                    'base': 700000,
-                    'rate': 20,
-                    'is': 700000 * 0.20
-                },
-                {
-                    'tranche': '> 1,000,000 MAD',
-                    'base': net_income - 1000000,
-                    'rate': 31,
-                    'is': (net_income - 1000000) * 0.31
+                    'tranche': bracket_label(brackets_by_year[i], index),
+                    'base': to_money(base),
+                    'rate': rate,
+                    'is': to_money(round(base * rate / 100))
                 }
+                for index, ((lower, rate), base) in enumerate(zip(brackets_by_year[i], bases[i]))
+                if net_income > lower * 100
             ]
+        
+        results[year] = {
+            'year': year,
+            'total_revenue': to_money(total_revenues[i]),
+            'total_expenses': to_money(total_expenses[i]),
+            'net_income': to_money(net_income),
+            'is_details': is_details,
+            'total_is': sum((detail['is'] for detail in is_details), to_money(0))
+        }
+    
+    return results
+
+def get_class_totals_by_year(years, account_classes):
+    """
+    Get debit and credit totals per year and account class in a single grouped query.
+    
+    The class of an account is the first digit of its code.
+    
+    Args:
+        years (list): The years to include
+        account_classes (list): The account classes to include, as strings ('6', '7', etc.)
+        
+    Returns:
+        dict: Mapping of (year, account_class) to a (debit, credit) tuple, in
+        integer centimes
+    """
+    year = extract('year', AccountDailyBalance.date)
+    account_class = func.substr(Account.code, 1, 1)
+    
+    query = db.session.query(
+        year,
+        account_class,
+        func.sum(centimes(AccountDailyBalance.debit)),
+        func.sum(centimes(AccountDailyBalance.credit))
+    ).join(Account, AccountDailyBalance.account_id == Account.id).\
+        filter(
+            AccountDailyBalance.date >= datetime(min(years), 1, 1).date(),
+            AccountDailyBalance.date <= datetime(max(years), 12, 31).date(),
+            year.in_(years),
+            account_class.in_(account_classes)
+        ).\
+        group_by(year, account_class)
     
     return {
-        'year': year,
-        'total_revenue': total_revenue,
-        'total_expenses': total_expenses,
-        'net_income': net_income,
-        'is_details': is_details,
-        'total_is': is_amount
+        (int(year), account_class): (debit_sum or 0, credit_sum or 0)
+        for year, account_class, debit_sum, credit_sum in query
     }
 
+def get_brackets(tables, year):
+    """
+    Get the bracket table that applies to a fiscal year.
+    
+    Args:
+        tables (dict): Bracket tables by first fiscal year they apply to
+        year (int): The fiscal year
+        
+    Returns:
+        list: (lower bound, rate in %) pairs, ordered by lower bound
+    """
+    return tables[max(first_year for first_year in tables if first_year <= year)]
+
+def bracket_label(brackets, index):
+    """Return the label of a bracket, e.g. '300,001 - 1,000,000 MAD'"""
+    lower = brackets[index][0]
+    
+    if index == len(brackets) - 1:
+        return f"> {lower:,} MAD"
+    
+    upper = brackets[index + 1][0]
+    if lower == 0:
+        return f"≤ {upper:,} MAD"
+    return f"{lower + 1:,} - {upper:,} MAD"
+
+def progressive_tax(incomes, brackets):
+    """
+    Apply progressive brackets to an array of incomes.
+    
+    The part of each income falling in each bracket is computed as one
+    piecewise-linear array operation, so the cost hardly depends on the
+    number of incomes.
+    
+    Args:
+        incomes (array): Taxable incomes in integer centimes
+        brackets (list): (lower bound in MAD, rate in %) pairs, ordered by lower bound
+        
+    Returns:
+        tuple: Array of unrounded tax amounts in centimes, and int64 array of
+        the income part in each bracket in centimes (one row per income, one
+        column per bracket)
+    """
+    lowers = np.array([lower for lower, rate in brackets], dtype='int64') * 100
+    widths = np.append(np.diff(lowers), np.iinfo('int64').max)
+    rates = np.array([rate for lower, rate in brackets], dtype=float) / 100
+    
+    bases = np.clip(np.asarray(incomes, dtype='int64')[:, None] - lowers, 0, widths)
+    
+    return bases @ rates, bases
+
 def calculate_ir(year, month=None):
     """
-    Calculate IR (Income Tax) for a given period.
+    Calculate IR (Income Tax) withheld on salaries for a given period.
+    
+    The payroll lines of all employees of the period are read with a single
+    query and taxed in one array operation: each monthly net taxable income
+    is annualized, run through the brackets and pro-rated back to the month.
+    Annual figures are the sums of the monthly ones.
     
     Args:
         year (int): The year for which to calculate IR
@@ -275,66 +410,54 @@ def calculate_ir(year, month=None):
         start_date = datetime(year, 1, 1).date()
         end_date = datetime(year, 12, 31).date()
     
-    # In a real application, we would need to get salary data
-    # Since we don't have a specific salary model in our example,
-    # we'll use placeholder calculations for demonstration
+    # Get the salaries of all employees for the period
+    query = db.session.query(
+        PayrollLine.employee_id,
+        centimes(PayrollLine.gross_salary),
+        centimes(PayrollLine.cnss),
+        centimes(PayrollLine.cimr)
+    ).filter(PayrollLine.year == year)
     
-    # Placeholder for salary data (this would come from a real database)
-    # For now, we'll simulate a few employees with salaries
-    employees = [
-        {'name': 'Employee 1', 'gross_salary': 10000, 'cnss': 400, 'cimr': 300},
-        {'name': 'Employee 2', 'gross_salary': 20000, 'cnss': 800, 'cimr': 600},
-        {'name': 'Employee 3', 'gross_salary': 30000, 'cnss': 1200, 'cimr': 900}
-    ]
+    if month:
+        query = query.filter(PayrollLine.month == month)
     
-    ir_details = []
-    total_ir = 0
+    # Amounts are summed as integer centimes
+    lines = pd.DataFrame(query.all(), columns=PAYROLL_LINE_COLUMNS)
+    for column in ['gross_salary', 'cnss', 'cimr']:
+        lines[column] = to_centimes(lines[column])
     
-    for employee in employees:
-        # Calculate net taxable income
-        gross_salary = employee['gross_salary']
-        cnss = employee['cnss']
-        cimr = employee['cimr']
-        
-        net_taxable = gross_salary - cnss - cimr
-        
-        # Calculate IR based on Moroccan progressive rates
-        # Annual rates converted to monthly if needed
-        annual_net = net_taxable * (12 if month else 1)
-        
-        ir_amount = 0
-        
-        if annual_net <= 30000:
-            ir_amount = 0
-        elif annual_net <= 50000:
-            ir_amount = (annual_net - 30000) * 0.10
-        elif annual_net <= 60000:
-            ir_amount = 2000 + (annual_net - 50000) * 0.20
-        elif annual_net <= 80000:
-            ir_amount = 4000 + (annual_net - 60000) * 0.30
-        elif annual_net <= 180000:
-            ir_amount = 10000 + (annual_net - 80000) * 0.34
-        else:
-            ir_amount = 44000 + (annual_net - 180000) * 0.38
-        
-        # Convert back to monthly if needed
-        if month:
-            ir_amount = ir_amount / 12
-        
-        ir_details.append({
-            'employee': employee['name'],
-            'gross_salary': gross_salary,
-            'cnss': cnss,
-            'cimr': cimr,
-            'net_taxable': net_taxable,
-            'ir': ir_amount
-        })
-        
-        total_ir += ir_amount
+    # Calculate net taxable income
+    lines['net_taxable'] = lines['gross_salary'] - lines['cnss'] - lines['cimr']
+    
+    # Calculate IR based on Moroccan progressive rates
+    # Annual rates applied to the annualized monthly income, converted back to
+    # monthly and rounded to the centime withheld on each payslip
+    annual_ir = progressive_tax(lines['net_taxable'].to_numpy() * 12, get_brackets(IR_BRACKETS, year))[0]
+    lines['ir'] = np.rint(annual_ir / 12).astype('int64')
+    
+    # Sum the months of each employee
+    employees = lines.groupby('employee_id')[['gross_salary', 'cnss', 'cimr', 'net_taxable', 'ir']].sum()
+    
+    names = db.session.query(Employee.id, Employee.name).\
+        filter(Employee.id.in_(query.with_entities(PayrollLine.employee_id))).all()
+    employees.insert(0, 'name', pd.Series(dict(names), dtype=object).reindex(employees.index))
+    employees = employees.sort_values('name', kind='stable')
+    
+    ir_details = [
+        {
+            'employee': name,
+            'gross_salary': to_money(gross_salary),
+            'cnss': to_money(cnss),
+            'cimr': to_money(cimr),
+            'net_taxable': to_money(net_taxable),
+            'ir': to_money(ir_amount)
+        }
+        for name, gross_salary, cnss, cimr, net_taxable, ir_amount in employees.itertuples(index=False)
+    ]
     
     return {
         'start_date': start_date,
         'end_date': end_date,
         'ir_details': ir_details,
-        'total_ir': total_ir
+        'total_ir': to_money(lines['ir'].sum())
     }